@@ -0,0 +1,13 @@
+"""
+Benchmarks for pistl.
+
+Times the core I/O, the transforms and the create + export of every shape over
+a sweep of facet counts and writes the results as JSON. Run from the repository
+root with:
+
+    python -m benchmarks.run --sizes 1000 10000 100000 1000000 --output bench.json
+
+and compare against an earlier run with:
+
+    python -m benchmarks.run --baseline bench.json --threshold 0.2
+"""
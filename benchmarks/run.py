@@ -0,0 +1,208 @@
+# native python
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+# dependecies
+import numpy as np
+# internal custom imports
+from pistl import cache, core, shapes, utilities
+"""
+Module Content:
+1. CASES : benchmark cases, each builds its input for a facet count and returns the
+           function that is timed.
+2. run : runs the sweep and returns the results.
+3. compare : flags the cases whose throughput dropped below a threshold.
+4. main : command line entry point.
+"""
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+
+def _random_stl_array(n_facets: int):
+    """Random stl array with n_facets triangles and their normals."""
+    triangles = np.random.default_rng(0).random((n_facets, 3, 3))
+    arr = np.empty((n_facets, 4, 3))
+    arr[:, 0] = utilities.find_normals(triangles)
+    arr[:, 1:] = triangles
+    return arr.reshape(-1, 3)
+
+
+def _read_case(binary: bool):
+    def setup(n_facets, directory):
+        name = os.path.join(directory, f"read_{binary}_{n_facets}")
+        core.array_to_stl(_random_stl_array(n_facets), name, binary=binary)
+        return lambda: core.stl_to_array(f"{name}.stl")
+    return setup
+
+
+def _write_case(binary: bool):
+    def setup(n_facets, directory):
+        arr = _random_stl_array(n_facets)
+        name = os.path.join(directory, "write")
+        return lambda: core.array_to_stl(arr, name, binary=binary)
+    return setup
+
+
+def _stl_writer_case(n_facets, directory):
+    triangles, normals = utilities.as_facets(_random_stl_array(n_facets))
+    filename = os.path.join(directory, "stl_writer.stl")
+    return lambda: utilities.stl_writer(filename, "bench", triangles, normals)
+
+
+def _translate_case(n_facets, directory):
+    arr = _random_stl_array(n_facets)
+    return lambda: core.translate(arr, 1.0, 2.0, 3.0)
+
+
+def _rotate_case(n_facets, directory):
+    arr = _random_stl_array(n_facets)
+    return lambda: core.rotate(arr, 10.0, 20.0, 30.0)
+
+
+def _shape_case(cls):
+    def setup(n_facets, directory):
+        # every repeat has to tessellate, a cache hit would only time the writing
+        uncached = cache.TessellationCache(maxsize=0)
+        shape = cls()
+        if isinstance(shape, shapes.Sphere):
+            side = max(int(np.sqrt(n_facets/2)), 3)
+            shape.resoultion_longitude = 2*(side//2)
+            shape.resolution_latitude = side
+        elif isinstance(shape, shapes.Cylinder):
+            shape.close = True
+            shape.resolution = max(n_facets//4, 3)
+        else:
+            shape.resolution = max(n_facets, 3)
+        filename = os.path.join(directory, f"{shape.name}.stl")
+
+        def create_and_export():
+            # the cache of the shapes module is swapped only while the case runs
+            previous, cache.shape_cache = cache.shape_cache, uncached
+            try:
+                shape.create()
+                shape.export(filename, shape.name)
+            finally:
+                cache.shape_cache = previous
+        return create_and_export
+    return setup
+
+
+CASES = {
+    "stl_to_array[ascii]": _read_case(binary=False),
+    "stl_to_array[binary]": _read_case(binary=True),
+    "array_to_stl[ascii]": _write_case(binary=False),
+    "array_to_stl[binary]": _write_case(binary=True),
+    "stl_writer": _stl_writer_case,
+    "translate": _translate_case,
+    "rotate": _rotate_case,
+}
+for _cls in (shapes.Circle, shapes.Cylinder, shapes.Cuboid,
+             shapes.Tetrahedron, shapes.Pyramid, shapes.Sphere):
+    CASES[f"{_cls.__name__}.create+export"] = _shape_case(_cls)
+
+
+def _count_facets(name: str, directory: str, n_facets: int):
+    """Facets actually produced, shapes do not hit the requested count exactly."""
+    if not name.endswith("create+export"):
+        return n_facets
+    shape_file = os.path.join(directory, f"{name.split('.')[0]}.stl")
+    return core.stl_to_array(shape_file).shape[0]//4
+
+
+def run(sizes: list = DEFAULT_SIZES, cases: list = None, repeat: int = 3):
+    """
+    Description:
+        Times every case for every facet count and keeps the best of repeat runs.
+    Parameters:
+        sizes: facet counts of the sweep.
+        cases: names of the cases to run, default is all of CASES.
+        repeat: number of timed runs per case and size.
+    Returns:
+        dictionary with the machine information and one result per case and size.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in cases or CASES:
+            for n_facets in sizes:
+                func = CASES[name](n_facets, directory)
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    func()
+                    timings.append(time.perf_counter() - start)
+                facets = _count_facets(name, directory, n_facets)
+                seconds = min(timings)
+                results.append({"name": name,
+                                "facets": facets,
+                                "seconds": seconds,
+                                "facets_per_second": facets/seconds if seconds > 0 else float("inf")})
+                print(f"{name:32s} {facets:>9d} facets {seconds:9.4f} s "
+                      f"{results[-1]['facets_per_second']:>12.0f} facets/s", file=sys.stderr)
+    return {"machine": {"python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "platform": platform.platform(),
+                        "processor": platform.processor()},
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.2):
+    """
+    Description:
+        Compares the throughput of two runs. A case regresses when its facets per second
+        dropped by more than threshold (0.2 is 20 %) against the baseline.
+    Parameters:
+        current: result of run.
+        baseline: earlier result of run, e.g. loaded from its JSON file.
+        threshold: allowed relative drop of the throughput.
+    Returns:
+        list of the regressions with the old and new throughput.
+    """
+    old = {(r["name"], r["facets"]): r["facets_per_second"] for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        key = (r["name"], r["facets"])
+        if key in old and r["facets_per_second"] < (1.0 - threshold)*old[key]:
+            regressions.append({"name": r["name"],
+                                "facets": r["facets"],
+                                "baseline_facets_per_second": old[key],
+                                "facets_per_second": r["facets_per_second"],
+                                "change": r["facets_per_second"]/old[key] - 1.0})
+    return regressions
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Run the pistl benchmarks.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help="facet counts of the sweep")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=None,
+                        help="cases to run, default is all")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="JSON file for the results, default is stdout")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative throughput drop that counts as a regression")
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.cases, args.repeat)
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            current["regressions"] = compare(current, json.load(f), args.threshold)
+        for r in current["regressions"]:
+            print(f"REGRESSION {r['name']} at {r['facets']} facets: "
+                  f"{100*r['change']:.1f} % facets/s", file=sys.stderr)
+    text = json.dumps(current, indent=2)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 1 if current.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
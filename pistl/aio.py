@@ -0,0 +1,114 @@
+# native python
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+# internal custom imports
+from . import utilities
+"""
+Module Content:
+1. configure : sets the executor and the number of exports that run at the same time.
+2. run : runs a blocking function in the executor and awaits it.
+3. stl_writer_async : awaitable utilities.stl_writer.
+4. export_async : awaitable Shape.export.
+5. write_many : writes many geometries concurrently.
+
+The event loop only schedules the work. The tessellation, the encoding and the file
+writes of an export run together in one job of a bounded executor, so a server can
+await many exports without blocking its loop, and no more than max_workers of them
+hold their arrays in memory at a time. The writers already format and write the
+facets in large chunks, see utilities.STL_ASCII_CHUNK_SIZE.
+"""
+
+DEFAULT_MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+_executor = None
+
+
+def configure(max_workers: int = DEFAULT_MAX_WORKERS, executor=None):
+    """
+    Description:
+        Replaces the executor of the async exports.
+    Parameters:
+        max_workers: number of exports running at the same time.
+        executor: a concurrent.futures executor to use instead of a new thread pool,
+                  e.g. a ProcessPoolExecutor for ascii exports of very large shapes.
+    Returns:
+        the executor
+    Example:
+        >>> from pistl import aio
+        >>> aio.configure(max_workers=2)
+    """
+    global _executor
+    if _executor is not None and executor is not _executor:
+        _executor.shutdown(wait=False)
+    _executor = executor if executor is not None else \
+        ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pistl-export")
+    return _executor
+
+
+async def run(func, *args, **kwargs):
+    """Runs func(*args, **kwargs) in the export executor and returns its result."""
+    if _executor is None:
+        configure()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def stl_writer_async(filename: str, stl_name: str, triangles, facet_normals: list = [],
+                           binary: bool = False, precision: int = None):
+    """
+    Description:
+        Awaitable utilities.stl_writer, the facets are encoded and written in the executor.
+    Parameters:
+        see utilities.stl_writer
+    Example:
+        >>> await stl_writer_async('part.stl', 'part', arr, binary=True)
+    """
+    await run(utilities.stl_writer, filename, stl_name, triangles, facet_normals,
+              binary=binary, precision=precision)
+    return filename
+
+
+async def export_async(shape, filename: str, shapename: str):
+    """
+    Description:
+        Awaitable Shape.export, the shape is tessellated and written in the executor.
+    Parameters:
+        shape: a pistl.shapes Shape.
+        filename: string filename of the .stl file
+        shapename: name of the object that is created
+    Returns:
+        filename
+    """
+    await run(shape.export, filename, shapename)
+    return filename
+
+
+def _write(filename: str, name: str, geometry, binary: bool, precision: int):
+    """Tessellates and writes one geometry, runs in the executor."""
+    if hasattr(geometry, "normals"):
+        triangles, normals = geometry.triangles, geometry.normals
+    else:
+        triangles, normals = utilities.as_facets(geometry)
+    utilities.stl_writer(filename, name, triangles, normals, binary=binary, precision=precision)
+    return filename
+
+
+async def write_many(items, binary: bool = False, precision: int = None):
+    """
+    Description:
+        Writes many geometries concurrently, at most max_workers at a time.
+    Parameters:
+        items: iterable of (filename, solid name, geometry) where the geometry is a
+               Shape, a Mesh or a stl array.
+        binary: writes binary stl files when True. Default is False.
+        precision: digits after the decimal point in ascii files, see utilities.write_ascii_facets.
+    Returns:
+        list of the written filenames, in the order of items
+    Example:
+        >>> parts = [(f'pin_{i}.stl', 'pin', pin) for i, pin in enumerate(pins)]
+        >>> await write_many(parts, binary=True)
+    """
+    return list(await asyncio.gather(*(run(_write, filename, name, geometry, binary, precision)
+                                       for filename, name, geometry in items)))
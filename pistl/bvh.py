@@ -0,0 +1,371 @@
+# dependecies
+import numpy as np
+# internal custom imports
+from . import utilities
+"""
+Module Content:
+1. BVH : bounding volume hierarchy over the triangles of a stl array, mesh or shape.
+
+The triangles are sorted along a Morton (z-order) curve of their centroids and cut into
+leaves of leaf_size consecutive triangles. The leaves are the bottom level of a complete
+binary tree stored as arrays in heap order (children of node i are 2i+1 and 2i+2), so the
+whole tree is built with a sort and a few array reductions.
+
+Queries walk the tree one level at a time for all query points together: the frontier
+is a pair of arrays (query index, node index) and every step is a handful of numpy
+operations over the whole frontier.
+"""
+
+# number of queries walked through the tree together, bounds the size of the frontier
+QUERY_CHUNK_SIZE = 4096
+# directions of the rays cast by contains, deliberately not aligned with the axes
+_CONTAINS_DIRECTIONS = np.array([[0.8017, 0.4709, 0.3681],
+                                 [-0.3122, 0.8473, -0.4297],
+                                 [0.2903, -0.3556, 0.8885]])
+
+
+def _morton_codes(points: np.ndarray):
+    """30 bit Morton codes of points, 10 bits per axis over their bounding box."""
+    lower = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lower, 1e-300)
+    cells = np.clip(((points - lower)/extent*1023.0).astype(np.uint64), 0, 1023)
+    # spread the 10 bits of every cordinate so that two zero bits follow each bit
+    cells = (cells | (cells << np.uint64(16))) & np.uint64(0x030000FF)
+    cells = (cells | (cells << np.uint64(8))) & np.uint64(0x0300F00F)
+    cells = (cells | (cells << np.uint64(4))) & np.uint64(0x030C30C3)
+    cells = (cells | (cells << np.uint64(2))) & np.uint64(0x09249249)
+    return (cells[:, 0] << np.uint64(2)) | (cells[:, 1] << np.uint64(1)) | cells[:, 2]
+
+
+def _first_of_groups(sorted_queries):
+    """Mask of the first pair of every query in pairs sorted by query."""
+    return np.r_[sorted_queries[:1] == sorted_queries[:1], sorted_queries[1:] != sorted_queries[:-1]]
+
+
+def _dot(a, b):
+    return np.einsum("ij,ij->i", a, b)
+
+
+def _closest_points_on_triangles(p, a, b, c):
+    """
+    Description:
+        Closest point to p on every triangle (a, b, c), all arguments are (K, 3) arrays.
+        The Voronoi regions of the vertices, edges and face are tested for all pairs at
+        once (Ericson, Real-Time Collision Detection, 5.1.5).
+    """
+    ab, ac, ap = b - a, c - a, p - a
+    d1, d2 = _dot(ab, ap), _dot(ac, ap)
+    bp = p - b
+    d3, d4 = _dot(ab, bp), _dot(ac, bp)
+    cp = p - c
+    d5, d6 = _dot(ab, cp), _dot(ac, cp)
+    va = d3*d6 - d5*d4
+    vb = d5*d2 - d1*d6
+    vc = d1*d4 - d3*d2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = 1.0/(va + vb + vc)
+        result = a + ab*(vb*denom)[:, None] + ac*(vc*denom)[:, None]
+        # the regions are applied from the last to the first test, so the first one wins
+        w = (d4 - d3)/((d4 - d3) + (d5 - d6))
+        region = (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)
+        result = np.where(region[:, None], b + (c - b)*w[:, None], result)
+        w = d2/(d2 - d6)
+        region = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+        result = np.where(region[:, None], a + ac*w[:, None], result)
+        result = np.where(((d6 >= 0) & (d5 <= d6))[:, None], c, result)
+        v = d1/(d1 - d3)
+        region = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+        result = np.where(region[:, None], a + ab*v[:, None], result)
+        result = np.where(((d3 >= 0) & (d4 <= d3))[:, None], b, result)
+        result = np.where(((d1 <= 0) & (d2 <= 0))[:, None], a, result)
+    # degenerate triangles can fall through all regions, use their nearest vertex
+    bad = ~np.all(np.isfinite(result), axis=1)
+    if np.any(bad):
+        corners = np.stack((a[bad], b[bad], c[bad]), axis=1)
+        nearest = np.argmin(np.sum((corners - p[bad, None])**2, axis=2), axis=1)
+        result[bad] = corners[np.arange(corners.shape[0]), nearest]
+    return result
+
+
+def _ray_triangles(origins, directions, a, e1, e2):
+    """
+    Description:
+        Moller-Trumbore intersection of K rays with K triangles, all arguments (K, 3).
+    Returns:
+        distance along the ray (K,) and a boolean hit mask (K,)
+    """
+    pvec = np.cross(directions, e2)
+    det = _dot(e1, pvec)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inv = 1.0/det
+        tvec = origins - a
+        u = _dot(tvec, pvec)*inv
+        qvec = np.cross(tvec, e1)
+        v = _dot(directions, qvec)*inv
+        t = _dot(e2, qvec)*inv
+        hit = (det != 0) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0)
+    return t, hit
+
+
+class BVH(object):
+    """
+    Description:
+    ============
+    Bounding volume hierarchy for ray casting, closest point and inside/outside queries
+    over many points at once.
+
+    Attributes:
+    ===========
+    triangles:[np.ndarray]
+        (N, 3, 3) triangles in the order of the leaves
+    order:[np.ndarray]
+        index of every sorted triangle in the input, used to report triangle indices
+    lower, upper:[np.ndarray]
+        (nodes, 3) corners of the bounding boxes in heap order, empty nodes have lower > upper
+    leaf_size:[int]
+        triangles per leaf
+
+    Example:
+    ========
+    >>> bvh = BVH(core.stl_to_array('part.stl'))
+    >>> inside = bvh.contains(points)
+    >>> distance, triangle = bvh.intersect(origins, directions)
+    >>> bvh.save('part_bvh.npz')
+    """
+
+    def __init__(self, geometry, leaf_size: int = 8) -> None:
+        triangles = utilities.as_triangles(geometry, dtype=np.float64)
+        if triangles.shape[0] == 0:
+            raise ValueError("Cannot build a BVH without triangles.")
+        self.leaf_size = int(leaf_size)
+        self.order = np.argsort(_morton_codes(triangles.mean(axis=1)), kind="stable")
+        self.triangles = np.ascontiguousarray(triangles[self.order])
+        self.lower, self.upper = self._build_bounds()
+
+    @classmethod
+    def load(cls, filename: str):
+        """Loads a BVH written by save without building it again."""
+        data = np.load(filename)
+        bvh = cls.__new__(cls)
+        bvh.leaf_size = int(data["leaf_size"])
+        bvh.order = data["order"]
+        bvh.triangles = data["triangles"]
+        bvh.lower = data["lower"]
+        bvh.upper = data["upper"]
+        return bvh
+
+    def save(self, filename: str):
+        """Writes the arrays of the BVH to a .npz file."""
+        np.savez(filename, leaf_size=self.leaf_size, order=self.order,
+                 triangles=self.triangles, lower=self.lower, upper=self.upper)
+        return None
+
+    @property
+    def n_leaf_nodes(self):
+        return (self.lower.shape[0] + 1)//2
+
+    def _build_bounds(self):
+        """Boxes of the leaves with one reduceat, then the levels above from the bottom up."""
+        n = self.triangles.shape[0]
+        n_leaves = -(-n//self.leaf_size)
+        n_leaf_nodes = 1 << int(np.ceil(np.log2(n_leaves)))
+        first_leaf = n_leaf_nodes - 1
+        lower = np.full((2*n_leaf_nodes - 1, 3), np.inf)
+        upper = np.full((2*n_leaf_nodes - 1, 3), -np.inf)
+        starts = np.arange(0, n, self.leaf_size)
+        lower[first_leaf:first_leaf + n_leaves] = np.minimum.reduceat(
+            self.triangles.min(axis=1), starts)
+        upper[first_leaf:first_leaf + n_leaves] = np.maximum.reduceat(
+            self.triangles.max(axis=1), starts)
+        level_start = first_leaf
+        while level_start > 0:
+            parents = np.arange((level_start - 1)//2, level_start)
+            lower[parents] = np.minimum(lower[2*parents + 1], lower[2*parents + 2])
+            upper[parents] = np.maximum(upper[2*parents + 1], upper[2*parents + 2])
+            level_start = parents[0]
+        return lower, upper
+
+    def _box_distance2(self, points, nodes):
+        """Squared distance from points to the boxes of nodes, inf for empty nodes."""
+        gap = np.maximum(self.lower[nodes] - points, 0) + \
+            np.maximum(points - self.upper[nodes], 0)
+        with np.errstate(invalid="ignore"):
+            distance = np.sum(gap*gap, axis=1)
+        return np.where(np.isnan(distance), np.inf, distance)
+
+    def _walk(self, n_queries: int, keep):
+        """
+        Description:
+            Walks the tree level by level for all queries together.
+        Parameters:
+            n_queries: number of queries
+            keep: function (query indices, node indices) -> mask of the pairs to descend
+        Returns:
+            query indices and node indices of all pairs that reached a leaf
+        """
+        first_leaf = self.n_leaf_nodes - 1
+        queries = np.arange(n_queries)
+        nodes = np.zeros(n_queries, dtype=np.int64)
+        while True:
+            mask = keep(queries, nodes)
+            queries, nodes = queries[mask], nodes[mask]
+            # the tree is complete, so the whole frontier is on the same level
+            if nodes.size == 0 or nodes[0] >= first_leaf:
+                return queries, nodes
+            queries = np.repeat(queries, 2)
+            nodes = (2*nodes[:, None] + np.array([1, 2])).ravel()
+
+    def _leaf_triangles(self, queries, nodes):
+        """Expands (query, leaf) pairs to (query, sorted triangle) pairs."""
+        first = (nodes - (self.n_leaf_nodes - 1))*self.leaf_size
+        triangles = first[:, None] + np.arange(self.leaf_size)
+        valid = triangles < self.triangles.shape[0]
+        return np.broadcast_to(queries[:, None], triangles.shape)[valid], triangles[valid]
+
+    def _ray_pairs(self, origins, directions):
+        """All (ray, sorted triangle, distance) hits of a chunk of rays."""
+        with np.errstate(divide="ignore"):
+            inverse = 1.0/directions
+
+        def keep(queries, nodes):
+            t1 = (self.lower[nodes] - origins[queries])*inverse[queries]
+            t2 = (self.upper[nodes] - origins[queries])*inverse[queries]
+            with np.errstate(invalid="ignore"):
+                t_near = np.fmax.reduce(np.fmin(t1, t2), axis=1)
+                t_far = np.fmin.reduce(np.fmax(t1, t2), axis=1)
+            valid = np.all(self.lower[nodes] <= self.upper[nodes], axis=1)
+            return valid & (t_far >= np.maximum(t_near, 0))
+
+        queries, triangles = self._leaf_triangles(*self._walk(origins.shape[0], keep))
+        a = self.triangles[triangles, 0]
+        t, hit = _ray_triangles(origins[queries], directions[queries], a,
+                                self.triangles[triangles, 1] - a,
+                                self.triangles[triangles, 2] - a)
+        return queries[hit], triangles[hit], t[hit]
+
+    def intersect(self, origins, directions):
+        """
+        Description:
+            Casts rays and finds the first triangle each of them hits.
+        Parameters:
+            origins: (R, 3) start points of the rays.
+            directions: (R, 3) directions of the rays, they need not be unit vectors.
+        Returns:
+            tuple of the ray parameter t of the hits (R,), inf for a miss, so the hit
+            point is origin + t*direction, and the index of the hit triangle (R,), -1 for a miss.
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        directions = np.broadcast_to(np.asarray(directions, dtype=float), origins.shape)
+        distance = np.full(origins.shape[0], np.inf)
+        triangle = np.full(origins.shape[0], -1, dtype=np.int64)
+        for start in range(0, origins.shape[0], QUERY_CHUNK_SIZE):
+            chunk = slice(start, start + QUERY_CHUNK_SIZE)
+            queries, triangles, t = self._ray_pairs(origins[chunk], directions[chunk])
+            # the first pair of every ray after sorting by ray and distance is its first hit
+            first = np.lexsort((t, queries))
+            queries, triangles, t = queries[first], triangles[first], t[first]
+            unique = _first_of_groups(queries)
+            distance[start + queries[unique]] = t[unique]
+            triangle[start + queries[unique]] = self.order[triangles[unique]]
+        return distance, triangle
+
+    def count_hits(self, origins, directions):
+        """Number of triangles every ray crosses (R,)."""
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        directions = np.broadcast_to(np.asarray(directions, dtype=float), origins.shape)
+        counts = np.zeros(origins.shape[0], dtype=np.int64)
+        for start in range(0, origins.shape[0], QUERY_CHUNK_SIZE):
+            chunk = slice(start, start + QUERY_CHUNK_SIZE)
+            queries, _, _ = self._ray_pairs(origins[chunk], directions[chunk])
+            counts[chunk] = np.bincount(queries, minlength=counts[chunk].shape[0])
+        return counts
+
+    def contains(self, points):
+        """
+        Description:
+            Inside/outside test of points against a closed mesh. Three rays are cast from
+            every point and a point is inside when most of them cross the surface an odd
+            number of times, which makes hits on edges and vertices harmless.
+        Parameters:
+            points: (P, 3) query points.
+        Returns:
+            boolean array (P,)
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        votes = np.zeros(points.shape[0], dtype=np.int64)
+        for direction in _CONTAINS_DIRECTIONS:
+            votes += self.count_hits(points, direction) % 2
+        return votes >= 2
+
+    def closest_point(self, points):
+        """
+        Description:
+            Finds the closest point on the mesh for every query point. The farthest
+            corners of the visited boxes bound the distance on the way down, and the
+            reached leaves are searched from the nearest one outwards until no box is
+            closer than the best triangle.
+        Parameters:
+            points: (P, 3) query points.
+        Returns:
+            tuple of the closest points (P, 3), their distances (P,) and triangle indices (P,)
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        closest = np.empty(points.shape)
+        distance = np.empty(points.shape[0])
+        triangle = np.empty(points.shape[0], dtype=np.int64)
+        for start in range(0, points.shape[0], QUERY_CHUNK_SIZE):
+            chunk = slice(start, start + QUERY_CHUNK_SIZE)
+            closest[chunk], distance[chunk], triangle[chunk] = self._closest_chunk(points[chunk])
+        return closest, distance, triangle
+
+    def _closest_chunk(self, points):
+        n_points = points.shape[0]
+        bound = np.full(n_points, np.inf)
+
+        def keep(queries, nodes):
+            near = self._box_distance2(points[queries], nodes)
+            # every point of a box is at most as far as its farthest corner, which bounds the distance
+            far = np.maximum(np.abs(self.lower[nodes] - points[queries]),
+                             np.abs(self.upper[nodes] - points[queries]))
+            finite = np.isfinite(near)
+            np.minimum.at(bound, queries[finite], np.sum(far*far, axis=1)[finite]*(1 + 1e-9))
+            return near <= bound[queries]
+
+        queries, nodes = self._walk(n_points, keep)
+        # visit the reached leaves from the nearest box outwards, a few per point and round,
+        # and drop the leaves that are farther than the best triangle found so far
+        near = self._box_distance2(points[queries], nodes)
+        order = np.lexsort((near, queries))
+        queries, nodes, near = queries[order], nodes[order], near[order]
+        starts = np.r_[0, np.flatnonzero(queries[1:] != queries[:-1]) + 1]
+        rank = np.arange(queries.size) - np.repeat(starts, np.diff(np.r_[starts, queries.size]))
+        best = np.full(n_points, np.inf)
+        closest = np.zeros((n_points, 3))
+        triangle = np.zeros(n_points, dtype=np.int64)
+        high = 2
+        while queries.size:
+            current = rank < high
+            found = self._nearest_of_pairs(points, *self._leaf_triangles(queries[current], nodes[current]),
+                                           n_points)
+            better = found[0] < best
+            best[better], closest[better], triangle[better] = (f[better] for f in found)
+            rest = ~current & (near <= best[queries])
+            queries, nodes, near, rank = queries[rest], nodes[rest], near[rest], rank[rest]
+            high = 2*high
+        return closest, np.sqrt(best), self.order[triangle]
+
+    def _nearest_of_pairs(self, points, queries, triangles, n_points):
+        """Nearest triangle of every point among the (point, triangle) pairs."""
+        tri = self.triangles[triangles]
+        candidates = _closest_points_on_triangles(points[queries], tri[:, 0], tri[:, 1], tri[:, 2])
+        distance2 = np.sum((candidates - points[queries])**2, axis=1)
+        first = np.lexsort((distance2, queries))
+        queries, distance2 = queries[first], distance2[first]
+        unique = _first_of_groups(queries)
+        best = np.full(n_points, np.inf)
+        closest = np.zeros((n_points, 3))
+        triangle = np.zeros(n_points, dtype=np.int64)
+        best[queries[unique]] = distance2[unique]
+        closest[queries[unique]] = candidates[first][unique]
+        triangle[queries[unique]] = triangles[first][unique]
+        return best, closest, triangle
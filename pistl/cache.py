@@ -0,0 +1,197 @@
+# native python
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+# dependecies
+import numpy as np
+"""
+Module Content:
+1. TessellationCache : in-memory LRU of stl arrays, bounded in entries and bytes, with
+                       an optional on-disk tier.
+2. shape_cache : the cache used by the shapes module.
+3. configure : replaces shape_cache with a new cache.
+4. stats : hit/miss statistics of shape_cache.
+
+The shapes key their tessellation on a tuple of their geometric parameters, see
+Shape._cache_key, so repeated exports of the same configuration skip the tessellation.
+"""
+
+
+class TessellationCache(object):
+    """
+    Description:
+    ============
+    Least recently used cache of stl arrays. Arrays that fall out of memory are still
+    found on disk when a directory is given, stored as .npy files named after the
+    sha256 hash of the repr of their key. The files are found by the shape parameters
+    and not by their content, so the directory must only be shared between runs of
+    the same pistl version. A file is written under a temporary name and renamed, so
+    a reader never loads a partly written file.
+
+    Attributes:
+    ===========
+    maxsize:[int]
+        number of arrays kept in memory, 0 keeps none
+    max_bytes:[int]
+        total size in bytes of the arrays kept in memory, None for no limit
+    directory:[str]
+        directory of the on-disk tier, None to keep everything in memory
+    hits:[int]
+        lookups answered from memory
+    disk_hits:[int]
+        lookups answered from disk
+    misses:[int]
+        lookups that needed a tessellation
+    """
+
+    def __init__(self, maxsize: int = 128, directory: str = None, max_bytes: int = 256*2**20) -> None:
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._arrays = OrderedDict()
+        self._nbytes = 0
+        # exports may run in worker threads, see pistl.aio
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._arrays)
+
+    def __contains__(self, key):
+        return key in self._arrays or (self.directory is not None and os.path.exists(self._path(key)))
+
+    @property
+    def stats(self):
+        return {"hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self._arrays),
+                "maxsize": self.maxsize,
+                "nbytes": self._nbytes,
+                "max_bytes": self.max_bytes}
+
+    def get(self, key: tuple):
+        """
+        Description:
+            Looks up the array of a key, first in memory and then on disk.
+        Parameters:
+            key: hashable tuple of the shape parameters.
+        Returns:
+            read-only numpy array or None
+        """
+        with self._lock:
+            if key in self._arrays:
+                self._arrays.move_to_end(key)
+                self.hits += 1
+                return self._arrays[key]
+            if self.directory is not None and os.path.exists(self._path(key)):
+                array = np.load(self._path(key))
+                self._remember(key, array)
+                self.disk_hits += 1
+                return array
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, array: np.ndarray):
+        """Stores an array for a key in memory and, if there is a directory, on disk."""
+        array = np.array(array)
+        with self._lock:
+            if self.directory is not None:
+                self._save(key, array)
+            self._remember(key, array)
+        return array
+
+    def get_or_compute(self, key: tuple, compute):
+        """
+        Description:
+            Returns the cached array of key, or calls compute() and caches its result.
+        Parameters:
+            key: hashable tuple of the shape parameters.
+            compute: function without arguments that returns the array.
+        Returns:
+            read-only numpy array
+        """
+        array = self.get(key)
+        if array is None:
+            array = self.put(key, compute())
+        return array
+
+    def clear(self):
+        """Empties the memory tier and resets the statistics, the files on disk are kept."""
+        with self._lock:
+            self._arrays.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+    def _remember(self, key: tuple, array: np.ndarray):
+        # cached arrays are shared between callers, so they must not be changed in place
+        array.flags.writeable = False
+        if self.maxsize <= 0 or (self.max_bytes is not None and array.nbytes > self.max_bytes):
+            return None
+        if key in self._arrays:
+            self._nbytes -= self._arrays.pop(key).nbytes
+        self._arrays[key] = array
+        self._nbytes += array.nbytes
+        while len(self._arrays) > self.maxsize or \
+                (self.max_bytes is not None and self._nbytes > self.max_bytes):
+            self._nbytes -= self._arrays.popitem(last=False)[1].nbytes
+        return None
+
+    def _save(self, key: tuple, array: np.ndarray):
+        path = self._path(key)
+        # a unique temporary name per writer, os.replace is atomic on the same file system
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                np.save(f, array)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return None
+
+    def _path(self, key: tuple):
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.npy")
+
+
+shape_cache = TessellationCache()
+
+
+def configure(maxsize: int = 128, directory: str = None, max_bytes: int = 256*2**20):
+    """
+    Description:
+        Replaces the cache of the shapes module.
+    Parameters:
+        maxsize: number of tessellations kept in memory, 0 disables the memory tier.
+        directory: directory of the on-disk tier, default None keeps no files.
+        max_bytes: total size of the tessellations kept in memory, default 256 MiB,
+                   None for no limit.
+    Returns:
+        the new TessellationCache
+    Example:
+        >>> from pistl import cache
+        >>> cache.configure(maxsize=512, directory='.pistl_cache')
+    """
+    global shape_cache
+    shape_cache = TessellationCache(maxsize=maxsize, directory=directory, max_bytes=max_bytes)
+    return shape_cache
+
+
+def stats():
+    """Hit/miss statistics of the cache of the shapes module."""
+    return shape_cache.stats
+
+
+def canonical(value):
+    """Turns a parameter into a hashable value: numbers to float, lists and arrays to tuples."""
+    if np.ndim(value) == 0:
+        return float(value)
+    return tuple(np.asarray(value, dtype=float).ravel().tolist())
@@ -0,0 +1,290 @@
+# native python
+import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+# internal custom imports
+from . import core, compression
+"""
+Module Content:
+1. main : entry point of the `pistl` command.
+
+Runs conversions, transforms and format changes over many files with a pool of
+worker processes. Every file is processed on its own, a failing file is reported
+and the remaining files are still processed, also when a worker process crashes.
+With --output-dir the outputs keep the folders of the inputs below their common
+folder, inputs that would write the same output file are refused.
+
+Examples:
+    pistl convert "parts/**/*.step" --output-dir stl --jobs 8
+    pistl transform "stl/*.stl" --rotate 0 0 90 --translate 10 0 0 --output-dir moved
+    pistl format --manifest nightly.txt --to binary --jobs 4
+"""
+
+
+class _Operation(argparse.Action):
+    """Collects the transform options in the order they are given on the command line."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        operations = list(getattr(namespace, "operations", None) or [])
+        operations.append((self.dest, values))
+        namespace.operations = operations
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pistl", description="Batch conversion and transformation of stl files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("inputs", nargs="*",
+                        help="input files or glob patterns (use quotes for ** patterns)")
+    common.add_argument("--manifest",
+                        help="text file with one input file or glob pattern per line")
+    common.add_argument("--output-dir", "-o",
+                        help="directory for the outputs, default is next to the inputs")
+    common.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes")
+
+    convert = commands.add_parser("convert", parents=[common],
+                                  help="convert STEP files to STL (needs pythonocc)")
+    convert.add_argument("--linear-deflection", type=float, default=0.9,
+                         help="largest distance between the facets and the surface")
+    convert.add_argument("--angular-deflection", type=float, default=0.5,
+                         help="largest angle in radians between neighbouring facets")
+    convert.add_argument("--per-solid", action="store_true",
+                         help="write every solid to its own stl file, the solids of a "
+                              "single input are meshed by --jobs processes")
+    convert.add_argument("--binary", action="store_true",
+                         help="write binary stl files")
+
+    transform = commands.add_parser("transform", parents=[common],
+                                    help="apply transforms in the given order")
+    transform.add_argument("--translate", nargs=3, type=float, action=_Operation,
+                           metavar=("X", "Y", "Z"))
+    transform.add_argument("--rotate", nargs=3, type=float, action=_Operation,
+                           metavar=("X_THETA", "Y_THETA", "Z_THETA"))
+    transform.add_argument("--scale", nargs=3, type=float, action=_Operation,
+                           metavar=("X", "Y", "Z"))
+    transform.add_argument("--mirror", choices=["xy", "yz", "xz"], action=_Operation)
+    transform.add_argument("--binary", action="store_true",
+                           help="write binary stl files")
+    transform.add_argument("--compress", choices=sorted(compression.CODECS),
+                           help="compress the written files, e.g. part.stl.gz")
+
+    change = commands.add_parser("format", parents=[common],
+                                 help="change between ascii and binary stl")
+    change.add_argument("--to", choices=["ascii", "binary"], required=True)
+    change.add_argument("--precision", type=int, default=None,
+                        help="digits after the decimal point of ascii files, in scientific notation (3 writes 1.235e+00)")
+    change.add_argument("--compress", choices=sorted(compression.CODECS),
+                        help="compress the written files, e.g. part.stl.gz")
+    parser.set_defaults(operations=[])
+    return parser
+
+
+def _expand_inputs(patterns: list, manifest: str = None):
+    """Expands globs and the lines of the manifest into a sorted list of unique files.
+    Patterns that match no file are kept so they are reported as failures."""
+    patterns = list(patterns)
+    if manifest is not None:
+        with open(manifest, 'r') as f:
+            patterns += [line.strip() for line in f
+                         if line.strip() and not line.strip().startswith("#")]
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        files += matches if matches else [pattern]
+    return list(dict.fromkeys(files))
+
+
+def _output_path(input_file: str, output_dir: str, suffix: str, codec: str = None, base: str = None):
+    """Output file name: the input name with the suffix and .stl extension, and the
+    extension of the codec for compressed outputs. In the output directory the input
+    keeps its folder relative to the base folder."""
+    stem = _stem(os.path.basename(input_file))
+    directory = os.path.dirname(input_file)
+    if output_dir is not None:
+        relative = os.path.relpath(os.path.abspath(directory), base) if base is not None else "."
+        directory = os.path.normpath(os.path.join(output_dir, relative))
+    return os.path.join(directory, f"{stem}{suffix}.stl" + (f".{codec}" if codec else ""))
+
+
+def _stem(filename: str):
+    """Filename without its extension, and without the codec extension of compressed files."""
+    stem, extension = os.path.splitext(filename)
+    if extension.lower().lstrip(".") in compression.CODECS:
+        stem = os.path.splitext(stem)[0]
+    return stem
+
+
+def _matrix(operations: list):
+    """Composes the collected transform options into one 4x4 matrix."""
+    builders = {"translate": core.translation_matrix,
+                "rotate": core.rotation_matrix,
+                "scale": core.scaling_matrix,
+                "mirror": core.mirror_matrix}
+    matrices = []
+    for name, values in operations:
+        values = values if isinstance(values, list) else [values]
+        matrices.append(builders[name](*values))
+    return core.compose(*matrices)
+
+
+def _run_job(job: tuple):
+    """
+    Description:
+        Processes one file in a worker process.
+    Parameters:
+        job: tuple of (command, input file, output file, options)
+    Returns:
+        tuple of (input file, output file, number of facets, input bytes, seconds, error)
+    """
+    command, input_file, output_file, options = job
+    start = time.perf_counter()
+    facets = None
+    try:
+        if os.path.abspath(input_file) == os.path.abspath(output_file):
+            raise ValueError("the output would overwrite the input file.")
+        size = os.path.getsize(input_file)
+        if command == "convert":
+            from . import converter
+            converter.convert(input_file, output_file, **options)
+        else:
+            blocks = core.iter_stl_blocks(input_file)
+            if command == "transform":
+                blocks = core.transform_blocks(blocks, options["matrix"])
+            stl_name = os.path.join(os.path.dirname(output_file), _stem(os.path.basename(output_file)))
+            facets = core.blocks_to_stl(blocks, stl_name,
+                                        binary=options["binary"],
+                                        compression=options.get("compression"),
+                                        precision=options.get("precision"))
+    except Exception as error:
+        return input_file, output_file, None, 0, time.perf_counter() - start, f"{type(error).__name__}: {error}"
+    return input_file, output_file, facets, size, time.perf_counter() - start, None
+
+
+def _jobs(args):
+    """Builds the list of jobs for the parsed command line, raises ValueError when two
+    inputs would write the same output file."""
+    if args.command == "convert":
+        suffix = ""
+        options = {"linear_deflection": args.linear_deflection,
+                   "angular_deflection": args.angular_deflection,
+                   "binary": args.binary,
+                   "per_solid": args.per_solid}
+    elif args.command == "transform":
+        suffix = "_transformed"
+        options = {"matrix": _matrix(args.operations), "binary": args.binary,
+                   "compression": args.compress}
+    else:
+        suffix = f"_{args.to}"
+        options = {"binary": args.to == "binary", "precision": args.precision,
+                   "compression": args.compress}
+    files = _expand_inputs(args.inputs, args.manifest)
+    if args.command == "convert":
+        # the processes go to the files, or to the solids when there is one file
+        options["jobs"] = args.jobs if len(files) == 1 else 1
+    base = None
+    if args.output_dir is not None and files:
+        # writing to a separate directory keeps the input names and folders
+        suffix = ""
+        base = os.path.commonpath([os.path.abspath(os.path.dirname(f)) for f in files])
+    jobs = [(args.command, f, _output_path(f, args.output_dir, suffix, options.get("compression"), base), options)
+            for f in files]
+    outputs = {}
+    for _, input_file, output_file, _ in jobs:
+        other = outputs.setdefault(os.path.abspath(output_file), input_file)
+        if other != input_file:
+            raise ValueError(f"{other} and {input_file} would both write {output_file}.")
+    if args.output_dir is not None:
+        for directory in {os.path.dirname(output_file) for _, _, output_file, _ in jobs}:
+            os.makedirs(directory, exist_ok=True)
+    return jobs
+
+
+def main(argv: list = None):
+    """
+    Description:
+        Entry point of the `pistl` command line tool.
+    Parameters:
+        argv: list of command line arguments, default is sys.argv[1:]
+    Returns:
+        exit code: 0 when all files succeeded, 1 when some failed and 2 without inputs
+        or when two inputs would write the same output file.
+    """
+    args = _build_parser().parse_args(argv)
+    try:
+        jobs = _jobs(args)
+    except ValueError as error:
+        print(f"pistl: {error}", file=sys.stderr)
+        return 2
+    if not jobs:
+        print("pistl: no input files.", file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    failures = 0
+    total_bytes = 0
+    if args.jobs > 1 and len(jobs) > 1:
+        results = _run_pool(jobs, args.jobs)
+    else:
+        results = (_run_job(job) for job in jobs)
+    for done, result in enumerate(results, start=1):
+        failures += _report(done, len(jobs), result)
+        total_bytes += result[3]
+    seconds = time.perf_counter() - start
+    print(f"Processed {len(jobs)} files ({len(jobs) - failures} ok, {failures} failed) "
+          f"in {seconds:.2f} s: {len(jobs)/seconds:.1f} files/s, "
+          f"{total_bytes/seconds/1e6:.1f} MB/s")
+    return 1 if failures else 0
+
+
+def _run_pool(jobs: list, workers: int):
+    """
+    Description:
+        Runs the jobs in a pool of worker processes. A crashing worker breaks the pool
+        and fails all of its unfinished jobs, those jobs are run again each in its own
+        worker process, so only the job that crashes is reported as a failure.
+    Parameters:
+        jobs: list of jobs, see _run_job
+        workers: number of worker processes
+    Returns:
+        generator of the results of the jobs, in the order they finish
+    """
+    broken = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool:
+                broken.append(futures[future])
+    with ThreadPoolExecutor(max_workers=workers) as threads:
+        yield from threads.map(_run_isolated, broken)
+
+
+def _run_isolated(job: tuple):
+    """Runs one job in a worker process of its own and reports a crash of the worker."""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        try:
+            return pool.submit(_run_job, job).result()
+        except BrokenProcessPool as error:
+            return job[1], job[2], None, 0, 0.0, f"{type(error).__name__}: the worker process crashed."
+
+
+def _report(done: int, total: int, result: tuple):
+    """Prints the progress line of one file and returns 1 for a failure."""
+    input_file, output_file, facets, _, seconds, error = result
+    if error is not None:
+        print(f"[{done}/{total}] FAILED {input_file}: {error}", file=sys.stderr)
+        return 1
+    facet_text = f"{facets} facets, " if facets is not None else ""
+    print(f"[{done}/{total}] ok {input_file} -> {output_file} ({facet_text}{seconds:.2f} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+# native python
+import io
+import os
+import bz2
+import gzip
+import lzma
+import queue
+import threading
+"""
+Module Content:
+1. compression_of : finds the codec of a file from its extension or its magic bytes.
+2. open_stl : opens plain and compressed stl files alike.
+
+Compressed files are decoded and encoded by the standard library codecs in a
+background thread, in chunks of CHUNK_SIZE bytes. The codecs release the GIL while
+they work, so the parsing or formatting of the facets overlaps the (de)compression and
+no temporary file or separate decompression pass is needed.
+"""
+
+# standard library module of every supported codec
+CODECS = {"gz": gzip, "bz2": bz2, "xz": lzma}
+# keyword arguments of the codecs when writing, gzip level 6 is the speed of the gzip tool
+_WRITE_OPTIONS = {"gz": {"compresslevel": 6}, "bz2": {}, "xz": {}}
+_SUFFIXES = {".gz": "gz", ".bz2": "bz2", ".xz": "xz"}
+_MAGIC = ((b"\x1f\x8b", "gz"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz"))
+# bytes decoded or encoded at a time
+CHUNK_SIZE = 1 << 20
+# chunks waiting between the codec thread and the reader or writer
+_QUEUE_DEPTH = 4
+
+
+def compression_of(path: str):
+    """
+    Description:
+        Finds the codec of a file, first from its extension and then, for an existing
+        file, from its first bytes.
+    Parameters:
+        path: filename, e.g. 'part.stl.gz'
+    Returns:
+        "gz", "bz2", "xz" or None for a plain file
+    """
+    codec = _SUFFIXES.get(os.path.splitext(path)[1].lower())
+    if codec is not None or not os.path.isfile(path):
+        return codec
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for magic, codec in _MAGIC:
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def open_stl(path: str, mode: str = "r", compression: str = "infer", threaded: bool = True):
+    """
+    Description:
+        Opens a stl file for reading or writing. Plain files are opened with open, so
+        nothing changes for them.
+    Parameters:
+        path: filename.
+        mode: "r", "rb", "w" or "wb".
+        compression: "infer" (default) takes the codec from compression_of when reading
+                     and from the extension when writing, else one of "gz", "bz2", "xz"
+                     or None.
+        threaded: runs the codec in a background thread (default True).
+    Returns:
+        file object
+    Example:
+        >>> with open_stl('part.stl.xz') as f:
+        >>>     text = f.read()
+    """
+    reading = mode.startswith("r")
+    if compression == "infer":
+        # a written file is compressed by its extension only, whatever it held before
+        compression = compression_of(path) if reading else \
+            _SUFFIXES.get(os.path.splitext(path)[1].lower())
+    if compression is None:
+        return open(path, mode)
+    if compression not in CODECS:
+        raise ValueError(f"Unknown compression {compression!r}, expected one of {sorted(CODECS)}.")
+    if reading:
+        stream = CODECS[compression].open(path, "rb")
+        if threaded:
+            stream = io.BufferedReader(_PrefetchReader(stream), CHUNK_SIZE)
+    else:
+        stream = CODECS[compression].open(path, "wb", **_WRITE_OPTIONS[compression])
+        if threaded:
+            stream = io.BufferedWriter(_BackgroundWriter(stream), CHUNK_SIZE)
+    if "b" in mode:
+        return stream
+    return io.TextIOWrapper(stream)
+
+
+class _PrefetchReader(io.RawIOBase):
+    """Raw stream that decompresses the next chunks in a thread while the current one is read."""
+
+    def __init__(self, stream) -> None:
+        self._stream = stream
+        self._chunks = queue.Queue(maxsize=_QUEUE_DEPTH)
+        self._pending = memoryview(b"")
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decompress, daemon=True)
+        self._thread.start()
+
+    def _decompress(self):
+        try:
+            while not self._stop.is_set():
+                chunk = self._stream.read(CHUNK_SIZE)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except Exception as error:
+            self._put(error)
+
+    def _put(self, item):
+        # the reader may be closed early, so never block for good on a full queue
+        while not self._stop.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._pending:
+            if self._eof:
+                return 0
+            item = self._chunks.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._pending = memoryview(item)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._stream.close()
+        super().close()
+
+
+class _BackgroundWriter(io.RawIOBase):
+    """Raw stream that hands the written chunks to a thread which compresses them."""
+
+    def __init__(self, stream) -> None:
+        self._stream = stream
+        self._chunks = queue.Queue(maxsize=_QUEUE_DEPTH)
+        self._error = None
+        self._thread = threading.Thread(target=self._compress, daemon=True)
+        self._thread.start()
+
+    def _compress(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                return
+            if self._error is None:
+                try:
+                    self._stream.write(chunk)
+                except Exception as error:
+                    self._error = error
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise IOError("Failed to compress the stl file.") from self._error
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._raise_error()
+        self._chunks.put(bytes(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self._chunks.put(None)
+            self._thread.join()
+            self._stream.close()
+            self._raise_error()
@@ -1,16 +1,31 @@
 # import statements
 import os
-from OCC.Extend.DataExchange import read_step_file, write_stl_file
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from . import profiling
 
+# number of parsed STEP files kept by _read_step
+STEP_CACHE_SIZE = 8
 
-def convert(input_file: str, output_file: str, mode: str = "stp-2-stl"):
+
+def convert(input_file: str, output_file: str, mode: str = "stp-2-stl",
+            linear_deflection: float = 0.9, angular_deflection: float = 0.5,
+            binary: bool = False, per_solid: bool = False, jobs: int = None):
     """
     Description:
     ============
         Convert function that converts various file formats to other.
-        The function just call pythonocc in the backend.
+        The function just call pythonocc in the backend, which is imported
+        on the first call.
+
+        Default mode is converting step files to stl files. The parsed STEP is
+        cached, so one file can be exported at several deflections without
+        reading it again; the cache is renewed when the file changes. The cached
+        shape is never changed, every export meshes a copy of it.
 
-        Default mode is converting step files to stl files.
+        The meshing of pythonocc holds the GIL, so the solids of per_solid are
+        meshed in a pool of processes: every solid is sent to its worker as BRep
+        text and the worker meshes a copy of it.
 
     Parameters:
     ===========
@@ -20,24 +35,141 @@ def convert(input_file: str, output_file: str, mode: str = "stp-2-stl"):
             file of a given format
         stl_file:str
             file of required output format
+        linear_deflection:float
+            largest distance between the tessellation and the surface, in model
+            units. Smaller values give finer and larger stl files.
+        angular_deflection:float
+            largest angle in radians between the normals of neighbouring facets.
+        binary:bool
+            writes binary stl files when True. Default is False.
+        per_solid:bool
+            writes every solid of the STEP to its own file, output_file with the
+            index of the solid appended, e.g. part_0.stl, part_1.stl.
+        jobs:int
+            number of processes meshing the solids at the same time, default is
+            the number of processors. 1 meshes them one after the other in this
+            process.
 
     Return:
     =======
-        Output file type selcted or Error
+        list of the written files, one file unless per_solid is set. Earlier
+        versions returned None.
+
+    Example:
+    ========
+    >>> convert('assembly.step', 'preview.stl', linear_deflection=2.0)
+    >>> convert('assembly.step', 'print.stl', linear_deflection=0.05, per_solid=True, jobs=8)
     """
     if os.path.exists(input_file):
         # Read the input file
         if mode == "stp-2-stl":
-            shape = read_step_file(input_file)
+            with profiling.span("converter.read_step"):
+                shape = _read_step(os.path.abspath(input_file), os.path.getmtime(input_file))
         else:
             raise NotImplementedError(
                 "No other filr format method implemented!")
     else:
         raise FileNotFoundError("Could not find the input file.")
 
+    if per_solid:
+        stem, extension = os.path.splitext(output_file)
+        targets = [(solid, f"{stem}_{i}{extension or '.stl'}")
+                   for i, solid in enumerate(_solids(shape))]
+    else:
+        targets = [(shape, output_file)]
+    options = (binary, linear_deflection, angular_deflection)
+
+    if len(targets) == 1 or jobs == 1:
+        return [_write_solid(solid, filename, *options) for solid, filename in targets]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_write_brep, _to_brep(solid), filename, *options)
+                   for solid, filename in targets]
+        return [future.result() for future in futures]
+
+
+@profiling.stage("converter.write")
+def _write_solid(solid, filename: str, binary: bool, linear_deflection: float,
+                 angular_deflection: float):
+    """Meshes a copy of a shape and writes it to an stl file."""
+    from OCC.Extend.DataExchange import write_stl_file
+    # the copy has no triangulation, so the deflections of this call are used
+    # and the cached shape keeps none for the next call
+    solid = _fresh_copy(solid)
     try:
         # Write the STL file
-        write_stl_file(shape, output_file)
-    except:
+        write_stl_file(solid, filename, mode="binary" if binary else "ascii",
+                       linear_deflection=linear_deflection,
+                       angular_deflection=angular_deflection)
+    except Exception:
         raise IOError(
             "Failed to write the corresponding STL file from the provided STEP file.")
+    if profiling.enabled():
+        profiling.count(nbytes=os.path.getsize(filename))
+    return filename
+
+
+def _write_brep(brep: str, filename: str, *options):
+    """Worker process: reads a shape from BRep text and writes it, see _write_solid."""
+    return _write_solid(_from_brep(brep), filename, *options)
+
+
+@lru_cache(maxsize=STEP_CACHE_SIZE)
+def _read_step(path: str, mtime: float):
+    """Parses a STEP file once per path and modification time."""
+    return _parse_step(path)
+
+
+def _parse_step(path: str):
+    """Parses a STEP file into one shape."""
+    from OCC.Extend.DataExchange import read_step_file
+    return read_step_file(path)
+
+
+def clear_cache():
+    """Drops the parsed STEP files."""
+    _read_step.cache_clear()
+
+
+def _solids(shape):
+    """List of the solids of a shape."""
+    from OCC.Extend.TopologyUtils import TopologyExplorer
+    return list(TopologyExplorer(shape).solids())
+
+
+def _to_brep(shape):
+    """The shape as BRep text, to send it to a worker process."""
+    try:
+        from OCC.Core.BRepTools import breptools
+        return breptools.WriteToString(shape)
+    except ImportError:
+        from OCC.Core.BRepTools import breptools_WriteToString
+        return breptools_WriteToString(shape)
+
+
+def _from_brep(brep: str):
+    """The shape of BRep text written by _to_brep."""
+    try:
+        from OCC.Core.BRepTools import breptools
+        return breptools.ReadFromString(brep)
+    except ImportError:
+        from OCC.Core.BRepTools import breptools_ReadFromString
+        return breptools_ReadFromString(brep)
+
+
+def _fresh_copy(shape):
+    """Copy of a shape without the triangulation stored in its faces."""
+    from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Copy
+    copy = BRepBuilderAPI_Copy(shape).Shape()
+    _clean_triangulation(copy)
+    return copy
+
+
+def _clean_triangulation(shape):
+    """Removes the triangulation stored in the faces of a shape."""
+    try:
+        from OCC.Core.BRepTools import breptools
+        breptools.Clean(shape)
+    except ImportError:
+        # pythonocc before 7.7 exposes the static methods as functions
+        from OCC.Core.BRepTools import breptools_Clean
+        breptools_Clean(shape)
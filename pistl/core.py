@@ -1,5 +1,10 @@
+import os
+import re
+import json
+import mmap
 import numpy as np
-from . import utilities
+from . import utilities, pist_exceptions, compression, profiling
+from .mesh import Mesh
 """
 ### Core module contains funcitions that can be used to translate, 
 twist and deform the stl shapes
@@ -10,122 +15,662 @@ The shape should be:
     (4* number of triangles, 3)
 """
 
+# number of facets per block in the streaming functions
+STL_BLOCK_SIZE = 65536
+# matches the three numbers following a "normal" or "vertex" keyword, in any case as
+# several CAD exporters write FACET NORMAL and VERTEX
+_ROW_PATTERN = re.compile(r"\b(?:normal|vertex)[ \t]+(\S+[ \t]+\S+[ \t]+\S+)", re.IGNORECASE)
+# bytes of an ascii stl lower cased at a time while the solids are indexed
+_SCAN_CHUNK_SIZE = 1 << 24
+# matches a line that is neither empty nor a solid or endsolid line
+_CONTENT_PATTERN = re.compile(r"^[ \t]*(?!(?:end)?solid\b)\S", re.IGNORECASE | re.MULTILINE)
 
-def stl_to_array(stl: str):
+
+@profiling.stage("core.read")
+def stl_to_array(stl: str, strict: bool = False, dtype=None):
     """
     Description:
-        Reads an stl file produced by pystl and converts that into a compact numpy array of the form:
-        np.array([0,0,0], [normla, vertex..], ....all the triangles).
+        Reads an ascii or binary stl file and converts that into a compact numpy array of the form:
+        np.array([normal, vertex, vertex, vertex, ....all the triangles]).
         The shape of the array then produced is:
-            4* number of traingles + 1 (first element is [0,0,0] in the array made for vstack to work.)
+            (4* number of traingles, 3)
+        The whole file is tokenized in one pass and the numbers are converted in bulk,
+        so reading time grows linearly with the number of facets.
+        Binary files are detected with is_binary_stl and read through read_binary_stl.
+        Files compressed with gzip, bz2 or xz (e.g. part.stl.gz) are decompressed while
+        they are read, see compression.open_stl.
     Parameters:
         stl:
             string filehandle for the shape.
+        strict:
+            if True the file is checked line by line for a valid facet structure and
+            pist_exceptions.STL_Parsing_Exceptions is raised with the offending line number.
+            Default is False, where unreadable numbers are read as 0.0.
+        dtype:
+            np.float32 or np.float64, default is utilities.get_float_dtype().
     Returns:
         a numpy array of the shape described in the description section of the docstring.
+        pist_exceptions.STL_Parsing_Exceptions is raised for an ascii file with lines
+        other than solid/endsolid but without any normal or vertex row.
     Example:
         >>> art = stl_to_array(stl='Results/stl_name_before_translate.stl')
         >>> print(type(art))
         <class numpy.ndarray>
     """
-    stl_array = np.array([0, 0, 0], dtype=float)
-    with open(stl, 'r') as f:
-        for line in f:
-            if ('normal' or 'vertex' in line):
-                line = line.rstrip('\n')
-                strip_list = line.split(' ')[-3:]
-                if len(strip_list) >= 3:  # and 'object' not in strip_list:
-                    try:
-                        arr = [float(l) for l in strip_list]
-                    except:
-                        arr = [0.0 for l in strip_list]
-                    stl_array = np.vstack((stl_array, arr))
-    return stl_array
+    if is_binary_stl(stl):
+        arr = records_to_array(read_binary_stl(stl), dtype=dtype)
+    else:
+        with compression.open_stl(stl, 'r') as f:
+            text = f.read()
+        if strict:
+            _check_ascii_stl(text)
+        rows = _ROW_PATTERN.findall(text)
+        if not rows and _CONTENT_PATTERN.search(text):
+            _no_rows_error(stl)
+        arr = _rows_to_array(rows, dtype)
+    profiling.count(facets=arr.shape[0]//4, array=arr)
+    return arr
+
+
+def _no_rows_error(stl: str):
+    raise pist_exceptions.STL_Parsing_Exceptions(
+        f"No normal or vertex rows found in the ascii stl {stl!r}.")
+
+
+def _rows_to_array(rows: list, dtype=None):
+    """Converts the matched normal/vertex rows in bulk into an array of shape (len(rows), 3)."""
+    dtype = utilities.float_dtype(dtype)
+    try:
+        stl_array = np.array(" ".join(rows).split(), dtype=dtype)
+    except ValueError:
+        stl_array = np.array([_row_to_float(row) for row in rows], dtype=dtype)
+    return stl_array.reshape(-1, 3)
+
+
+def _row_to_float(row: str):
+    """Converts a row of three numbers, falling back to zeros for unreadable rows."""
+    try:
+        return [float(v) for v in row.split()]
+    except ValueError:
+        return [0.0, 0.0, 0.0]
+
+
+def _check_ascii_stl(text: str):
+    """
+    Description:
+        Walks through the lines of an ascii stl and checks the
+        solid/facet/outer loop/vertex/endloop/endfacet structure.
+    Parameters:
+        text:
+            content of the stl file.
+    Returns:
+        None, raises pist_exceptions.STL_Parsing_Exceptions on the first bad line.
+    """
+    in_facet = False
+    in_loop = False
+    n_vertex = 0
+    line_number = 0
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        tokens = line.split()
+        if not tokens:
+            continue
+        # the keywords are read in any case, e.g. FACET NORMAL
+        keyword = tokens[0].lower()
+        if keyword == "facet":
+            if in_facet or len(tokens) != 5 or tokens[1].lower() != "normal":
+                _parse_error(line_number, line)
+            _check_numbers(tokens[2:], line_number, line)
+            in_facet = True
+        elif keyword == "outer":
+            if not in_facet or in_loop or [t.lower() for t in tokens[1:]] != ["loop"]:
+                _parse_error(line_number, line)
+            in_loop = True
+            n_vertex = 0
+        elif keyword == "vertex":
+            if not in_loop or len(tokens) != 4 or n_vertex == 3:
+                _parse_error(line_number, line)
+            _check_numbers(tokens[1:], line_number, line)
+            n_vertex += 1
+        elif keyword == "endloop":
+            if not in_loop or n_vertex != 3:
+                _parse_error(line_number, line)
+            in_loop = False
+        elif keyword == "endfacet":
+            if not in_facet or in_loop:
+                _parse_error(line_number, line)
+            in_facet = False
+        elif keyword in ("solid", "endsolid"):
+            if in_facet:
+                _parse_error(line_number, line)
+        else:
+            _parse_error(line_number, line)
+    if in_facet:
+        raise pist_exceptions.STL_Parsing_Exceptions(
+            f"Unexpected end of file after line {line_number}: facet is not closed.")
+    return None
+
+
+def _check_numbers(tokens: list, line_number: int, line: str):
+    """Raises a parsing exception if any of the tokens is not a number."""
+    try:
+        for t in tokens:
+            float(t)
+    except ValueError:
+        _parse_error(line_number, line)
+
+
+def _parse_error(line_number: int, line: str):
+    raise pist_exceptions.STL_Parsing_Exceptions(
+        f"Malformed stl at line {line_number}: {line.strip()!r}")
+
+
+def iter_stl_blocks(stl: str, block_size: int = STL_BLOCK_SIZE, dtype=None):
+    """
+    Description:
+        Reads an ascii or binary stl file block by block. Every block is a stl array of
+        at most block_size triangles, so files larger than the memory can be processed.
+        Binary files are sliced from a memory map, ascii files are read a few lines at a time.
+        Compressed files are decompressed chunk by chunk while the blocks are parsed.
+    Parameters:
+        stl:
+            string filehandle for the shape.
+        block_size:
+            maximum number of triangles in a block.
+        dtype:
+            np.float32 or np.float64, default is utilities.get_float_dtype().
+    Returns:
+        generator of stl arrays of shape (4* number of triangles in the block, 3),
+        raises pist_exceptions.STL_Parsing_Exceptions like stl_to_array
+    Example:
+        >>> blocks = iter_stl_blocks('scan.stl')
+        >>> blocks = transform_blocks(blocks, compose(rotation_matrix(z_theta=90),
+                                                      translation_matrix(x_offset=10)))
+        >>> blocks_to_stl(blocks, 'moved_scan', binary=True)
+    """
+    if is_binary_stl(stl) and compression.compression_of(stl) is not None:
+        itemsize = utilities.STL_BINARY_DTYPE.itemsize
+        with compression.open_stl(stl, 'rb') as f:
+            f.read(utilities.STL_BINARY_HEADER_SIZE + 4)
+            while True:
+                data = f.read(block_size*itemsize)
+                if len(data) < itemsize:
+                    break
+                yield records_to_array(np.frombuffer(data, dtype=utilities.STL_BINARY_DTYPE,
+                                                     count=len(data)//itemsize), dtype=dtype)
+        return
+    if is_binary_stl(stl):
+        records = read_binary_stl(stl)
+        for start in range(0, records.shape[0], block_size):
+            yield records_to_array(records[start:start + block_size], dtype=dtype)
+        return
+    rows_per_block = 4*block_size
+    rows = []
+    n_rows = 0
+    content = False
+    with compression.open_stl(stl, 'r') as f:
+        while True:
+            # about 60 bytes per normal/vertex line plus the keyword lines
+            lines = f.readlines(rows_per_block*80)
+            if not lines:
+                break
+            text = "".join(lines)
+            found = _ROW_PATTERN.findall(text)
+            n_rows += len(found)
+            content = content or (not n_rows and _CONTENT_PATTERN.search(text) is not None)
+            rows.extend(found)
+            while len(rows) >= rows_per_block:
+                yield _rows_to_array(rows[:rows_per_block], dtype)
+                del rows[:rows_per_block]
+    if not n_rows and content:
+        _no_rows_error(stl)
+    if rows:
+        yield _rows_to_array(rows, dtype)
+
+
+@profiling.stage("core.write")
+def blocks_to_stl(blocks, stl_name: str, binary: bool = False, precision: int = None,
+                  compression: str = None, solid_name: str = None):
+    """
+    Description:
+        Writes the stl file from an iterable of stl arrays, one block at a time, so only
+        one block is held in memory. The output is the same as array_to_stl on all the
+        blocks concatenated.
+    Parameters:
+        blocks:
+            iterable of stl arrays, e.g. from iter_stl_blocks or transform_blocks.
+        stl_name:
+            Name of the stl file that is to be created.
+        binary:
+            writes a binary stl when True. Default is False.
+        precision:
+            digits after the decimal point in the ascii file, in scientific notation.
+        compression:
+            "gz", "bz2" or "xz" writes a compressed file, e.g. stl_name.stl.gz.
+            A compressed stream cannot go back to the facet count of a binary file,
+            so compressed binary files keep the records in memory until the end.
+        solid_name:
+            name of the solid in the file, default is the file name without folder.
+    Returns:
+        number of triangles written
+    """
+    filename = _stl_filename(stl_name, compression)
+    solid_name = os.path.basename(stl_name) if solid_name is None else solid_name
+    n_facets = 0
+    if binary and compression is not None:
+        records = [utilities.binary_records(*utilities.as_facets(block)) for block in blocks]
+        records = np.concatenate(records) if records else np.zeros(0, dtype=utilities.STL_BINARY_DTYPE)
+        with _open(filename, "wb", compression) as f:
+            f.write(utilities.binary_header(solid_name))
+            f.write(np.uint32(records.shape[0]).tobytes())
+            f.write(records.tobytes())
+        profiling.count(facets=records.shape[0])
+        return records.shape[0]
+    if binary:
+        with open(filename, "wb") as f:
+            f.write(utilities.binary_header(solid_name))
+            # the facet count is only known at the end, it is patched in after the blocks
+            f.write(np.uint32(0).tobytes())
+            for block in blocks:
+                triangles, normals = utilities.as_facets(block)
+                f.write(utilities.binary_records(triangles, normals).tobytes())
+                n_facets += triangles.shape[0]
+            f.seek(utilities.STL_BINARY_HEADER_SIZE)
+            f.write(np.uint32(n_facets).tobytes())
+        profiling.count(facets=n_facets)
+        return n_facets
+    with _open(filename, "w", compression) as f:
+        f.write(f"solid {solid_name}\n")
+        for block in blocks:
+            triangles, normals = utilities.as_facets(block)
+            utilities.write_ascii_facets(f, triangles, normals, precision=precision)
+            n_facets += triangles.shape[0]
+        f.write(f"endsolid {solid_name}\n")
+    profiling.count(facets=n_facets)
+    return n_facets
+
+
+def _stl_filename(stl_name: str, codec: str = None):
+    """Filename of the written stl: stl_name.stl, with the suffix of the codec if any."""
+    return f"{stl_name}.stl" if codec is None else f"{stl_name}.stl.{codec}"
+
+
+def _open(filename: str, mode: str, codec: str = None):
+    """Opens an output file with the given codec, None for a plain file."""
+    return compression.open_stl(filename, mode, compression=codec)
+
+
+def stl_to_mesh(stl: str, tolerance: float = 1e-9, strict: bool = False, dtype=None):
+    """
+    Description:
+        Reads an ascii or binary stl file into an indexed Mesh with welded vertices.
+    Parameters:
+        stl:
+            string filehandle for the shape.
+        tolerance:
+            distance under which two vertices are merged.
+        strict, dtype:
+            see stl_to_array.
+    Returns:
+        pistl.mesh.Mesh
+    """
+    return Mesh.from_array(stl_to_array(stl, strict=strict, dtype=dtype), tolerance=tolerance)
+
+
+def is_binary_stl(stl: str):
+    """
+    Description:
+        Checks if an stl file is binary. The file is binary when its size matches
+        the 84 bytes of header and facet count plus 50 bytes per facet. Compressed
+        files are binary unless their first bytes read like an ascii stl.
+    Parameters:
+        stl:
+            string filehandle for the shape.
+    Returns:
+        True for a binary stl and False otherwise.
+    """
+    if compression.compression_of(stl) is not None:
+        # the decompressed size is unknown, an ascii stl starts with "solid" and a facet
+        with compression.open_stl(stl, 'rb') as f:
+            head = f.read(1024)
+        return not (head.lstrip().startswith(b"solid") and (b"facet" in head or b"endsolid" in head))
+    size = os.path.getsize(stl)
+    start = utilities.STL_BINARY_HEADER_SIZE
+    if size < start + 4:
+        return False
+    with open(stl, 'rb') as f:
+        f.seek(start)
+        n_facets = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+    return size == start + 4 + n_facets*utilities.STL_BINARY_DTYPE.itemsize
+
+
+def read_binary_stl(stl: str, memory_map: bool = True):
+    """
+    Description:
+        Reads a binary stl file into a structured array with the fields
+        "normal" (3,), "vertices" (3, 3) and "attribute" (see utilities.STL_BINARY_DTYPE).
+        By default the records are memory mapped, so a large file can be opened and sliced
+        without loading it fully. Compressed files are decompressed into memory.
+    Parameters:
+        stl:
+            string filehandle for the shape.
+        memory_map:
+            memory map the file (default True) or read the records into memory.
+    Returns:
+        structured numpy array (or np.memmap) with one record per triangle.
+    Example:
+        >>> records = read_binary_stl('part.stl')
+        >>> first_thousand = records_to_array(records[:1000])
+    """
+    offset = utilities.STL_BINARY_HEADER_SIZE + 4
+    if compression.compression_of(stl) is not None:
+        with compression.open_stl(stl, 'rb') as f:
+            data = f.read()[offset:]
+        return np.frombuffer(data, dtype=utilities.STL_BINARY_DTYPE,
+                             count=len(data)//utilities.STL_BINARY_DTYPE.itemsize)
+    n_facets = (os.path.getsize(stl) - offset) // utilities.STL_BINARY_DTYPE.itemsize
+    if n_facets == 0:
+        return np.zeros(0, dtype=utilities.STL_BINARY_DTYPE)
+    if memory_map:
+        return np.memmap(stl, dtype=utilities.STL_BINARY_DTYPE, mode='r',
+                         offset=offset, shape=(n_facets,))
+    with open(stl, 'rb') as f:
+        f.seek(offset)
+        return np.fromfile(f, dtype=utilities.STL_BINARY_DTYPE, count=n_facets)
+
+
+def records_to_array(records: np.ndarray, dtype=None):
+    """
+    Description:
+        Converts binary stl records into the (4* number of triangles, 3) stl array.
+    Parameters:
+        records:
+            structured array as returned by read_binary_stl.
+        dtype:
+            np.float32 keeps the values of the file as they are, default is
+            utilities.get_float_dtype().
+    Returns:
+        stl array of float values.
+    """
+    arr = np.empty((records.shape[0], 4, 3), dtype=utilities.float_dtype(dtype))
+    arr[:, 0] = records["normal"]
+    arr[:, 1:] = records["vertices"]
+    return arr.reshape(-1, 3)
 
 
-def array_to_stl(arr: np.ndarray, stl_name: str):
+@profiling.stage("core.write")
+def array_to_stl(arr: np.ndarray, stl_name: str, binary: bool = False, precision: int = None,
+                 compression: str = None, solid_name: str = None):
     """
     Description:
         Takes an array and writes the corresponding stl file using the infomormation on normal and vertices
         of triangles in the array.
     Parameter:
         arr: an array of shape:
-            4*n + 1, 3
+            4*n, 3
+            or the triangles of shape (n, 3, 3) together with their normals as a tuple:
+            (triangles, normals)
+            or a pistl.mesh.Mesh
         stl_name:
             Name of the stl file that is to be created.
+        binary:
+            writes a binary stl when True. Default is False.
+        precision:
+            digits after the decimal point in the ascii file, in scientific notation,
+            e.g. 3 writes 1.235e+00. Default is None for the
+            shortest repr of each float.
+        compression:
+            "gz", "bz2" or "xz" writes a compressed file, e.g. stl_name.stl.gz.
+        solid_name:
+            name of the solid in the file, default is the file name without folder.
     Returns:
         None
     """
-    if arr.shape[0] % 4 == 0.00:
-        arr = arr
-    else:
-        arr = arr[1:]
-    with open(f"{stl_name}.stl", "w") as f:
-        f.write(f"solid stl_name\n")
-        for i in range(int(arr.shape[0]/4)):
-            f.write(
-                f"facet normal {float(arr[4*i][0])} {float(arr[4*i][1])} {float(arr[4*i][2])}\n")
-            f.write('outer loop\n')
-            f.write(
-                f"vertex {float(arr[4*i+1][0])} {float(arr[4*i+1][1])} {float(arr[4*i+1][2])}\n")
-            f.write(
-                f"vertex {float(arr[4*i+2][0])} {float(arr[4*i+2][1])} {float(arr[4*i+2][2])}\n")
-            f.write(
-                f"vertex {float(arr[4*i+3][0])} {float(arr[4*i+3][1])} {float(arr[4*i+3][2])}\n")
-            f.write('endloop\n')
-            f.write('endfacet\n')
-            # print(arr[i,:])
-        f.write("endsolid")
+    triangles, normals = _facets_of(arr)
+    filename = _stl_filename(stl_name, compression)
+    solid_name = os.path.basename(stl_name) if solid_name is None else solid_name
+    profiling.count(facets=triangles.shape[0])
+    if binary:
+        utilities.binary_stl_writer(filename, solid_name, triangles, normals)
+        return None
+    with _open(filename, "w", compression) as f:
+        utilities.write_ascii_solid(f, solid_name, triangles, normals, precision=precision)
     return None
 
 
-def translate(arr: np.ndarray, x_offset: float = 0.00, y_offset: float = 0.00, z_offset: float = 0.00):
+def _facets_of(arr):
+    """Triangles and normals of a stl array, a (triangles, normals) tuple or a Mesh."""
+    if isinstance(arr, Mesh):
+        return arr.triangles, arr.normals
+    if isinstance(arr, tuple):
+        return utilities.as_facets(*arr)
+    return utilities.as_facets(arr)
+
+
+@profiling.stage("core.write")
+def solids_to_stl(solids: dict, stl_name: str, precision: int = None, compression: str = None):
     """
     Description:
-        Takes a stl array and translates it by a provided x_offset, y_offset and z_offset.
+        Writes several named solids into one ascii stl file, one solid ... endsolid
+        block per entry. Binary stl has no solids, so the file is always ascii.
     Parameters:
-        arr:
-            stl array that is translated
-        x_offset:
-            required distance along x-axis by which the stl has to be moved.
-        y_offset:
-            required distance along y-axis by which the stl has to be moved.
-        z_offset:
-            required distance along z-axis by which the stl has to be moved.
+        solids:
+            dictionary of solid name to a stl array, a (triangles, normals) tuple or
+            a pistl.mesh.Mesh.
+        stl_name:
+            Name of the stl file that is to be created.
+        precision:
+            digits after the decimal point, in scientific notation.
+        compression:
+            "gz", "bz2" or "xz" writes a compressed file, e.g. stl_name.stl.gz.
     Returns:
-        translated stl array
+        number of triangles written
+    Example:
+        >>> solids_to_stl({"housing": housing, "lid": lid}, "Results/enclosure")
+        >>> lid = read_solid("Results/enclosure.stl", "lid")
     """
-    if arr.shape[0] % 4 == 0.00:
-        arr = arr
+    n_facets = 0
+    with _open(_stl_filename(stl_name, compression), "w", compression) as f:
+        for name, arr in solids.items():
+            triangles, normals = _facets_of(arr)
+            utilities.write_ascii_solid(f, name, triangles, normals, precision=precision)
+            n_facets += triangles.shape[0]
+    profiling.count(facets=n_facets)
+    return n_facets
+
+
+def index_solids(stl: str, index_file: str = None):
+    """
+    Description:
+        Finds the solids of a stl file in one scan of the memory mapped file: the
+        keywords are found with bytes.find and the facets of a solid are counted by
+        their endfacet keywords, so no number is parsed. A binary file is one solid.
+    Parameters:
+        stl:
+            string filehandle of an uncompressed stl file.
+        index_file:
+            JSON file keeping the index. It is read instead of scanning the stl when it
+            matches the size and modification time of the file, and written otherwise.
+    Returns:
+        dictionary with the size and mtime of the file and the solids, a list of
+        dictionaries with the name, the byte offset, the length in bytes and the
+        number of facets of every solid in file order
+    Example:
+        >>> index = index_solids('vendor_assembly.stl', 'vendor_assembly.stl.json')
+        >>> [solid['name'] for solid in index['solids']]
+        ['housing', 'lid', 'gasket']
+    """
+    if compression.compression_of(stl) is not None:
+        raise ValueError("Solids are read by their byte offsets, which needs an uncompressed file.")
+    stat = os.stat(stl)
+    if index_file is not None and os.path.isfile(index_file):
+        with open(index_file) as f:
+            index = json.load(f)
+        if index["size"] == stat.st_size and index["mtime"] == stat.st_mtime:
+            return index
+    if is_binary_stl(stl):
+        with open(stl, 'rb') as f:
+            header = f.read(utilities.STL_BINARY_HEADER_SIZE).decode("ascii", "replace")
+        n_facets = (stat.st_size - utilities.STL_BINARY_HEADER_SIZE - 4)//utilities.STL_BINARY_DTYPE.itemsize
+        name = header.strip().replace(utilities.STL_BINARY_HEADER_PREFIX, "", 1)
+        solids = [{"name": name, "offset": 0, "nbytes": stat.st_size, "n_facets": n_facets}]
     else:
-        arr = arr[1:]
-    for i in range(int(arr.shape[0]/4)):
-        arr[4*i+1][0] = float(arr[4*i+1][0]) + x_offset
-        arr[4*i+2][0] = float(arr[4*i+2][0]) + x_offset
-        arr[4*i+3][0] = float(arr[4*i+3][0]) + x_offset
-        # translate y
-        arr[4*i+1][1] = float(arr[4*i+1][1]) + y_offset
-        arr[4*i+2][1] = float(arr[4*i+2][1]) + y_offset
-        arr[4*i+3][1] = float(arr[4*i+3][1]) + y_offset
-        # translate z
-        arr[4*i+1][2] = float(arr[4*i+1][2]) + z_offset
-        arr[4*i+2][2] = float(arr[4*i+2][2]) + z_offset
-        arr[4*i+3][2] = float(arr[4*i+3][2]) + z_offset
+        solids = _scan_solids(stl, stat.st_size)
+    index = {"size": stat.st_size, "mtime": stat.st_mtime, "solids": solids}
+    if index_file is not None:
+        with open(index_file, 'w') as f:
+            json.dump(index, f, indent=1)
+    return index
+
+
+def _scan_solids(stl: str, size: int):
+    """The solid ... endsolid blocks of an ascii stl file, see index_solids. The keywords
+    are matched in any case at the start of a line, the names keep their case."""
+    solids = []
+    if size == 0:
+        return solids
+    current = None
+    with open(stl, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for start, text in _lower_case_chunks(data, size):
+            position = 0
+            while True:
+                if current is None:
+                    found = _find_keyword(text, b"solid", position)
+                    if found < 0:
+                        break
+                    name_end = text.find(b"\n", found)
+                    name_end = len(text) if name_end < 0 else name_end
+                    name = data[start + found + 5:start + name_end]
+                    current = {"name": name.decode("utf-8", "replace").strip(),
+                               "offset": start + found, "n_facets": 0}
+                    position = name_end
+                else:
+                    end = _find_keyword(text, b"endsolid", position)
+                    current["n_facets"] += text.count(b"endfacet", position,
+                                                      len(text) if end < 0 else end)
+                    if end < 0:
+                        break
+                    stop = text.find(b"\n", end)
+                    stop = len(text) if stop < 0 else stop + 1
+                    current["nbytes"] = start + stop - current["offset"]
+                    solids.append(current)
+                    current = None
+                    position = stop
+    if current is not None:
+        # a solid without endsolid runs to the end of the file
+        current["nbytes"] = size - current["offset"]
+        solids.append(current)
+    return solids
+
+
+def _lower_case_chunks(data, size: int):
+    """Lower cased copies of about _SCAN_CHUNK_SIZE bytes of whole lines, with their offsets."""
+    start = 0
+    while start < size:
+        stop = start + _SCAN_CHUNK_SIZE
+        if stop < size:
+            newline = data.find(b"\n", stop)
+            stop = size if newline < 0 else newline + 1
+        yield start, data[start:min(stop, size)].lower()
+        start = stop
+
+
+def _find_keyword(text: bytes, keyword: bytes, position: int):
+    """Position of the first keyword from position on that only spaces precede on its line, or -1."""
+    found = text.find(keyword, position)
+    while found >= 0:
+        line_start = text.rfind(b"\n", 0, found) + 1
+        if not text[line_start:found].strip():
+            return found
+        found = text.find(keyword, found + len(keyword))
+    return -1
+
+
+def _solid_entry(index: dict, name):
+    """The entry of a solid in an index by its name (the first of that name) or position."""
+    if isinstance(name, (int, np.integer)):
+        return index["solids"][name]
+    for solid in index["solids"]:
+        if solid["name"] == name:
+            return solid
+    raise KeyError(f"No solid named {name!r}, found {[s['name'] for s in index['solids']]}.")
+
+
+@profiling.stage("core.read")
+def read_solid(stl: str, name, index: dict = None, strict: bool = False, dtype=None):
+    """
+    Description:
+        Reads one solid of a multi-solid stl file. Only the bytes of that solid are
+        read and parsed, the place of the solid is taken from the index.
+    Parameters:
+        stl:
+            string filehandle of an uncompressed stl file.
+        name:
+            name of the solid, the first solid of that name is read, or its position.
+        index:
+            index of the file from index_solids, scanned when not given.
+        strict, dtype:
+            see stl_to_array.
+    Returns:
+        stl array of the solid
+    Example:
+        >>> index = index_solids('vendor_assembly.stl', 'vendor_assembly.stl.json')
+        >>> lid = read_solid('vendor_assembly.stl', 'lid', index)
+    """
+    if index is None:
+        index = index_solids(stl)
+    solid = _solid_entry(index, name)
+    if is_binary_stl(stl):
+        arr = records_to_array(read_binary_stl(stl), dtype=dtype)
+    else:
+        with open(stl, 'rb') as f:
+            f.seek(solid["offset"])
+            text = f.read(solid["nbytes"]).decode("utf-8", "replace")
+        if strict:
+            _check_ascii_stl(text)
+        arr = _rows_to_array(_ROW_PATTERN.findall(text), dtype)
+    profiling.count(facets=arr.shape[0]//4, array=arr)
     return arr
 
 
-def rotate(arr: np.ndarray,
-           x_theta: float = 0.00,
-           y_theta: float = 0.00,
-           z_theta: float = 0.00,
-           filename='rotated.stl'):
+def read_solids(stl: str, names: list = None, index: dict = None, strict: bool = False, dtype=None):
     """
     Description:
-        Rotates the stl file around the angles x_theta, y_theta and z_theta.
-        where x_theta is the rotation around x-axis or rotation in y-z plane and likewise.
+        Reads several solids of a multi-solid stl file, see read_solid.
+    Parameters:
+        names:
+            names of the solids, default is all solids.
+    Returns:
+        dictionary of solid name to stl array, in file order when names is None
+    """
+    if index is None:
+        index = index_solids(stl)
+    if names is None:
+        names = [solid["name"] for solid in index["solids"]]
+    return {name: read_solid(stl, name, index, strict=strict, dtype=dtype) for name in names}
+
+
+def translation_matrix(x_offset: float = 0.00, y_offset: float = 0.00, z_offset: float = 0.00):
+    """
+    Description:
+        Builds the 4x4 affine matrix that moves a shape by x_offset, y_offset and z_offset.
+    Parameters:
+        x_offset, y_offset, z_offset:
+            distance along the x, y and z-axis.
+    Returns:
+        4x4 numpy array
+    """
+    matrix = np.eye(4)
+    matrix[:3, 3] = [x_offset, y_offset, z_offset]
+    return matrix
+
+
+def rotation_matrix(x_theta: float = 0.00, y_theta: float = 0.00, z_theta: float = 0.00):
+    """
+    Description:
+        Builds the 4x4 affine matrix that rotates a shape by the angles (in degrees)
+        x_theta, y_theta and z_theta around the x, y and z-axis. The rotation matrix is
+        R_x.R_y.R_z, i.e. the rotation around z is applied first.
     Parameters:
-        arr: 
-            The stl array to be rotated
         x_theta:
             in yz plane or around x-axis
         y_theta:
@@ -133,7 +678,7 @@ def rotate(arr: np.ndarray,
         z_theta:
             in xy plane or around z-axis
     Returns:
-        Rotated stl array.
+        4x4 numpy array
     """
     x_theta = np.radians(x_theta)
     y_theta = np.radians(y_theta)
@@ -158,25 +703,229 @@ def rotate(arr: np.ndarray,
         [np.sin(z_theta), np.cos(z_theta), 0],
         [0, 0, 1]
     ])
-    BigR = np.dot(R_x, np.dot(R_y, R_z))
+    matrix = np.eye(4)
+    matrix[:3, :3] = np.dot(R_x, np.dot(R_y, R_z))
+    return matrix
+
+
+def scaling_matrix(x_scale: float = 1.00, y_scale: float = 1.00, z_scale: float = 1.00):
+    """
+    Description:
+        Builds the 4x4 affine matrix that scales a shape along the x, y and z-axis.
+    Parameters:
+        x_scale, y_scale, z_scale:
+            scale factor along the x, y and z-axis.
+    Returns:
+        4x4 numpy array
+    """
+    return np.diag([x_scale, y_scale, z_scale, 1.0])
+
+
+def mirror_matrix(plane: str = "xy"):
+    """
+    Description:
+        Builds the 4x4 affine matrix that mirrors a shape on one of the coordinate planes.
+    Parameters:
+        plane:
+            "xy", "yz" or "xz". Mirroring on "xy" flips the z cordinates.
+    Returns:
+        4x4 numpy array
+    """
+    axis = {"yz": 0, "xz": 1, "xy": 2}
+    if plane not in axis:
+        raise ValueError(f"Unknown mirror plane {plane}, use one of 'xy', 'yz' or 'xz'.")
+    matrix = np.eye(4)
+    matrix[axis[plane], axis[plane]] = -1.0
+    return matrix
+
+
+def compose(*matrices: np.ndarray):
+    """
+    Description:
+        Composes a chain of 4x4 affine matrices into one matrix. The matrices are applied
+        in the order they are given, so the mesh only has to be touched once.
+    Parameters:
+        matrices:
+            4x4 affine matrices, the first one is applied first.
+    Returns:
+        4x4 numpy array
+    Example:
+        >>> m = compose(rotation_matrix(z_theta=90), translation_matrix(x_offset=1.0))
+        >>> moved = transform(arr, m)
+    """
+    matrix = np.eye(4)
+    for m in matrices:
+        matrix = np.dot(m, matrix)
+    return matrix
+
+
+@profiling.stage("core.transform")
+def transform(arr: np.ndarray, matrix: np.ndarray, inplace: bool = False):
+    """
+    Description:
+        Applies a 4x4 affine matrix to all vertices of a stl array in one matrix
+        multiplication. Normals are recomputed in one batch when the matrix does more
+        than a translation, and the vertex order is flipped for mirroring matrices so
+        the normals keep pointing outwards.
+    Parameters:
+        arr:
+            stl array of shape (4* number of triangles, 3) or a pistl.mesh.Mesh,
+            for a mesh only the shared vertices are transformed.
+        matrix:
+            4x4 affine matrix, see translation_matrix, rotation_matrix, scaling_matrix,
+            mirror_matrix and compose.
+        inplace:
+            overwrite arr with the result when True. Default is False, which leaves arr untouched.
+            arr must then be a float32 or float64 array, TypeError otherwise.
+    Returns:
+        transformed stl array (or Mesh) of the float type of arr
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    linear = matrix[:3, :3]
+    if isinstance(arr, Mesh):
+        return _transform_mesh(arr, matrix, inplace)
+    if inplace and not (isinstance(arr, np.ndarray) and arr.dtype in utilities.FLOAT_DTYPES):
+        raise TypeError("inplace needs a float32 or float64 array, "
+                        f"got {getattr(arr, 'dtype', type(arr).__name__)}.")
+    arr = utilities.as_float(arr)
     if arr.shape[0] % 4 == 0.00:
         arr = arr
     else:
         arr = arr[1:]
-    rotated_triangles = []
-    normals = []
-    for i in range(int(arr.shape[0]/4)):
-        point_1 = np.array([arr[4*i+1][0], arr[4*i+1][1], arr[4*i+1][2]])
-        point_2 = np.array([arr[4*i+2][0], arr[4*i+2][1], arr[4*i+2][2]])
-        point_3 = np.array([arr[4*i+3][0], arr[4*i+3][1], arr[4*i+3][2]])
-        rotated_point_1 = np.dot(BigR, point_1)
-        rotated_point_2 = np.dot(BigR, point_2)
-        rotated_point_3 = np.dot(BigR, point_3)
-        rotated_triangles.append(
-            [rotated_point_1, rotated_point_2, rotated_point_3])
-        n = utilities.find_normal(
-            rotated_point_1, rotated_point_2, rotated_point_3)
-        normals.append(n)
-    utilities.stl_writer(f"{filename}",
-                         f'{filename}', rotated_triangles, normals)
-    return None
\ No newline at end of file
+    facets = arr.reshape(-1, 4, 3)
+    out = facets if inplace else np.empty(facets.shape, dtype=facets.dtype)
+    # the matrix takes the float type of the array, so float32 stays float32
+    out[:, 1:] = np.dot(facets[:, 1:], linear.T.astype(out.dtype)) + matrix[:3, 3].astype(out.dtype)
+    if np.linalg.det(linear) < 0:
+        out[:, [2, 3]] = out[:, [3, 2]]
+    if np.array_equal(linear, np.eye(3)):
+        out[:, 0] = facets[:, 0]
+    else:
+        out[:, 0] = utilities.find_normals(out[:, 1:])
+    profiling.count(facets=out.shape[0], array=out)
+    return out.reshape(-1, 3)
+
+
+@profiling.stage("core.transform_many")
+def transform_many(arr: np.ndarray, matrices: np.ndarray):
+    """
+    Description:
+        Places copies of one stl array with a stack of 4x4 affine matrices in one batched
+        matrix multiplication, e.g. to write many instances of the same shape.
+        Normals are recomputed only for the copies whose matrix is more than a translation.
+    Parameters:
+        arr:
+            stl array of shape (4* number of triangles, 3) or a pistl.mesh.Mesh.
+        matrices:
+            array of shape (K, 4, 4), one affine matrix per copy.
+    Returns:
+        stl array of shape (K* 4* number of triangles, 3), the copies one after the other.
+    Example:
+        >>> rows = [translation_matrix(x_offset=2.0*i) for i in range(100)]
+        >>> arr = transform_many(cylinder_array, rows)
+    """
+    if isinstance(arr, Mesh):
+        arr = arr.to_array()
+    triangles, normals = utilities.as_facets(arr)
+    matrices = np.asarray(matrices, dtype=float).reshape(-1, 4, 4)
+    linear = matrices[:, :3, :3]
+    n_copies, n_facets = matrices.shape[0], triangles.shape[0]
+    out = np.empty((n_copies, n_facets, 4, 3), dtype=triangles.dtype)
+    vertices = np.matmul(triangles.reshape(1, -1, 3), linear.transpose(0, 2, 1).astype(out.dtype))
+    out[:, :, 1:] = (vertices + matrices[:, None, :3, 3].astype(out.dtype)).reshape(n_copies, n_facets, 3, 3)
+    mirrored = np.linalg.det(linear) < 0
+    out[mirrored, :, 2:] = out[mirrored][:, :, [3, 2]]
+    moved = ~np.all(linear == np.eye(3), axis=(1, 2))
+    out[~moved, :, 0] = normals
+    out[moved, :, 0] = utilities.find_normals(
+        out[moved, :, 1:]).reshape(-1, n_facets, 3)
+    profiling.count(facets=n_copies*n_facets, array=out)
+    return out.reshape(-1, 3)
+
+
+def _transform_mesh(mesh: Mesh, matrix: np.ndarray, inplace: bool):
+    """Applies the affine matrix to the shared vertices of a mesh."""
+    vertices = mesh.vertices
+    # the matrix takes the float type of the vertices, so float32 stays float32
+    linear = matrix[:3, :3].astype(vertices.dtype)
+    out = mesh if inplace else mesh.copy()
+    out.vertices = np.dot(vertices, linear.T) + matrix[:3, 3].astype(vertices.dtype)
+    if np.linalg.det(linear) < 0:
+        out.faces = out.faces[:, [0, 2, 1]]
+    return out
+
+
+def transform_blocks(blocks, matrix: np.ndarray):
+    """
+    Description:
+        Applies a 4x4 affine matrix to every block of a stream of stl arrays.
+        The blocks are transformed in place, as they are usually fresh arrays
+        from iter_stl_blocks.
+    Parameters:
+        blocks:
+            iterable of stl arrays.
+        matrix:
+            4x4 affine matrix, chain several operations with compose.
+    Returns:
+        generator of transformed stl arrays
+    """
+    for block in blocks:
+        yield transform(block, matrix, inplace=True)
+
+
+def translate(arr: np.ndarray, x_offset: float = 0.00, y_offset: float = 0.00, z_offset: float = 0.00,
+              inplace: bool = False):
+    """
+    Description:
+        Takes a stl array and translates it by a provided x_offset, y_offset and z_offset.
+    Parameters:
+        arr:
+            stl array that is translated
+        x_offset:
+            required distance along x-axis by which the stl has to be moved.
+        y_offset:
+            required distance along y-axis by which the stl has to be moved.
+        z_offset:
+            required distance along z-axis by which the stl has to be moved.
+        inplace:
+            overwrite arr with the result when True. Default is False.
+    Returns:
+        translated stl array
+    """
+    return transform(arr, translation_matrix(x_offset, y_offset, z_offset), inplace=inplace)
+
+
+def rotate(arr: np.ndarray,
+           x_theta: float = 0.00,
+           y_theta: float = 0.00,
+           z_theta: float = 0.00,
+           filename: str = None,
+           inplace: bool = False):
+    """
+    Description:
+        Rotates the stl file around the angles x_theta, y_theta and z_theta.
+        where x_theta is the rotation around x-axis or rotation in y-z plane and likewise.
+    Parameters:
+        arr: 
+            The stl array to be rotated
+        x_theta:
+            in yz plane or around x-axis
+        y_theta:
+            in xz plane or around y-axis
+        z_theta:
+            in xy plane or around z-axis
+        filename:
+            if provided the rotated stl is also written to this file.
+        inplace:
+            overwrite arr with the result when True. Default is False.
+    Returns:
+        Rotated stl array.
+    """
+    rotated = transform(arr, rotation_matrix(x_theta, y_theta, z_theta), inplace=inplace)
+    if filename is not None:
+        if isinstance(rotated, Mesh):
+            array_to_write = rotated.to_array()
+        else:
+            array_to_write = rotated
+        utilities.stl_writer(f"{filename}", f'{filename}', array_to_write)
+    return rotated
@@ -0,0 +1,335 @@
+# native python
+import time
+# dependecies
+import numpy as np
+# internal custom imports
+from . import utilities
+from .mesh import Mesh
+"""
+Module Content:
+1. Decimator : quadric error edge collapse over a whole mesh at once.
+2. decimate : reduces a geometry to a facet count or an error bound.
+3. lod_chain : several levels of detail of a geometry in one call.
+
+Every vertex carries the sum of the plane quadrics of its facets (Garland and Heckbert),
+and open boundaries add planes perpendicular to them so the outline is kept. A pass
+prices every edge, then collapses at the same time a large set of cheap edges whose
+ends are neither shared nor neighbours. These edges do not touch a common facet, so
+they are collapsed together with a few array operations instead of one by one from a
+priority queue.
+"""
+
+# collapses that turn a facet further than this cosine are rejected, this keeps folds out
+_MIN_NORMAL_COSINE = 0.2
+# weight of the planes that hold open boundaries in place
+_BOUNDARY_WEIGHT = 1000.0
+
+
+def _plane_quadrics(normals: np.ndarray, points: np.ndarray):
+    """(K, 4, 4) quadrics of the planes through points with the unit normals."""
+    planes = np.concatenate((normals, -np.einsum("ij,ij->i", normals, points)[:, None]), axis=1)
+    return planes[:, :, None]*planes[:, None, :]
+
+
+def _unit(vectors: np.ndarray):
+    length = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(length[:, None] > 0, vectors/length[:, None], 0.0)
+
+
+class Decimator(object):
+    """
+    Description:
+    ============
+    Reduces a triangle mesh by collapsing edges in passes. The state is kept between
+    calls of reduce, so a chain of levels continues from the previous level.
+
+    Attributes:
+    ===========
+    vertices:[np.ndarray]
+        vertex positions, collapsed vertices are left in place until to_mesh
+    faces:[np.ndarray]
+        (N, 3) vertex indices of the remaining facets
+    error:[float]
+        largest quadric error (square root, a length) of the collapses so far
+    passes:[int]
+        number of passes run so far
+
+    Example:
+    ========
+    >>> decimator = Decimator(core.stl_to_array('scan.stl'))
+    >>> preview = decimator.reduce(target_facets=5000).to_mesh()
+    """
+
+    def __init__(self, geometry, tolerance: float = 1e-9) -> None:
+        if isinstance(geometry, Mesh):
+            mesh = geometry
+        else:
+            mesh = Mesh.from_triangles(utilities.as_triangles(geometry), tolerance=tolerance)
+        self.vertices = np.array(mesh.vertices, dtype=float)
+        faces = np.asarray(mesh.faces, dtype=np.int64)
+        collapsed = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | \
+            (faces[:, 2] == faces[:, 0])
+        self.faces = faces[~collapsed]
+        self.error = 0.0
+        self.passes = 0
+        self._quadrics, self._boundary, self._locked = self._initial_state()
+
+    @property
+    def n_facets(self):
+        return self.faces.shape[0]
+
+    def _edges(self):
+        """Unique edges of the faces: ends, facets per edge and, per directed edge, its edge."""
+        n_vertices = self.vertices.shape[0]
+        start = self.faces.ravel()
+        end = self.faces[:, [1, 2, 0]].ravel()
+        low, high = np.minimum(start, end), np.maximum(start, end)
+        _, first, inverse, counts = np.unique(low*n_vertices + high, return_index=True,
+                                              return_inverse=True, return_counts=True)
+        return low[first], high[first], counts, inverse.reshape(-1)
+
+    def _initial_state(self):
+        n_vertices = self.vertices.shape[0]
+        triangles = self.vertices[self.faces]
+        normals = _unit(np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]))
+        quadrics = np.zeros((n_vertices, 4, 4))
+        face_quadrics = _plane_quadrics(normals, triangles[:, 0])
+        for corner in range(3):
+            np.add.at(quadrics, self.faces[:, corner], face_quadrics)
+
+        a, b, counts, inverse = self._edges()
+        boundary = np.zeros(n_vertices, dtype=bool)
+        locked = np.zeros(n_vertices, dtype=bool)
+        # vertices of non-manifold edges are never moved
+        locked[a[counts > 2]] = True
+        locked[b[counts > 2]] = True
+        # planes through the open edges, perpendicular to their facet
+        on_boundary = counts[inverse] == 1
+        if np.any(on_boundary):
+            start = self.faces.ravel()[on_boundary]
+            end = self.faces[:, [1, 2, 0]].ravel()[on_boundary]
+            face_normals = normals[np.flatnonzero(on_boundary)//3]
+            edge = self.vertices[end] - self.vertices[start]
+            length2 = np.einsum("ij,ij->i", edge, edge)
+            edge_quadrics = _plane_quadrics(_unit(np.cross(edge, face_normals)), self.vertices[start])
+            edge_quadrics *= (_BOUNDARY_WEIGHT*length2)[:, None, None]
+            np.add.at(quadrics, start, edge_quadrics)
+            np.add.at(quadrics, end, edge_quadrics)
+            boundary[start] = True
+            boundary[end] = True
+        return quadrics, boundary, locked
+
+    def reduce(self, target_facets: int = None, max_error: float = None):
+        """
+        Description:
+            Collapses edges until the mesh has at most target_facets facets, or until
+            no edge is left whose quadric error is at most max_error.
+        Parameters:
+            target_facets: number of facets to reach, default 0.
+            max_error: largest allowed quadric error, a length in the units of the mesh.
+        Returns:
+            the decimator, so calls can be chained
+        """
+        if target_facets is None and max_error is None:
+            raise ValueError("Expected a target_facets or a max_error.")
+        target_facets = 0 if target_facets is None else target_facets
+        while self.n_facets > target_facets:
+            if self._collapse_pass(target_facets, max_error) == 0:
+                break
+        return self
+
+    def to_mesh(self):
+        """The remaining facets as a Mesh without the collapsed vertices."""
+        used = np.unique(self.faces)
+        remap = np.zeros(self.vertices.shape[0], dtype=np.int64)
+        remap[used] = np.arange(used.size)
+        return Mesh(self.vertices[used], remap[self.faces])
+
+    def _optimal_positions(self, quadrics, a, b):
+        """Position of least error for every edge, among the optimum, both ends and the middle."""
+        A, g, c = quadrics[:, :3, :3], quadrics[:, :3, 3], quadrics[:, 3, 3]
+        # the columns of the adjugate of A are the cross products of its rows
+        adjugate = np.stack((np.cross(A[:, 1], A[:, 2]), np.cross(A[:, 2], A[:, 0]),
+                             np.cross(A[:, 0], A[:, 1])), axis=2)
+        det = np.einsum("ij,ij->i", A[:, 0], adjugate[:, :, 0])
+        scale = np.abs(A).max(axis=(1, 2))**3
+        solvable = np.abs(det) > 1e-10*scale
+        with np.errstate(divide="ignore", invalid="ignore"):
+            optimum = -np.einsum("nij,nj->ni", adjugate, g)/det[:, None]
+        optimum[~solvable] = 0.5*(a[~solvable] + b[~solvable])
+        candidates = np.stack((optimum, a, b, 0.5*(a + b)), axis=2)
+        cost = np.sum(candidates*(A @ candidates + 2*g[:, :, None]), axis=1) + c[:, None]
+        best = np.argmin(cost, axis=1)
+        rows = np.arange(best.size)
+        return candidates[rows, :, best], np.maximum(cost[rows, best], 0.0)
+
+    def _collapse_pass(self, target_facets: int, max_error: float):
+        n_vertices = self.vertices.shape[0]
+        a, b, counts, _ = self._edges()
+        positions, cost = self._optimal_positions(self._quadrics[a] + self._quadrics[b],
+                                                  self.vertices[a], self.vertices[b])
+        # an interior edge between two boundary vertices would pinch the surface
+        allowed = (counts <= 2) & ~self._locked[a] & ~self._locked[b] & \
+            ~((counts == 2) & self._boundary[a] & self._boundary[b])
+        if max_error is not None:
+            allowed &= np.sqrt(cost) <= max_error
+
+        # the cheaper half of the edges is collapsed in independent sets
+        if np.any(allowed):
+            allowed &= cost <= np.median(cost[allowed])
+        selected = self._independent_edges(a, b, allowed)
+        selected = selected[self._keeps_topology(a, b, counts, selected)]
+        selected = selected[self._keeps_orientation(a[selected], b[selected], positions[selected])]
+        if selected.size == 0:
+            return 0
+
+        # the cheapest collapses that do not go below the target
+        selected = selected[np.argsort(cost[selected], kind="stable")]
+        removed = np.cumsum(counts[selected])
+        selected = selected[removed - counts[selected] < self.n_facets - target_facets]
+
+        keep, drop = a[selected], b[selected]
+        self.vertices[keep] = positions[selected]
+        self._quadrics[keep] += self._quadrics[drop]
+        self._boundary[keep] |= self._boundary[drop]
+        remap = np.arange(n_vertices)
+        remap[drop] = keep
+        faces = remap[self.faces]
+        collapsed = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | \
+            (faces[:, 2] == faces[:, 0])
+        self.faces = faces[~collapsed]
+        self.error = max(self.error, float(np.sqrt(cost[selected].max())))
+        self.passes += 1
+        return selected.size
+
+    def _independent_edges(self, a, b, allowed, rounds: int = 8):
+        """
+        Description:
+            Picks edges whose ends are neither shared nor neighbours, so no facet touches
+            two of them. In every round an allowed edge is taken when its random priority
+            is the lowest among the allowed edges around its ends and their neighbours,
+            then the edges next to the taken ones are dropped.
+        """
+        n_vertices, n_edges = self.vertices.shape[0], a.size
+        priority = np.random.default_rng(self.passes).permutation(n_edges)
+        touched = np.zeros(n_vertices, dtype=bool)
+        selected = []
+        for _ in range(rounds):
+            allowed = allowed & ~touched[a] & ~touched[b]
+            if not np.any(allowed):
+                break
+            rank = np.where(allowed, priority, n_edges)
+            around = np.full(n_vertices, n_edges, dtype=np.int64)
+            np.minimum.at(around, a, rank)
+            np.minimum.at(around, b, rank)
+            near = around.copy()
+            np.minimum.at(near, a, around[b])
+            np.minimum.at(near, b, around[a])
+            taken = np.flatnonzero(allowed & (rank == near[a]) & (rank == near[b]))
+            selected.append(taken)
+            # the ends of the taken edges and all their neighbours
+            ends = np.zeros(n_vertices, dtype=bool)
+            ends[a[taken]] = True
+            ends[b[taken]] = True
+            touched |= ends
+            touched[a[ends[b]]] = True
+            touched[b[ends[a]]] = True
+        return np.concatenate(selected) if selected else np.zeros(0, dtype=np.int64)
+
+    def _keeps_topology(self, a, b, counts, selected):
+        """
+        Description:
+            Link condition: the ends of an edge may only share the neighbours opposite
+            to the edge in its facets, otherwise the collapse folds the surface.
+        """
+        n_vertices = self.vertices.shape[0]
+        keys = a*n_vertices + b
+        # neighbours of every vertex as a compressed list
+        owners = np.concatenate((a, b))
+        neighbours = np.concatenate((b, a))
+        order = np.argsort(owners, kind="stable")
+        neighbours = neighbours[order]
+        offsets = np.searchsorted(owners[order], np.arange(n_vertices + 1))
+        start, stop = offsets[a[selected]], offsets[a[selected] + 1]
+        lengths = stop - start
+        edge = np.repeat(np.arange(selected.size), lengths)
+        candidate = neighbours[np.repeat(start - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())]
+        other = b[selected][edge]
+        low, high = np.minimum(other, candidate), np.maximum(other, candidate)
+        position = np.clip(np.searchsorted(keys, low*n_vertices + high), 0, keys.size - 1)
+        shared = (keys[position] == low*n_vertices + high) & (candidate != other)
+        common = np.bincount(edge[shared], minlength=selected.size)
+        return common == counts[selected]
+
+    def _keeps_orientation(self, keep, drop, positions):
+        """Rejects the collapses that would turn one of the moved facets over."""
+        owner = np.full(self.vertices.shape[0], -1, dtype=np.int64)
+        owner[keep] = np.arange(keep.size)
+        owner[drop] = np.arange(drop.size)
+        corners = owner[self.faces]
+        moved = corners >= 0
+        # facets with both ends of an edge disappear, the ones with one end move
+        moving = np.flatnonzero(moved.sum(axis=1) == 1)
+        corner = np.argmax(moved[moving], axis=1)
+        edge = corners[moving, corner]
+        before = self.vertices[self.faces[moving]]
+        after = before.copy()
+        after[np.arange(moving.size), corner] = positions[edge]
+        n_before = np.cross(before[:, 1] - before[:, 0], before[:, 2] - before[:, 0])
+        n_after = np.cross(after[:, 1] - after[:, 0], after[:, 2] - after[:, 0])
+        cosine = np.einsum("ij,ij->i", _unit(n_before), _unit(n_after))
+        bad = np.zeros(keep.size, dtype=bool)
+        bad[edge[cosine < _MIN_NORMAL_COSINE]] = True
+        return ~bad
+
+
+def decimate(geometry, target_facets: int = None, max_error: float = None, tolerance: float = 1e-9):
+    """
+    Description:
+        Reduces a geometry with quadric error edge collapses.
+    Parameters:
+        geometry: stl array, triangles, Mesh or Shape.
+        target_facets: number of facets to reach.
+        max_error: largest allowed quadric error, a length in the units of the mesh.
+        tolerance: distance under which vertices are welded before the reduction.
+    Returns:
+        Mesh
+    Example:
+        >>> preview = decimate(sphere, target_facets=500)
+        >>> core.array_to_stl(preview, 'sphere_preview')
+    """
+    return Decimator(geometry, tolerance).reduce(target_facets, max_error).to_mesh()
+
+
+def lod_chain(geometry, ratios: tuple = (0.5, 0.25, 0.1), max_error: float = None,
+              tolerance: float = 1e-9):
+    """
+    Description:
+        Builds levels of detail, every level continues from the previous one.
+    Parameters:
+        geometry: stl array, triangles, Mesh or Shape.
+        ratios: facet count of every level as a fraction of the input, decreasing.
+        max_error: largest allowed quadric error of any level.
+        tolerance: distance under which vertices are welded before the reduction.
+    Returns:
+        tuple of the list of Meshes and a list of statistics per level
+        (ratio, target_facets, n_facets, n_vertices, error, seconds)
+    Example:
+        >>> levels, stats = lod_chain(core.stl_to_array('part.stl'), ratios=(0.5, 0.1))
+    """
+    decimator = Decimator(geometry, tolerance)
+    n_facets = decimator.n_facets
+    levels, stats = [], []
+    for ratio in ratios:
+        start = time.perf_counter()
+        target = int(round(ratio*n_facets))
+        mesh = decimator.reduce(target, max_error).to_mesh()
+        levels.append(mesh)
+        stats.append({"ratio": ratio,
+                      "target_facets": target,
+                      "n_facets": len(mesh),
+                      "n_vertices": mesh.vertices.shape[0],
+                      "error": decimator.error,
+                      "seconds": time.perf_counter() - start})
+    return levels, stats
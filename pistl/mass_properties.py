@@ -0,0 +1,146 @@
+# dependecies
+import numpy as np
+# internal custom imports
+from . import core, utilities
+"""
+Module Content:
+1. MassAccumulator : sums the mass properties of triangles added in chunks.
+2. mass_properties : volume, area, centroid, inertia and bounding box of a geometry.
+3. stl_mass_properties : the same for a stl file, read block by block.
+
+Every triangle spans a signed tetrahedron with a reference point. The volume, first and
+second moments of the solid are the sums over these tetrahedra, so all triangles of a
+chunk are handled with a few array operations and the chunks only add up a few numbers.
+The sums are kept in float64 relative to the first vertex seen, which keeps the
+cancellation of the signed terms small for parts far from the origin.
+"""
+
+
+class MassAccumulator(object):
+    """
+    Description:
+    ============
+    Running sums of the mass properties of a closed triangle mesh.
+
+    Attributes:
+    ===========
+    n_facets:[int]
+        number of triangles added
+    volume:[float]
+        signed volume, positive when the normals point outwards
+    area:[float]
+        surface area
+    lower, upper:[np.ndarray]
+        corners of the axis aligned bounding box
+
+    Example:
+    ========
+    >>> acc = MassAccumulator()
+    >>> for block in core.iter_stl_blocks('part.stl'):
+    >>>     acc.add(block)
+    >>> acc.result(density=7.85e-6)['mass']
+    """
+
+    def __init__(self) -> None:
+        self.n_facets = 0
+        self.volume = 0.0
+        self.area = 0.0
+        self.lower = np.full(3, np.inf)
+        self.upper = np.full(3, -np.inf)
+        self._reference = None
+        self._first_moment = np.zeros(3)
+        self._second_moment = np.zeros((3, 3))
+
+    def add(self, geometry):
+        """
+        Description:
+            Adds the triangles of a chunk.
+        Parameters:
+            geometry: stl array, triangles, Mesh or Shape, see utilities.as_triangles.
+        Returns:
+            the accumulator, so calls can be chained
+        """
+        # float32 input is summed in float64 like everything else
+        triangles = utilities.as_triangles(geometry, dtype=np.float64)
+        if triangles.shape[0] == 0:
+            return self
+        if self._reference is None:
+            self._reference = triangles[0, 0].copy()
+        v = triangles - self._reference
+        cross = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+        # signed volume of the tetrahedron of every triangle with the reference point
+        volumes = np.einsum("ij,ij->i", v[:, 0], np.cross(v[:, 1], v[:, 2]))/6.0
+        corners = v.sum(axis=1)
+        self.n_facets += triangles.shape[0]
+        self.volume += volumes.sum()
+        self.area += 0.5*np.sqrt(np.einsum("ij,ij->i", cross, cross)).sum()
+        self._first_moment += volumes @ corners/4.0
+        # integral of x x^T over a tetrahedron with one corner at the origin
+        self._second_moment += (np.einsum("n,nki,nkj->ij", volumes, v, v) +
+                                np.einsum("n,ni,nj->ij", volumes, corners, corners))/20.0
+        self.lower = np.minimum(self.lower, triangles.min(axis=(0, 1)))
+        self.upper = np.maximum(self.upper, triangles.max(axis=(0, 1)))
+        return self
+
+    def result(self, density: float = 1.0):
+        """
+        Description:
+            Mass properties of all triangles added so far.
+        Parameters:
+            density: mass per unit volume, default 1.0
+        Returns:
+            dictionary with
+                volume, area, mass : floats
+                centroid : (3,) center of the volume
+                inertia : (3, 3) inertia tensor about the centroid
+                bounds : (2, 3) lower and upper corner of the bounding box
+                n_facets : number of triangles
+            The centroid and inertia are nan when the volume is zero, e.g. for open surfaces.
+        """
+        reference = np.zeros(3) if self._reference is None else self._reference
+        with np.errstate(divide="ignore", invalid="ignore"):
+            centroid = self._first_moment/self.volume
+        # second moment about the centroid, then the inertia tensor of a uniform solid
+        second = self._second_moment - self.volume*np.outer(centroid, centroid)
+        inertia = density*(np.trace(second)*np.eye(3) - second)
+        return {"volume": self.volume,
+                "area": self.area,
+                "mass": density*self.volume,
+                "centroid": reference + centroid,
+                "inertia": inertia,
+                "bounds": np.stack((self.lower, self.upper)),
+                "n_facets": self.n_facets}
+
+
+def mass_properties(geometry, density: float = 1.0):
+    """
+    Description:
+        Computes the mass properties of a closed triangle mesh in one vectorized pass.
+    Parameters:
+        geometry: stl array from core.stl_to_array, triangles, Mesh or Shape.
+        density: mass per unit volume, default 1.0
+    Returns:
+        dictionary, see MassAccumulator.result
+    Example:
+        >>> props = mass_properties(core.stl_to_array('part.stl'))
+        >>> props['volume'], props['centroid']
+    """
+    return MassAccumulator().add(geometry).result(density)
+
+
+def stl_mass_properties(stl: str, density: float = 1.0, block_size: int = core.STL_BLOCK_SIZE):
+    """
+    Description:
+        Computes the mass properties of a stl file block by block, so the file never has
+        to fit in memory.
+    Parameters:
+        stl: string filehandle of an ascii or binary stl.
+        density: mass per unit volume, default 1.0
+        block_size: number of triangles read at a time.
+    Returns:
+        dictionary, see MassAccumulator.result
+    """
+    accumulator = MassAccumulator()
+    for block in core.iter_stl_blocks(stl, block_size):
+        accumulator.add(block)
+    return accumulator.result(density)
@@ -0,0 +1,167 @@
+# dependecies
+import numpy as np
+# internal custom imports
+from . import utilities
+"""
+Module Content:
+1. Mesh : indexed triangle mesh with shared vertices.
+
+The stl array of the core module stores (normal, v1, v2, v3) for every triangle, so
+a vertex shared by six triangles is stored six times. A Mesh keeps every vertex once
+and refers to it from an int32 face array. Normals are derived when needed.
+"""
+
+# large odd 64 bit constants used to mix the three integer cordinates into one hash
+_HASH_MULTIPLIERS = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F))
+
+
+class Mesh(object):
+    """
+    Description:
+    ============
+    Indexed triangle mesh made of deduplicated vertices and faces that point into them.
+
+    Attributes:
+    ===========
+    vertices:[np.ndarray]
+        (V, 3) float32 or float64 array of unique vertices
+    faces:[np.ndarray]
+        (F, 3) int32 array, every row holds the indices of the three vertices of a triangle
+    normals:[np.ndarray]
+        (F, 3) unit normals of the faces, computed on first access and cached
+    """
+
+    def __init__(self, vertices, faces) -> None:
+        self._vertices = utilities.as_float(vertices).reshape(-1, 3)
+        self._faces = np.asarray(faces, dtype=np.int32).reshape(-1, 3)
+        self._normals = None
+
+    @property
+    def vertices(self):
+        return self._vertices
+
+    @vertices.setter
+    def vertices(self, value):
+        self._vertices = utilities.as_float(value).reshape(-1, 3)
+        self._normals = None
+
+    @property
+    def faces(self):
+        return self._faces
+
+    @faces.setter
+    def faces(self, value):
+        self._faces = np.asarray(value, dtype=np.int32).reshape(-1, 3)
+        self._normals = None
+
+    @property
+    def normals(self):
+        if self._normals is None:
+            self._normals = utilities.find_normals(self.triangles)
+        return self._normals
+
+    @property
+    def triangles(self):
+        """(F, 3, 3) array with the cordinates of the three vertices of every face."""
+        return self._vertices[self._faces]
+
+    @property
+    def nbytes(self):
+        """Memory held by the vertex and face arrays."""
+        return self._vertices.nbytes + self._faces.nbytes
+
+    def __len__(self):
+        return self._faces.shape[0]
+
+    def copy(self):
+        return Mesh(self._vertices.copy(), self._faces.copy())
+
+    def to_array(self):
+        """
+        Description:
+            Converts the mesh to the (4* number of triangles, 3) stl array of the core module.
+        Returns:
+            stl array with the normal followed by the three vertices of every triangle.
+        """
+        arr = np.empty((len(self), 4, 3), dtype=self._vertices.dtype)
+        arr[:, 0] = self.normals
+        arr[:, 1:] = self.triangles
+        return arr.reshape(-1, 3)
+
+    @classmethod
+    def from_triangles(cls, triangles, tolerance: float = 1e-9):
+        """
+        Description:
+            Builds a mesh from a (N, 3, 3) array or list of triangles by welding the
+            vertices that fall in the same cell of a grid of size tolerance.
+        Parameters:
+            triangles:
+                num_triangles x 3 x 3 list or array of triangles.
+            tolerance:
+                distance under which two vertices are merged. 0 merges exact duplicates only.
+        Returns:
+            Mesh
+        Example:
+            >>> mesh = Mesh.from_triangles([[[0, 0, 0], [1, 0, 0], [0, 1, 0]],
+                                            [[1, 0, 0], [1, 1, 0], [0, 1, 0]]])
+            >>> mesh.vertices.shape
+            (4, 3)
+        """
+        points = utilities.as_float(triangles).reshape(-1, 3)
+        first, inverse = weld_vertices(points, tolerance)
+        return cls(points[first], inverse.reshape(-1, 3))
+
+    @classmethod
+    def from_array(cls, arr: np.ndarray, tolerance: float = 1e-9):
+        """
+        Description:
+            Builds a mesh from the (4* number of triangles, 3) stl array of the core module.
+            The normals stored in the array are dropped and derived again from the faces.
+        Parameters:
+            arr:
+                stl array, a leading [0,0,0] row is ignored.
+            tolerance:
+                distance under which two vertices are merged.
+        Returns:
+            Mesh
+        """
+        triangles, _ = utilities.as_facets(arr)
+        return cls.from_triangles(triangles, tolerance=tolerance)
+
+
+def weld_vertices(points: np.ndarray, tolerance: float = 1e-9):
+    """
+    Description:
+        Finds the unique vertices of a point cloud. Every point is snapped to a grid of
+        size tolerance and the three integer cordinates are hashed to one int64, so the
+        duplicates are found with a 1-D sort of the hashes.
+    Parameters:
+        points:
+            (P, 3) array of points.
+        tolerance:
+            grid size, 0 compares the exact float values.
+    Returns:
+        tuple of the index of the first point of every unique vertex and, for every
+        point, the index of its unique vertex.
+    """
+    # the grid cells are found in float64 whatever the type of the points
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if points.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    if tolerance > 0:
+        keys = np.round(points/tolerance).astype(np.int64)
+    else:
+        # -0.0 and 0.0 are the same point
+        keys = (points + 0.0).view(np.int64)
+    # a polynomial in the cordinates, a xor of the scaled cordinates collides on regular grids
+    unsigned = keys.view(np.uint64)
+    hashes = (unsigned[:, 0]*_HASH_MULTIPLIERS[0] + unsigned[:, 1])*_HASH_MULTIPLIERS[1] + unsigned[:, 2]
+    _, first, inverse = np.unique(
+        hashes, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    if not np.array_equal(keys[first][inverse], keys):
+        # two different cells share a hash, fall back to comparing the full keys
+        _, first, inverse = np.unique(
+            keys, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    return first, inverse.astype(np.int32)
@@ -3,3 +3,8 @@
 class Visualization_Exceptions(Exception):
     def __init__(self, *args: object) -> None:
         super().__init__(*args)
+
+
+class STL_Parsing_Exceptions(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
@@ -0,0 +1,280 @@
+# native python
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+"""
+Module Content:
+1. profile : context manager that records the stages of the package run inside it.
+2. Profile : the recorded stages, with summary and to_json.
+3. start, stop : begin and end a profile without a with block.
+4. stage : decorator recording every call of a function as a stage.
+5. span : context manager recording a block of code as a stage.
+6. count : adds facets, written bytes and an array size to the running stage.
+7. enabled : True while a profile is recording.
+
+The instrumentation is off unless a profile is running, then every instrumented call
+costs one check of a module global. Setting the environment variable PISTL_PROFILE
+profiles the whole process: PISTL_PROFILE=1 prints the JSON report to stderr at exit,
+any other value is taken as the path of the JSON report.
+
+Every stage is recorded with its wall time, the time spent in its nested stages, the
+facets it processed, the bytes it handed to a file and the largest array it counted.
+Stages nest per thread, so the stages of a worker thread have no parent.
+"""
+
+# the running Profile, None when the instrumentation is off
+_profile = None
+# stack of the open stages of every thread
+_local = threading.local()
+# returned by span when the instrumentation is off
+_NULL_SPAN = nullcontext()
+
+
+class Profile(object):
+    """
+    Description:
+    ============
+    The stages recorded while a profile runs. Every stage is a dictionary with
+        name : name of the stage, e.g. "utilities.stl_writer"
+        parent : name of the enclosing stage in the same thread, or None
+        depth : number of enclosing stages
+        thread : name of the thread that ran the stage
+        start : seconds from the start of the profile to the start of the stage
+        seconds : wall time of the stage
+        self_seconds : wall time without the nested stages
+        facets : facets processed by the stage
+        nbytes : bytes handed to a file by the stage
+        peak_array_nbytes : size of the largest array counted in the stage
+
+    Parameters:
+    ===========
+    callback: called with every stage dictionary when the stage ends, e.g. to feed a
+              metrics system. It runs in the thread of the stage.
+    """
+
+    def __init__(self, callback=None) -> None:
+        self.callback = callback
+        self.records = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _add(self, record: dict):
+        with self._lock:
+            self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def summary(self):
+        """
+        Description:
+            Totals of the records per stage name.
+        Returns:
+            dictionary of stage name to calls, seconds, self_seconds, facets, nbytes and
+            peak_array_nbytes, ordered by the self time, largest first
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["name"], {"calls": 0, "seconds": 0.0,
+                                                       "self_seconds": 0.0, "facets": 0,
+                                                       "nbytes": 0, "peak_array_nbytes": 0})
+            total["calls"] += 1
+            for key in ("seconds", "self_seconds", "facets", "nbytes"):
+                total[key] += record[key]
+            total["peak_array_nbytes"] = max(total["peak_array_nbytes"], record["peak_array_nbytes"])
+        return dict(sorted(totals.items(), key=lambda item: -item[1]["self_seconds"]))
+
+    def to_json(self, path: str = None):
+        """
+        Description:
+            The records and the summary as a JSON document.
+        Parameters:
+            path: writes the document to this file as well when given.
+        Returns:
+            JSON string
+        """
+        text = json.dumps({"records": self.records, "summary": self.summary()}, indent=1)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+
+class _Span(object):
+    """One running stage, the record is added to the profile when it ends."""
+    __slots__ = ("profile", "name", "parent", "depth", "begin", "nested", "facets",
+                 "nbytes", "peak")
+
+    def __init__(self, profile: Profile, name: str) -> None:
+        self.profile = profile
+        self.name = name
+        self.nested = 0.0
+        self.facets = 0
+        self.nbytes = 0
+        self.peak = 0
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.begin
+        _stack().pop()
+        if self.parent is not None:
+            self.parent.nested += seconds
+        self.profile._add({"name": self.name,
+                           "parent": None if self.parent is None else self.parent.name,
+                           "depth": self.depth,
+                           "thread": threading.current_thread().name,
+                           "start": self.begin - self.profile._origin,
+                           "seconds": seconds,
+                           "self_seconds": seconds - self.nested,
+                           "facets": self.facets,
+                           "nbytes": self.nbytes,
+                           "peak_array_nbytes": self.peak})
+        return False
+
+
+def _stack():
+    """Open stages of the current thread."""
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+def enabled():
+    """True while a profile is recording."""
+    return _profile is not None
+
+
+def start(callback=None):
+    """
+    Description:
+        Starts recording, replacing the running profile if any.
+    Parameters:
+        callback: see Profile.
+    Returns:
+        the new Profile
+    """
+    global _profile
+    _profile = Profile(callback)
+    return _profile
+
+
+def stop():
+    """Stops recording and returns the profile that ran, or None."""
+    global _profile
+    profile, _profile = _profile, None
+    return profile
+
+
+@contextmanager
+def profile(callback=None, output: str = None):
+    """
+    Description:
+        Records the stages of the package run inside the with block.
+    Parameters:
+        callback: called with every stage dictionary when the stage ends.
+        output: path of a JSON report written when the block ends.
+    Returns:
+        the Profile
+    Example:
+        >>> with profiling.profile(output='export_profile.json') as p:
+        >>>     cylinder.export('cylinder.stl', 'cylinder')
+        >>> p.summary()['utilities.format']['seconds']
+    """
+    global _profile
+    previous = _profile
+    current = start(callback)
+    try:
+        yield current
+    finally:
+        _profile = previous
+        if output is not None:
+            current.to_json(output)
+
+
+def span(name: str):
+    """
+    Description:
+        Records a block of code as a stage.
+    Parameters:
+        name: name of the stage.
+    Example:
+        >>> with profiling.span("utilities.write"):
+        >>>     f.write(text)
+    """
+    if _profile is None:
+        return _NULL_SPAN
+    return _Span(_profile, name)
+
+
+def stage(name: str):
+    """
+    Description:
+        Decorator recording every call of a function as a stage.
+    Parameters:
+        name: name of the stage.
+    Example:
+        >>> @profiling.stage("core.read")
+        >>> def stl_to_array(stl):
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profile is None:
+                return func(*args, **kwargs)
+            with _Span(_profile, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(facets: int = 0, nbytes: int = 0, array=None):
+    """
+    Description:
+        Adds to the counters of the innermost running stage of the current thread.
+        Nothing is counted outside a stage or when the instrumentation is off.
+    Parameters:
+        facets: number of facets processed.
+        nbytes: number of bytes handed to a file.
+        array: a numpy array, its size updates the peak array size of the stage.
+    """
+    if _profile is None:
+        return None
+    stack = _stack()
+    if not stack:
+        return None
+    current = stack[-1]
+    current.facets += int(facets)
+    current.nbytes += int(nbytes)
+    if array is not None:
+        current.peak = max(current.peak, int(array.nbytes))
+    return None
+
+
+def _report(destination: str):
+    """Writes the profile of the process at exit, see PISTL_PROFILE."""
+    current = stop()
+    if current is None:
+        return None
+    if destination == "1":
+        sys.stderr.write(current.to_json() + "\n")
+    else:
+        current.to_json(destination)
+    return None
+
+
+if os.environ.get("PISTL_PROFILE", "0") not in ("", "0"):
+    start()
+    atexit.register(_report, os.environ["PISTL_PROFILE"])
@@ -0,0 +1,128 @@
+# dependecies
+import numpy as np
+# internal custom imports
+from . import core, utilities, shapes
+from .mesh import Mesh
+"""
+Module Content:
+1. Scene : assembly of shared geometries placed many times with affine matrices.
+
+Every geometry is tessellated once. Its instances only keep a 4x4 matrix, and all the
+instances of a geometry are placed with one call of core.transform_many on export.
+"""
+
+
+class Scene(object):
+    """
+    Description:
+    ============
+    Assembly of many placed shapes written as one stl.
+
+    Attributes:
+    ===========
+    name:[str]
+        name of the solid in the written stl, default "scene"
+    geometries:[list]
+        stl arrays of the shared geometries
+    instances:[list]
+        (geometry index, 4x4 matrix) of every placed instance
+
+    Example:
+    ========
+    >>> scene = Scene("fixture")
+    >>> pin = scene.add_geometry(shapes.Cylinder())
+    >>> for i in range(100):
+    >>>     scene.add(pin, core.translation_matrix(x_offset=2.0*i))
+    >>> scene.export("fixture.stl")
+    """
+
+    def __init__(self, name: str = "scene") -> None:
+        self.name = name
+        self.geometries = []
+        self.instances = []
+        # the objects the geometries were made from, to find them again in add_geometry
+        self._sources = []
+
+    def __len__(self):
+        return len(self.instances)
+
+    @property
+    def n_facets(self):
+        """Number of triangles of the whole assembly."""
+        return sum(self.geometries[g].shape[0]//4 for g, _ in self.instances)
+
+    def add_geometry(self, geometry):
+        """
+        Description:
+            Adds a shared geometry. Adding the same object again returns the index it
+            already has, so it is not tessellated twice.
+        Parameters:
+            geometry:
+                a pistl.shapes Shape, a pistl.mesh.Mesh or a stl array.
+        Returns:
+            index of the geometry
+        """
+        for index, source in enumerate(self._sources):
+            if source is geometry:
+                return index
+        if isinstance(geometry, Mesh):
+            arr = geometry.to_array()
+        else:
+            if isinstance(geometry, shapes.Shape):
+                triangles, normals = geometry.triangles, geometry.normals
+            else:
+                triangles, normals = utilities.as_facets(geometry)
+            arr = np.concatenate((normals[:, None], triangles), axis=1).reshape(-1, 3)
+        self.geometries.append(arr)
+        self._sources.append(geometry)
+        return len(self.geometries) - 1
+
+    def add(self, geometry, *matrices: np.ndarray):
+        """
+        Description:
+            Places an instance of a geometry.
+        Parameters:
+            geometry:
+                index returned by add_geometry, or a geometry that is added first.
+            matrices:
+                4x4 affine matrices from pistl.core, composed in the given order.
+                Without matrices the instance stays where the geometry is.
+        Returns:
+            index of the instance
+        Example:
+            >>> scene.add(pin, core.rotation_matrix(x_theta=90), core.translation_matrix(5, 0, 0))
+        """
+        if not isinstance(geometry, (int, np.integer)):
+            geometry = self.add_geometry(geometry)
+        self.instances.append((int(geometry), core.compose(*matrices)))
+        return len(self.instances) - 1
+
+    def to_array(self):
+        """
+        Description:
+            Places all instances. The instances of each geometry are transformed together
+            in one batched operation, so the output is grouped by geometry.
+        Returns:
+            stl array of the whole assembly
+        """
+        blocks = []
+        for g, arr in enumerate(self.geometries):
+            matrices = [m for i, m in self.instances if i == g]
+            if matrices:
+                blocks.append(core.transform_many(arr, np.stack(matrices)))
+        if not blocks:
+            return np.zeros((0, 3), dtype=utilities.get_float_dtype())
+        return np.concatenate(blocks)
+
+    def export(self, filename: str, binary: bool = False, precision: int = None):
+        """
+        Description:
+            Writes the whole assembly as one stl file.
+        Parameters:
+            filename: string filename of the .stl file
+            binary: writes a binary stl when True. Default is False.
+            precision: digits after the decimal point in an ascii file, in scientific notation.
+        """
+        utilities.stl_writer(filename, self.name, self.to_array(),
+                             binary=binary, precision=precision)
+        return None
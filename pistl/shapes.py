@@ -1,12 +1,8 @@
-# native python
-import os
 # dependecies
 import numpy as np
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
-import pyvista as pv
 # internal custom imports
-from . import utilities, pist_exceptions
+from . import utilities, pist_exceptions, cache, validation, profiling
+from .mesh import Mesh
 """
 Module Content:
 1. Shape
@@ -16,9 +12,54 @@ Module Content:
 5. Tetrahedron
 6. Pyramid
 7. Sphere : Create Octahedron, hexagon etc using special cases of the spheres.
+8. tessellate_many : stl arrays of many shapes, the shapes of one topology in one batch.
+
+The points and triangles are built by broadcasting over a leading variant axis of
+length V, a single shape is a batch of one. tessellate_many stacks the parameters of
+the shapes with the same class and resolutions, so a whole family of shapes is built
+with the same few numpy calls as one shape.
 """
 
 
+def _ring(x, y, z):
+    """Stacks cordinates (scalars or arrays of the same length) into points of shape (n, 3)."""
+    x = np.asarray(x, dtype=float)
+    return np.stack(np.broadcast_arrays(x, np.asarray(y, dtype=float),
+                                        np.asarray(z, dtype=float)), axis=-1)
+
+
+def _triangles_from_points(p1, p2, p3):
+    """Stacks three arrays of points of shape (V, ..., 3) into triangles of shape (V, n, 3, 3)."""
+    triangles = np.stack(np.broadcast_arrays(p1, p2, p3), axis=-2)
+    return triangles.reshape(triangles.shape[0], -1, 3, 3)
+
+
+def _fan(apex, ring):
+    """Triangles (apex, ring[i], ring[i+1]) for every segment of rings of shape (V, n, 3)."""
+    return _triangles_from_points(apex, ring[:, :-1], ring[:, 1:])
+
+
+def _linspace(start, stop, num: int):
+    """np.linspace along the last axis for scalars or (V,) arrays of start and stop values.
+    The values of a variant are the ones np.linspace gives for its scalars."""
+    start, stop = np.asarray(start, dtype=float), np.asarray(stop, dtype=float)
+    if start.ndim == 0 or not np.any(start == stop):
+        return np.linspace(start, stop, num, axis=-1)
+    # np.linspace changes its arithmetic for all rows when one row has no step
+    return np.stack([np.linspace(a, b, num) for a, b in zip(start, stop)])
+
+
+def _circle_xy(radius, center_x, center_y, resolution: int):
+    """x and y of circles, the radii and centers are scalars or (V, 1) arrays."""
+    theta = np.linspace(0, 2*np.pi, resolution)
+    return radius*np.cos(theta) + center_x, radius*np.sin(theta) + center_y
+
+
+def _column(shapes: list, attribute: str):
+    """(V, k) float array of an attribute of every shape, k is 1 for scalars."""
+    return np.array([np.ravel(getattr(shape, attribute)) for shape in shapes], dtype=float)
+
+
 class Shape(object):
     """
     Description:
@@ -30,9 +71,35 @@ class Shape(object):
         1. Create the shape
         2. export the shape
         3. visualize the shape
+
+    The triangles of a created shape are cached in pistl.cache.shape_cache, keyed on
+    the attributes listed in _create_parameters (as they were at create) and
+    _export_parameters (as they are at export).
+
+    The triangles, normals and mesh properties are computed lazily: the shape is
+    (re)created when needed, tessellated on first access and kept until one of the
+    parameters is assigned a new value, e.g. circle.radius = 2.0. Lists such as
+    centers must be assigned as a whole, changing them in place is not noticed.
+
+    The triangles are float64 unless dtype is set to np.float32, either on the shape
+    or for the whole package with pistl.utilities.set_float_dtype.
     """
+    # attributes the created points depend on
+    _create_parameters = ()
+    # attributes only read when the triangles are made
+    _export_parameters = ()
+    # attributes passed to create when the shape is recreated lazily
+    _create_arguments = ()
+    # attributes that fix the number and order of the triangles, shapes of one class
+    # with the same values are built together by tessellate_many. None builds one by one
+    _topology_parameters = None
+    # values of _create_parameters at the last create, None before create
+    _created_parameters = None
+    # float type of the triangles, None for utilities.get_float_dtype()
+    dtype = None
 
     def __init__(self) -> None:
+        self._lazy = {}
         self.x = None
         self.y = None
         self.z = None
@@ -41,16 +108,62 @@ class Shape(object):
         self.filename = None
         self.shapename = None
 
+    def __setattr__(self, name, value):
+        """Drops the lazily computed triangles and mesh when a parameter of the shape changes."""
+        object.__setattr__(self, name, value)
+        if name in self._create_parameters or name in self._export_parameters:
+            object.__setattr__(self, "_lazy", {})
+
     def create(self):
         """Should be overwritten by child class depending on how to prodcuce that shape."""
         return None
 
+    @property
+    def triangles(self):
+        """(N, 3, 3) read-only array of the triangles, computed on first access."""
+        return self._lazy_stl_array().reshape(-1, 4, 3)[:, 1:]
+
+    @property
+    def normals(self):
+        """(N, 3) read-only array of the normals of the triangles."""
+        return self._lazy_stl_array().reshape(-1, 4, 3)[:, 0]
+
+    def to_array(self):
+        """
+        Description:
+            Returns the (4* number of triangles, 3) stl array of the core module, the
+            normal followed by the three vertices of every triangle. The array is
+            read-only, it is shared with the tessellation cache.
+        Example:
+            >>> moved = core.translate(sphere.to_array(), x_offset=5.0)
+        """
+        return self._lazy_stl_array()
+
+    @property
+    def mesh(self):
+        """The shape as pistl.mesh.Mesh, computed on first access."""
+        if "mesh" not in self._lazy:
+            self._lazy["mesh"] = self.to_mesh()
+        return self._lazy["mesh"]
+
     def export(self, filename: str, shapename: str):
         """Exports the shape in desired format.(Right now only stl)"""
         # set the provided filename to be the exported shape
         self.filename = filename
         self.shapename = shapename
 
+    async def export_async(self, filename: str, shapename: str):
+        """
+        Description:
+            Awaitable export. The shape is tessellated and written in the bounded executor
+            of pistl.aio, so the event loop stays free while the file is written. Several
+            exports of the same shape may run at the same time.
+        Example:
+            >>> await sphere.export_async('sphere.stl', 'sphere')
+        """
+        from . import aio
+        return await aio.export_async(self, filename, shapename)
+
     def visualize(self):
         """Set as a method but calls a utility function written in the utulities module.
         It is written here for the context of using an object and then being able to visualize it
@@ -62,17 +175,118 @@ class Shape(object):
             raise pist_exceptions.Visualization_Exceptions(
                 "Failed to visualize your shape.")
 
-    @staticmethod
-    def _write_triangles_and_normals(triangle_list: list, normal_list: list, p1: list, p2: list, p3: list):
+    def _triangles(self):
+        """Should be overwritten by child class and return the list of triangles of the shape,
+        each triangle is a list of three points: [p1, p2, p3]."""
+        return []
+
+    def _derive_parameters(self):
+        """Sets the parameters create derives from others, overwritten by e.g. Cuboid."""
+        return None
+
+    @classmethod
+    def _batch_points(cls, shapes: list):
+        """Should be overwritten by child classes with a _topology_parameters. Returns the
+        created points of the shapes, as create stores them, with a leading variant axis."""
+        raise NotImplementedError
+
+    def _connect(self, *points):
+        """Should be overwritten by child classes with a _topology_parameters. Returns the
+        (V, N, 3, 3) triangles of the points of _batch_points."""
+        raise NotImplementedError
+
+    def _connect_one(self, *points):
+        """(N, 3, 3) triangles of the created points of this shape, a batch of one."""
+        return self._connect(*[np.asarray(p, dtype=float)[None] for p in points])[0]
+
+    def to_mesh(self, tolerance: float = 1e-9):
+        """
+        Description:
+            Returns the created shape as an indexed pistl.mesh.Mesh with welded vertices.
+        Parameters:
+            tolerance: distance under which two vertices are merged.
+        """
+        return Mesh.from_array(self._lazy_stl_array(), tolerance=tolerance)
+
+    def validate(self, tolerance: float = 1e-9):
         """
         Description:
-            Takes in a scheme of three points and adds to a list of triangles and normals in the stl.
-        Paremters:
-            triangle_list: list of triangles in the stl.
-            normal_list: list of normals of the traingles in the stl
-            p1, p2 and p3 are list objects that are three points on a triangle."""
-        triangle_list.append([p1, p2, p3])
-        normal_list.append(list(utilities.find_normal(p1, p2, p3)))
+            Checks the created shape for open and non-manifold edges, inconsistent winding,
+            degenerate and duplicate facets, see pistl.validation.validate.
+        Parameters:
+            tolerance: distance under which two vertices are merged.
+        Returns:
+            dictionary report
+        """
+        return validation.validate(self.to_mesh(tolerance))
+
+    def _lazy_stl_array(self):
+        """
+        Description:
+            Returns the stl array of the shape and keeps it until a parameter changes.
+            The shape is created first if it never was or if its parameters changed
+            since the last create.
+        """
+        if "stl" in self._lazy and self._lazy["stl"].dtype != utilities.float_dtype(self.dtype):
+            # the float type was changed since the triangles were made
+            object.__setattr__(self, "_lazy", {})
+        if "stl" not in self._lazy:
+            if self._created_parameters != self._current_parameters():
+                self.create(*[getattr(self, a) for a in self._create_arguments])
+            self._lazy["stl"] = self._stl_array()
+        return self._lazy["stl"]
+
+    def _current_parameters(self):
+        """Canonical values of the _create_parameters as they are now."""
+        return tuple(cache.canonical(getattr(self, p)) for p in self._create_parameters)
+
+    def _remember_parameters(self):
+        """Called at the end of create, keeps the values the created points are made of."""
+        self._created_parameters = self._current_parameters()
+        self._lazy = {}
+        return None
+
+    def _cache_key(self, created_parameters: tuple = None):
+        """Canonical tuple of the class name and the geometric parameters of the shape,
+        with the parameters of the last create unless others are given."""
+        if created_parameters is None:
+            created_parameters = self._created_parameters
+        export_values = tuple(cache.canonical(getattr(self, p))
+                              for p in self._export_parameters)
+        return (type(self).__name__,) + created_parameters + export_values + \
+            (utilities.float_dtype(self.dtype).name,)
+
+    def _stl_array(self):
+        """
+        Description:
+            Returns the stl array (normal and three vertices per triangle) of the shape.
+            It is tessellated once per parameter set and afterwards taken from the cache.
+        """
+        if self._created_parameters is None or cache.shape_cache is None:
+            return self._tessellate()
+        return cache.shape_cache.get_or_compute(self._cache_key(), self._tessellate)
+
+    @profiling.stage("shapes.tessellate")
+    def _tessellate(self):
+        """Builds the stl array from the triangles, the normals are computed in one batch."""
+        dtype = utilities.float_dtype(self.dtype)
+        triangles = np.asarray(self._triangles(), dtype=dtype).reshape(-1, 3, 3)
+        arr = np.empty((triangles.shape[0], 4, 3), dtype=dtype)
+        arr[:, 0] = utilities.find_normals(triangles)
+        arr[:, 1:] = triangles
+        profiling.count(facets=arr.shape[0], array=arr)
+        return arr.reshape(-1, 3)
+
+    @profiling.stage("shapes.export")
+    def _write_stl(self, filename: str, shapename: str):
+        """
+        Description:
+            Writes the triangles of the shape to filename. The names are passed in and not
+            read back from the shape, so concurrent exports of one shape (see export_async)
+            each write their own file.
+        """
+        triangles, normals = utilities.as_facets(self._lazy_stl_array())
+        utilities.stl_writer(filename, shapename, triangles, normals)
         return None
 
 
@@ -101,6 +315,9 @@ class Circle(Shape):
     resolution:[int]
         number of points in the 2D polygon, higher number gets smoother circle.
     """
+    _create_parameters = ("_radius", "_center", "resolution", "_elevation")
+    _create_arguments = ("_elevation",)
+    _topology_parameters = ("resolution",)
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -111,6 +328,7 @@ class Circle(Shape):
         self._area = np.pi*(np.power(self._radius, 2))
         self._perimeter = 2*np.pi*self._radius
         self.resolution = 10
+        self._elevation = 0.0
 
     @property
     def radius(self):
@@ -128,6 +346,7 @@ class Circle(Shape):
     def area(self):
         return np.pi*(np.power(self._radius, 2))
 
+    @profiling.stage("shapes.Circle.create")
     def create(self, elevation=0.0):
         """
         Description:
@@ -144,10 +363,10 @@ class Circle(Shape):
         >>> circle.create() # creates a circle of elevation of 0.0
         >>> circle.create(elevation=10.0) # creates the circle at z = 10.0
         """
-        theta = np.linspace(0, 2*np.pi, self.resolution)
-        self.x = self._radius*np.cos(theta) + self._center[0]
-        self.y = self._radius*np.sin(theta) + self._center[1]
+        self._elevation = elevation
+        self.x, self.y = _circle_xy(self._radius, self._center[0], self._center[1], self.resolution)
         self.z = [elevation]*len(self.x)
+        self._remember_parameters()
         return None
 
     def visualize(self):
@@ -174,18 +393,29 @@ class Circle(Shape):
         >>> circle.visualize()
         >>> circle.export('circle.stl', circle)
         """
-        triangle_list = []
-        normal_list = []
+        self._write_stl(filename, shapename)
+        return None
+
+    def _triangles(self):
+        """Triangles of the created circle, see _connect."""
         assert (len(self.x) == len(self.y)
                 ), "length of x and y should be same, found different."
-        for i in range(len(self.x)-1):
-            p1 = [0, 0, self.z[i]]
-            p2 = [self.x[i], self.y[i], self.z[i]]
-            p3 = [self.x[i+1], self.y[i+1], self.z[i]]
-            self._write_triangles_and_normals(
-                triangle_list, normal_list, p1, p2, p3)
-        utilities.stl_writer(filename, shapename, triangle_list, normal_list)
-        return None
+        return self._connect_one(self.x, self.y, self.z)
+
+    @classmethod
+    def _batch_points(cls, shapes: list):
+        """x, y and z of shape (V, resolution) of the circles of all shapes."""
+        center = _column(shapes, "_center")
+        x, y = _circle_xy(_column(shapes, "_radius"), center[:, :1], center[:, 1:2],
+                          shapes[0].resolution)
+        return x, y, np.broadcast_to(_column(shapes, "_elevation"), x.shape)
+
+    def _connect(self, x, y, z):
+        """Triangle fan from the origin at the elevation of the circle."""
+        ring = _ring(x, y, z)
+        # adding 0.0 turns the -0.0 of negative cordinates times 0.0 into 0.0
+        apex = ring[:, :-1]*[0.0, 0.0, 1.0] + 0.0
+        return _fan(apex, ring)
 
 
 class Cylinder(Shape):
@@ -217,6 +447,10 @@ class Cylinder(Shape):
     close:[bool]
         False (to create open top cyclinder)
     """
+    _create_parameters = ("_base_circle_radius", "_base_circle_center", "_top_circle_radius",
+                          "_top_circle_center", "resolution")
+    _export_parameters = ("close",)
+    _topology_parameters = ("resolution", "close")
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -233,6 +467,7 @@ class Cylinder(Shape):
         self.resolution = 10
         self.close = False
 
+    @profiling.stage("shapes.Cylinder.create")
     def create(self):
         """
         Description:
@@ -248,19 +483,16 @@ class Cylinder(Shape):
         >>> cyl.close = True
         >>> cyl.create()
         """
-        # create the base circle
         self.theta = np.linspace(0, 2*np.pi, self.resolution)
-        self.base_x = self._base_circle_radius * \
-            np.cos(self.theta) + self._base_circle_center[0]
-        self.base_y = self._base_circle_radius * \
-            np.sin(self.theta) + self._base_circle_center[1]
+        # create the base circle
+        self.base_x, self.base_y = _circle_xy(self._base_circle_radius, self._base_circle_center[0],
+                                              self._base_circle_center[1], self.resolution)
         self.base_z = len(self.base_x)*self._base_circle_center[2]
         # create the top circle
-        self.top_x = self._top_circle_radius * \
-            np.cos(self.theta) + self._top_circle_center[0]
-        self.top_y = self._top_circle_radius * \
-            np.sin(self.theta) + self._top_circle_center[1]
+        self.top_x, self.top_y = _circle_xy(self._top_circle_radius, self._top_circle_center[0],
+                                            self._top_circle_center[1], self.resolution)
         self.top_z = len(self.top_x)*self._top_circle_center[2]
+        self._remember_parameters()
         return None
 
     def visualize(self):
@@ -277,41 +509,44 @@ class Cylinder(Shape):
             shapename: name of the object that is created
         """
         super().export(filename=filename, shapename=shapename)
-        triangle_list = []
-        normal_list = []
+        self._write_stl(filename, shapename)
+        return None
+
+    def _triangles(self):
+        """Triangles of the created cylinder, see _connect."""
         assert (len(self.base_x) == len(self.base_y)
                 ), "length of x and y should be same, found different."
-        # first set of triangles
-        for i in range(len(self.base_x)-1):
-            p1 = [self.base_x[i], self.base_y[i], self.base_z]
-            p2 = [self.top_x[i+1], self.top_y[i+1], self.top_z]
-            p3 = [self.top_x[i], self.top_y[i], self.top_z]
-            self._write_triangles_and_normals(
-                triangle_list, normal_list, p1, p2, p3)
-        # second set of triangles
-        for i in range(len(self.base_x)-1):
-            p1 = [self.base_x[i], self.base_y[i], self.base_z]
-            p2 = [self.base_x[i+1], self.base_y[i+1], self.base_z]
-            p3 = [self.top_x[i+1], self.top_y[i+1], self.top_z]
-            self._write_triangles_and_normals(
-                triangle_list, normal_list, p1, p2, p3)
+        return self._connect_one(self.base_x, self.base_y, self.base_z,
+                                 self.top_x, self.top_y, self.top_z)
+
+    @classmethod
+    def _batch_points(cls, shapes: list):
+        """x and y of shape (V, resolution) and z of shape (V,) of the base and top circles."""
+        resolution = shapes[0].resolution
+        points = []
+        for radius, center in (("_base_circle_radius", "_base_circle_center"),
+                               ("_top_circle_radius", "_top_circle_center")):
+            center = _column(shapes, center)
+            points += _circle_xy(_column(shapes, radius), center[:, :1], center[:, 1:2], resolution)
+            # the elevation is the resolution times the z of the center, as create makes it
+            points.append(resolution*center[:, 2])
+        return tuple(points)
+
+    def _connect(self, base_x, base_y, base_z, top_x, top_y, top_z):
+        """Side wall of the cylinder and, if close is True, the top and bottom faces."""
+        base = _ring(base_x, base_y, base_z[:, None])
+        top = _ring(top_x, top_y, top_z[:, None])
+        triangle_sets = [
+            # first set of triangles
+            _triangles_from_points(base[:, :-1], top[:, 1:], top[:, :-1]),
+            # second set of triangles
+            _triangles_from_points(base[:, :-1], base[:, 1:], top[:, 1:])]
         if self.close == True:
             # close top face
-            for i in range(len(self.top_x)-1):
-                p1 = [0, 0, self.top_z]
-                p2 = [self.top_x[i], self.top_y[i], self.top_z]
-                p3 = [self.top_x[i+1], self.top_y[i+1], self.top_z]
-                self._write_triangles_and_normals(
-                    triangle_list, normal_list, p1, p2, p3)
+            triangle_sets.append(_fan(_ring(0.0, 0.0, top_z)[:, None], top))
             # close bottom face
-            for i in range(len(self.base_x)-1):
-                p1 = [0, 0, self.base_z]
-                p2 = [self.base_x[i+1], self.base_y[i+1], self.base_z]
-                p3 = [self.base_x[i], self.base_y[i], self.base_z]
-                self._write_triangles_and_normals(
-                    triangle_list, normal_list, p1, p2, p3)
-        utilities.stl_writer(filename, shapename, triangle_list, normal_list)
-        return None
+            triangle_sets.append(_fan(_ring(0.0, 0.0, base_z)[:, None], base[:, ::-1])[:, ::-1])
+        return np.concatenate(triangle_sets, axis=1)
 
 
 class Cuboid(Cylinder):
@@ -331,6 +566,7 @@ class Cuboid(Cylinder):
     close:[bool]
         False (to produce open top cuboid)    
     """
+    _create_parameters = Cylinder._create_parameters + ("_side_length",)
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -350,10 +586,15 @@ class Cuboid(Cylinder):
         self.resolution = 5
         return None
 
-    def create(self):
-        """Inherits a cylinder and sets sides and resolution to create a cuboid."""
+    def _derive_parameters(self):
         self._set_side()
         self._set_resolution()
+        return None
+
+    @profiling.stage("shapes.Cuboid.create")
+    def create(self):
+        """Inherits a cylinder and sets sides and resolution to create a cuboid."""
+        self._derive_parameters()
         return super().create()
 
     def visualize(self):
@@ -383,8 +624,10 @@ class Tetrahedron(Circle):
         super().__init__(*args, **kwargs)
         self.name = "Tetrahedron"
         self.resolution = 4
+        self._elevation = -2.0
         self.close = True
 
+    @profiling.stage("shapes.Tetrahedron.create")
     def create(self, elevation=-2.0):
         """Creates a tetrahedron with base elevation i.e. z"""
         return super().create(elevation)
@@ -401,19 +644,12 @@ class Tetrahedron(Circle):
             filename: string filename of the .stl file
             shapename: name of the object that is created."""
         super().export(filename=filename, shapename=shapename)
-        triangle_list = []
-        normal_list = []
-        assert (len(self.x) == len(self.y)
-                ), "length of x and y should be same, found different."
-        for i in range(len(self.x)-1):
-            p1 = [0, 0, 0]
-            p2 = [self.x[i], self.y[i], self.z[i]]
-            p3 = [self.x[i+1], self.y[i+1], self.z[i]]
-            self._write_triangles_and_normals(
-                triangle_list, normal_list, p1, p2, p3)
-        utilities.stl_writer(filename, shapename, triangle_list, normal_list)
         return None
 
+    def _connect(self, x, y, z):
+        """Triangle fan from the apex at the origin to the base circle."""
+        return _fan([0.0, 0.0, 0.0], _ring(x, y, z))
+
 
 class Pyramid(Tetrahedron):
     """
@@ -430,13 +666,17 @@ class Pyramid(Tetrahedron):
     close:[bool]
         True  
     """
+    _export_parameters = ("close",)
+    _topology_parameters = ("resolution", "close")
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.name = "Pyramid"
         self.resolution = 5
+        self._elevation = -2
         self.close = False
 
+    @profiling.stage("shapes.Pyramid.create")
     def create(self, elevation=-2):
         return super().create(elevation)
 
@@ -452,31 +692,18 @@ class Pyramid(Tetrahedron):
             filename: string filename of the .stl file
             shapename: name of the object that is created."""
         super().export(filename=filename, shapename=shapename)
-        triangle_list = []
-        normal_list = []
-        assert (len(self.x) == len(self.y)
-                ), "Length of x and y should be same, found different."
+        return None
+
+    def _connect(self, x, y, z):
+        """Triangle fan from the apex to the base and, if close is True, the base."""
+        base = _ring(x, y, z)
         # the dome loop
-        for i in range(len(self.x)-1):
-            p1 = [0, 0, 0]
-            p2 = [self.x[i], self.y[i], self.z[i]]
-            p3 = [self.x[i+1], self.y[i+1], self.z[i]]
-            self._write_triangles_and_normals(
-                triangle_list, normal_list, p1, p2, p3)
+        triangles = _fan([0.0, 0.0, 0.0], base)
         # close the base
         if self.close == True:
-            p1 = [self.x[0], self.y[0], self.z[0]]
-            p2 = [self.x[1], self.y[1], self.z[1]]
-            p3 = [self.x[2], self.y[2], self.z[2]]
-            self._write_triangles_and_normals(
-                triangle_list, normal_list, p1, p2, p3)
-            p1 = [self.x[0], self.y[0], self.z[0]]
-            p2 = [self.x[-1], self.y[-1], self.z[-1]]
-            p3 = [self.x[-2], self.y[-2], self.z[-2]]
-            self._write_triangles_and_normals(
-                triangle_list, normal_list, p1, p2, p3)
-        utilities.stl_writer(filename, shapename, triangle_list, normal_list)
-        return None
+            triangles = np.concatenate(
+                (triangles, base[:, [[0, 1, 2], [0, -1, -2]]]), axis=1)
+        return triangles
 
 
 class Sphere(Shape):
@@ -498,6 +725,9 @@ class Sphere(Shape):
     resolution_latitudes:[int]  
         20 (how many circles are being drawn to stitch the sphere, think of latitudes on earth)
     """
+    _create_parameters = ("radius", "resoultion_longitude", "resolution_latitude", "_min_radius")
+    _create_arguments = ("_min_radius",)
+    _topology_parameters = ("resoultion_longitude", "resolution_latitude")
 
     def __init__(self) -> None:
         super().__init__()
@@ -506,6 +736,7 @@ class Sphere(Shape):
         self.radius = 1.0
         self.resoultion_longitude = 20
         self.resolution_latitude = 20
+        self._min_radius = 0.1
         self.name = "Sphere"
 
     def _radius_variation(self, min_radius):
@@ -515,23 +746,38 @@ class Sphere(Shape):
         Parameters:
             min_radius:
                 Minimum radius of the circle on top of the sphere."""
-        self.radius_list = []
-        lin_space = np.linspace(self.radius, min_radius,
-                                int(self.resoultion_longitude/2))
-        for l in lin_space:
-            temp_rad = np.sqrt(np.power(self.radius, 2) - np.power(l, 2))
-            self.radius_list.append(temp_rad)
-        lin_space = np.linspace(min_radius, self.radius,
-                                int(self.resoultion_longitude/2))
-        for l in lin_space:
-            temp_rad = np.sqrt(np.power(self.radius, 2) - np.power(l, 2))
-            self.radius_list.append(temp_rad)
+        self.radius_list = self._latitude_radii(self.radius, min_radius, self.resoultion_longitude)
+
+    @staticmethod
+    def _latitude_radii(radius, min_radius, resoultion_longitude: int):
+        """Radii of the circles of latitude, radius and min_radius are scalars or (V,) arrays."""
+        radius = np.asarray(radius, dtype=float)
+        lin_space = np.concatenate((
+            _linspace(radius, min_radius, int(resoultion_longitude/2)),
+            _linspace(min_radius, radius, int(resoultion_longitude/2))), axis=-1)
+        return np.sqrt(np.power(radius[..., None], 2) - np.power(lin_space, 2))
 
+    @staticmethod
+    def _grid(latitude, radius_list, resolution_latitude: int):
+        """x, y and z grids of the circles of latitude, with a leading variant axis if
+        latitude and radius_list have one."""
+        theta = np.linspace(0, 2*np.pi, resolution_latitude)
+        # one circle per latitude, the elevation of each circle is the latitude.
+        # adding 0.0 turns -0.0 into 0.0 like the center offset of Circle.create does
+        radius = radius_list[..., None]
+        x = radius*np.cos(theta) + 0.0
+        y = radius*np.sin(theta) + 0.0
+        z = np.repeat(latitude[..., None], len(theta), axis=-1)
+        return x, y, z
+
+    @profiling.stage("shapes.Sphere.create")
     def create(self, min_radius: float = 0.1):
         """
         Description:
         ============
             Creates the required circles of latitudes for the spheres.
+            The x, y and z cordinates are stored as grids of shape
+            (resoultion_longitude, resolution_latitude), one row per latitude.
 
         Parameters:
         ===========
@@ -545,17 +791,13 @@ class Sphere(Shape):
         >>> sphere.export('sphere.stl', 'sphere')
         >>> sphere.visualize()
         """
-        self.circle_list = []
+        self._min_radius = min_radius
         self.latitude = np.linspace(-self.radius/1.0,
                                     self.radius/1.0, self.resoultion_longitude)
         self._radius_variation(min_radius=min_radius)
-        for i, l in enumerate(self.latitude):
-            circle = Circle()
-            circle.radius = self.radius_list[i]
-            circle.resolution = self.resolution_latitude
-            # it looks like 1.0 but the elevation is actually l as in L.
-            circle.create(elevation=l)
-            self.circle_list.append(circle)
+        self.x, self.y, self.z = self._grid(self.latitude, self.radius_list,
+                                            self.resolution_latitude)
+        self._remember_parameters()
         return None
 
     def visualize(self):
@@ -567,41 +809,95 @@ class Sphere(Shape):
         Creates a stack of circles.
         """
         super().export(filename=filename, shapename=shapename)
-        triangle_list = []
-        normal_list = []
-        # creates stack of disks
-        for j in range(len(self.circle_list)-1):
-            circle_1 = self.circle_list[j]
-            circle_2 = self.circle_list[j+1]
-            # first set of triangle
-            #  i x> i+1                  > circle 2
-            #  x   x
-            #  i x                       > circle 1
-            for i in range(len(circle_1.x)-1):
-                p1 = [circle_1.x[i], circle_1.y[i], circle_1.z[i]]
-                p2 = [circle_2.x[i+1], circle_2.y[i+1], circle_2.z[i+1]]
-                p3 = [circle_2.x[i], circle_2.y[i], circle_2.z[i]]
-                self._write_triangles_and_normals(
-                    triangle_list, normal_list, p1, p2, p3)
-            # add next set of triangles
-            #  i x                       > circle 2
-            #  x   x
-            #  i x> i+1                  > circle 1
-            for i in range(len(circle_1.x)-1):
-                p1 = [circle_1.x[i], circle_1.y[i], circle_1.z[i]]
-                p2 = [circle_1.x[i+1], circle_1.y[i+1], circle_1.z[i+1]]
-                p3 = [circle_2.x[i+1], circle_2.y[i+1], circle_2.z[i+1]]
-                self._write_triangles_and_normals(
-                    triangle_list, normal_list, p1, p2, p3)
-        # close the top
-        end_circle = [self.circle_list[0], self.circle_list[-1]]
-        for i in range(len(end_circle)):
-            cur_circle = end_circle[i]
-            for j in range(len(cur_circle.x)-1):
-                p1 = [0, 0, cur_circle.z[j]]
-                p2 = [cur_circle.x[j], cur_circle.y[j], cur_circle.z[j]]
-                p3 = [cur_circle.x[j+1], cur_circle.y[j+1], cur_circle.z[j+1]]
-                self._write_triangles_and_normals(
-                    triangle_list, normal_list, p1, p2, p3)
-        utilities.stl_writer(filename, shapename, triangle_list, normal_list)
+        self._write_stl(filename, shapename)
         return None
+
+    def _triangles(self):
+        """Triangles of the created sphere, see _connect."""
+        return self._connect_one(self.x, self.y, self.z)
+
+    @classmethod
+    def _batch_points(cls, shapes: list):
+        """x, y and z grids of shape (V, resoultion_longitude, resolution_latitude)."""
+        radius = _column(shapes, "radius")[:, 0]
+        latitude = _linspace(-radius/1.0, radius/1.0, shapes[0].resoultion_longitude)
+        radius_list = cls._latitude_radii(radius, _column(shapes, "_min_radius")[:, 0],
+                                          shapes[0].resoultion_longitude)
+        return cls._grid(latitude, radius_list, shapes[0].resolution_latitude)
+
+    def _connect(self, x, y, z):
+        """Bands of triangles between neighbouring latitudes and a fan at both ends."""
+        grid = _ring(x, y, z)
+        # first set of triangle
+        #  i x> i+1                  > latitude j+1
+        #  x   x
+        #  i x                       > latitude j
+        first = np.stack((grid[:, :-1, :-1], grid[:, 1:, 1:], grid[:, 1:, :-1]), axis=-2)
+        # next set of triangles
+        #  i x                       > latitude j+1
+        #  x   x
+        #  i x> i+1                  > latitude j
+        second = np.stack((grid[:, :-1, :-1], grid[:, :-1, 1:], grid[:, 1:, 1:]), axis=-2)
+        bands = np.stack((first, second), axis=2).reshape(grid.shape[0], -1, 3, 3)
+        # close the top and the bottom
+        ends = [_fan(ring[:, :-1]*[0.0, 0.0, 1.0] + 0.0, ring)
+                for ring in (grid[:, 0], grid[:, -1])]
+        return np.concatenate([bands] + ends, axis=1)
+
+@profiling.stage("shapes.tessellate_many")
+def tessellate_many(shapes: list):
+    """
+    Description:
+        Stl arrays of many shapes. The shapes need their parameters set, they need not
+        be created. Shapes of one class with the same resolutions share a topology: the
+        points and triangles of all of them are built in one broadcast over a leading
+        variant axis and their normals in one call of find_normals. The arrays go through
+        cache.shape_cache, shapes with cached parameters and repeated shapes are not
+        tessellated again.
+    Parameters:
+        shapes: list of shapes.
+    Returns:
+        list of the read-only stl arrays, in the order of shapes
+    Example:
+        >>> cylinders = []
+        >>> for radius in np.linspace(1.0, 5.0, 1000):
+        >>>     cylinder = Cylinder()
+        >>>     cylinder._base_circle_radius = cylinder._top_circle_radius = radius
+        >>>     cylinders.append(cylinder)
+        >>> arrays = tessellate_many(cylinders)
+    """
+    arrays = [None]*len(shapes)
+    groups = {}
+    for index, shape in enumerate(shapes):
+        if shape._topology_parameters is None:
+            arrays[index] = shape.to_array()
+            continue
+        shape._derive_parameters()
+        key = shape._cache_key(shape._current_parameters())
+        cached = None if cache.shape_cache is None else cache.shape_cache.get(key)
+        if cached is not None:
+            arrays[index] = cached
+            continue
+        dtype = utilities.float_dtype(shape.dtype)
+        topology = (type(shape), dtype.name) + tuple(cache.canonical(getattr(shape, p))
+                                                     for p in shape._topology_parameters)
+        groups.setdefault(topology, {}).setdefault(key, []).append(index)
+    for (cls, dtype_name, *_), members in groups.items():
+        # one shape per distinct key, in a batch of V shapes with N triangles each
+        batch = [shapes[indices[0]] for indices in members.values()]
+        triangles = np.asarray(batch[0]._connect(*cls._batch_points(batch)), dtype=dtype_name)
+        n_shapes, n_facets = triangles.shape[:2]
+        block = np.empty((n_shapes, n_facets, 4, 3), dtype=dtype_name)
+        normals = utilities.find_normals(triangles.reshape(-1, 3, 3))
+        block[:, :, 0] = normals.reshape(n_shapes, n_facets, 3)
+        block[:, :, 1:] = triangles
+        profiling.count(facets=n_shapes*n_facets, array=block)
+        for (key, indices), arr in zip(members.items(), block):
+            arr = arr.reshape(-1, 3)
+            if cache.shape_cache is not None:
+                arr = cache.shape_cache.put(key, arr)
+            else:
+                arr.flags.writeable = False
+            for index in indices:
+                arrays[index] = arr
+    return arrays
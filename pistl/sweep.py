@@ -0,0 +1,189 @@
+# native python
+import os
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+# internal custom imports
+from . import utilities, compression, profiling, shapes
+"""
+Module Content:
+1. grid : full factorial list of parameter sets.
+2. Sweep : family of variants of one shape class, tessellated in batches and exported.
+
+The variants are tessellated with shapes.tessellate_many: the parameters of the variants
+with the same resolutions are stacked along a variant axis, and their points, triangles
+and normals are built in one broadcast. The arrays are the ones the shapes make one by
+one and they go through cache.shape_cache, so repeated variants are tessellated once.
+The variants are written to their own files through a thread pool or to one multi-solid
+ascii file, and every export reports its throughput in parts per second.
+"""
+
+
+def grid(**parameters):
+    """
+    Description:
+        Every combination of the given parameter values, the last parameter varies fastest.
+    Parameters:
+        parameters: attribute name of the shape and the list of its values.
+    Returns:
+        list of dictionaries of attribute name to value
+    Example:
+        >>> grid(radius=[1.0, 2.0], resolution_latitude=[10, 20])
+        [{'radius': 1.0, 'resolution_latitude': 10}, {'radius': 1.0, 'resolution_latitude': 20},
+         {'radius': 2.0, 'resolution_latitude': 10}, {'radius': 2.0, 'resolution_latitude': 20}]
+    """
+    names = list(parameters)
+    return [dict(zip(names, values)) for values in itertools.product(*parameters.values())]
+
+
+class Sweep(object):
+    """
+    Description:
+    ============
+    Family of variants of one pistl.shapes class.
+
+    Attributes:
+    ===========
+    shape_class:[type]
+        class of the shapes, e.g. shapes.Cylinder
+    variants:[list]
+        dictionary of attribute values of every variant
+    names:[list]
+        solid name and file stem of every variant
+    dtype:
+        float type of the stl arrays, None for utilities.get_float_dtype()
+
+    Parameters:
+    ===========
+    shape_class: class of the shapes.
+    parameters: dictionary of attribute name to a list of values, swept as a full
+                factorial with grid, or a list of dictionaries, one per variant.
+    name: format string of the variant names. It is formatted with the index, the
+          lower case class name as shape and the attribute values of the variant, so
+          the variants must not have attributes called index or shape.
+    dtype: np.float32 or np.float64.
+
+    Example:
+    ========
+    >>> variants = [dict(v, _top_circle_radius=v["_base_circle_radius"])
+    >>>             for v in grid(_base_circle_radius=np.linspace(1, 5, 20),
+    >>>                           _top_circle_center=[[0, 0, h] for h in range(1, 11)])]
+    >>> sweep = Sweep(shapes.Cylinder, variants, name="pin_{index}")
+    >>> report = sweep.export("pins", binary=True)
+    >>> report["parts_per_second"]
+    """
+
+    def __init__(self, shape_class, parameters, name: str = "{shape}_{index}", dtype=None) -> None:
+        self.shape_class = shape_class
+        self.variants = grid(**parameters) if isinstance(parameters, dict) else list(parameters)
+        for variant in self.variants:
+            reserved = sorted({"index", "shape"} & set(variant))
+            if reserved:
+                raise ValueError(f"the attributes {reserved} cannot be swept, index and shape "
+                                 f"are reserved for the variant names.")
+        self.names = [name.format(index=i, shape=shape_class.__name__.lower(), **variant)
+                      for i, variant in enumerate(self.variants)]
+        self.dtype = dtype
+
+    def __len__(self):
+        return len(self.variants)
+
+    def shape(self, index: int):
+        """
+        Description:
+            The shape of one variant, its triangles are made when they are first used.
+        Parameters:
+            index: index of the variant.
+        Returns:
+            the shape with the attribute values of the variant
+        """
+        shape = self.shape_class()
+        for attribute, value in self.variants[index].items():
+            setattr(shape, attribute, value)
+        shape.dtype = self.dtype
+        return shape
+
+    @profiling.stage("sweep.tessellate")
+    def tessellate(self):
+        """
+        Description:
+            Tessellates all variants with shapes.tessellate_many, the variants of the
+            same resolutions in one batch.
+        Returns:
+            list of the read-only stl arrays of the variants, in the order of variants
+        """
+        return shapes.tessellate_many([self.shape(index) for index in range(len(self))])
+
+    @profiling.stage("sweep.export")
+    def export(self, directory: str, binary: bool = False, precision: int = None,
+               compression: str = None, jobs: int = None):
+        """
+        Description:
+            Writes every variant to its own file, directory/<name>.stl, through a pool
+            of jobs threads.
+        Parameters:
+            directory: folder of the files, created if missing.
+            binary: writes binary stl files when True. Default is False.
+            precision: digits after the decimal point in ascii files, in scientific notation.
+            compression: "gz", "bz2" or "xz" writes compressed files.
+            jobs: number of files written at the same time, default is the thread
+                  pool default.
+        Returns:
+            report dictionary, see _report
+        """
+        start = time.perf_counter()
+        os.makedirs(directory, exist_ok=True)
+        suffix = ".stl" if compression is None else f".stl.{compression}"
+        files = [os.path.join(directory, name + suffix) for name in self.names]
+        arrays = self.tessellate()
+
+        def write(item):
+            filename, name, arr = item
+            utilities.stl_writer(filename, name, arr, binary=binary, precision=precision)
+            return filename
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            files = list(pool.map(write, zip(files, self.names, arrays)))
+        return self._report(arrays, files, start)
+
+    @profiling.stage("sweep.export")
+    def export_solids(self, filename: str, precision: int = None):
+        """
+        Description:
+            Writes all variants to one ascii stl file, one named solid per variant.
+        Parameters:
+            filename: string filename of the .stl file, .gz, .bz2 or .xz compress it.
+            precision: digits after the decimal point, in scientific notation.
+        Returns:
+            report dictionary, see _report
+        Example:
+            >>> sweep.export_solids('pins.stl')
+            >>> pin = core.read_solid('pins.stl', 'cylinder_7')
+        """
+        start = time.perf_counter()
+        arrays = self.tessellate()
+        with compression.open_stl(filename, 'w') as f:
+            for name, arr in zip(self.names, arrays):
+                triangles, normals = utilities.as_facets(arr)
+                utilities.write_ascii_solid(f, name, triangles, normals, precision=precision)
+        return self._report(arrays, [filename], start)
+
+    def _report(self, arrays: list, files: list, start: float):
+        """
+        Description:
+            Throughput of an export.
+        Returns:
+            dictionary with
+                n_parts, n_facets : variants and facets written
+                seconds : wall time of the tessellation and the writing
+                parts_per_second, facets_per_second : throughput
+                files : written filenames
+        """
+        seconds = time.perf_counter() - start
+        n_facets = sum(arr.shape[0]//4 for arr in arrays)
+        return {"n_parts": len(arrays),
+                "n_facets": n_facets,
+                "seconds": seconds,
+                "parts_per_second": len(arrays)/seconds if seconds > 0 else float("inf"),
+                "facets_per_second": n_facets/seconds if seconds > 0 else float("inf"),
+                "files": files}
@@ -1,15 +1,97 @@
 import numpy as np
 import os
-import pyvista as pv
-from . import pist_exceptions
+from . import pist_exceptions, compression, profiling
 # stl writer
+# binary stl writer
+# facet helpers
 # find_normal
+# float dtype
 
+# record of a binary stl facet: 12 float32 and a uint16 attribute, 50 bytes in total.
+# The facets follow an 80 byte header and a uint32 facet count.
+STL_BINARY_DTYPE = np.dtype([("normal", "<f4", (3,)),
+                             ("vertices", "<f4", (3, 3)),
+                             ("attribute", "<u2")])
+STL_BINARY_HEADER_SIZE = 80
+# start of the header of the binary files written by the package, the solid name follows
+STL_BINARY_HEADER_PREFIX = "pistl binary stl: "
+# number of facets formatted into one text buffer by the ascii writers
+STL_ASCII_CHUNK_SIZE = 4096
+_FACET_TEMPLATE = ("facet normal {0} {0} {0}\nouter loop\n"
+                   "vertex {0} {0} {0}\nvertex {0} {0} {0}\nvertex {0} {0} {0}\n"
+                   "endloop\nendfacet\n")
+# floating point types the arrays of the package can be kept in
+FLOAT_DTYPES = (np.dtype(np.float32), np.dtype(np.float64))
+# type of the arrays read from files and lists and made by the shapes, see set_float_dtype
+_float_dtype = np.dtype(np.float64)
 
-def stl_writer(filename: str, stl_name: str, triangles: list, facet_normals: list = []):
+
+def set_float_dtype(dtype):
+    """
+    Description:
+        Sets the floating point type of the arrays the package makes from files, lists
+        and shapes. float32 halves the memory of the stl arrays and is the precision a
+        binary stl stores anyway. Arrays passed in keep their own float type and the
+        functions taking a dtype argument can override the setting per call.
+    Parameters:
+        dtype - np.float32 or np.float64 (the default)
+    Returns:
+        the previous dtype
+    Example:
+        >>> previous = set_float_dtype(np.float32)
+        >>> arr = core.stl_to_array('scan.stl')  # float32
+        >>> set_float_dtype(previous)
+    """
+    global _float_dtype
+    previous = _float_dtype
+    _float_dtype = float_dtype(dtype)
+    return previous
+
+
+def get_float_dtype():
+    """The floating point type set with set_float_dtype."""
+    return _float_dtype
+
+
+def float_dtype(dtype=None):
+    """
+    Description:
+        Checks a float dtype argument, None stands for the dtype of set_float_dtype.
+    Returns:
+        np.dtype float32 or float64
+    """
+    if dtype is None:
+        return _float_dtype
+    dtype = np.dtype(dtype)
+    if dtype not in FLOAT_DTYPES:
+        raise ValueError(f"Expected float32 or float64, got {dtype}.")
+    return dtype
+
+
+def as_float(values, dtype=None):
+    """
+    Description:
+        Brings values to a float array without copying a float32 or float64 array.
+    Parameters:
+        values - array or nested list
+        dtype - float type of the result. Default is None, which keeps the type of a
+                float32 or float64 array and uses the type of set_float_dtype otherwise.
+    Returns:
+        np.ndarray
+    """
+    if dtype is None and isinstance(values, np.ndarray) and values.dtype in FLOAT_DTYPES:
+        return values
+    return np.asarray(values, dtype=float_dtype(dtype))
+
+
+@profiling.stage("utilities.stl_writer")
+def stl_writer(filename: str, stl_name: str, triangles: list, facet_normals: list = [],
+               binary: bool = False, precision: int = None):
     """
     Description:
         Generates a stl file provided the triangles and normal to the face.
+        The facets are formatted in blocks of STL_ASCII_CHUNK_SIZE into one text buffer
+        each, which keeps the number of writes small for large shapes.
     Parameters:
         filename - name of file to write to
         stl_anme
@@ -19,6 +101,13 @@ def stl_writer(filename: str, stl_name: str, triangles: list, facet_normals: lis
                     where, pi is a list of cordinates [x, y, z]
                     or see below:
                     num_triangles x 3 x 3 nested list: [ [ [p0], [p1], [p2] ] ... [ [p0], [p1], [p2] ] ]
+                    A (4* num_triangles, 3) stl array can be passed instead, then the
+                    facet_normals are taken from the array.
+        binary - writes a binary stl instead of an ascii one when True. Default is False.
+        precision - number of digits after the decimal point in the ascii file, the
+                    numbers are written in scientific notation, e.g. 3 writes 1.235e+00.
+                    Default is None, which writes the shortest repr of each float.
+        A filename ending in .gz, .bz2 or .xz writes a compressed file.
     Returns:
         .stl file
 
@@ -28,19 +117,173 @@ def stl_writer(filename: str, stl_name: str, triangles: list, facet_normals: lis
                                     facet_normals=[[0.57,0.57,0.57],
                                                     [0,0,-1]])
     """
-    with open(filename, 'w') as f:
-        f.write(f'solid {stl_name}')
-        for i in range(0, len(triangles)):
-            f.write("\n")
-            f.write(
-                f"facet normal {facet_normals[i][0]} {facet_normals[i][1]} {facet_normals[i][2]}\n")
-            f.write("outer loop\n")
-            for v in triangles[i]:
-                f.write("vertex {v1} {v2} {v3}\n".format(
-                    v1=v[0], v2=v[1], v3=v[2]))
-            f.write("endloop\n")
-            f.write("endfacet\n")
-        f.write("endsolid")
+    triangles, facet_normals = as_facets(triangles, facet_normals)
+    profiling.count(facets=triangles.shape[0])
+    if binary:
+        return binary_stl_writer(filename, stl_name, triangles, facet_normals)
+    with compression.open_stl(filename, 'w') as f:
+        _write_text(f, f'solid {stl_name}')
+        write_ascii_facets(f, triangles, facet_normals,
+                           precision=precision, separator="\n")
+        _write_text(f, "endsolid")
+
+
+def write_ascii_facets(f, triangles: np.ndarray, facet_normals: np.ndarray,
+                       precision: int = None, separator: str = ""):
+    """
+    Description:
+        Writes the facet blocks of an ascii stl to an open text file. Facets are
+        formatted STL_ASCII_CHUNK_SIZE at a time into a single string per chunk.
+    Parameters:
+        f - text file opened for writing
+        triangles - num_triangles x 3 x 3 array of triangles
+        facet_normals - num_triangles x 3 array of triangle normals
+        precision - digits after the decimal point in scientific notation (%.{precision}e,
+                    3 writes 1.235e+00), None for the shortest repr
+        separator - text written in front of every facet
+    Returns:
+        None
+    """
+    number = "%s" if precision is None else f"%.{int(precision)}e"
+    template = separator + _FACET_TEMPLATE.format(number)
+    facets = np.concatenate(
+        (facet_normals.reshape(-1, 1, 3), triangles.reshape(-1, 3, 3)), axis=1)
+    # a python float of a float32 prints all its float64 digits, numpy prints the shortest
+    shortest_float32 = precision is None and facets.dtype == np.float32
+    for start in range(0, facets.shape[0], STL_ASCII_CHUNK_SIZE):
+        chunk = facets[start:start + STL_ASCII_CHUNK_SIZE].ravel()
+        with profiling.span("utilities.format"):
+            values = chunk.astype(str) if shortest_float32 else chunk
+            text = (template*(chunk.size//12)) % tuple(values.tolist())
+            profiling.count(facets=chunk.size//12)
+        _write_text(f, text)
+    return None
+
+
+def _write_text(f, text: str):
+    """Writes text to an open text file, the encoded bytes are counted in the
+    utilities.write stage of a profile."""
+    with profiling.span("utilities.write"):
+        f.write(text)
+        profiling.count(nbytes=len(text) if text.isascii() else len(text.encode("utf-8")))
+    return None
+
+
+def write_ascii_solid(f, stl_name: str, triangles: np.ndarray, facet_normals: np.ndarray,
+                      precision: int = None):
+    """
+    Description:
+        Writes one named solid ... endsolid block of an ascii stl to an open text file.
+        Several blocks in one file make a multi-solid stl.
+    Parameters:
+        f - text file opened for writing
+        stl_name - name of the solid
+        triangles, facet_normals, precision - see write_ascii_facets
+    Returns:
+        None
+    """
+    _write_text(f, f"solid {stl_name}\n")
+    write_ascii_facets(f, triangles, facet_normals, precision=precision)
+    _write_text(f, f"endsolid {stl_name}\n")
+    return None
+
+
+def as_facets(triangles, facet_normals=None, dtype=None):
+    """
+    Description:
+        Brings triangles and normals to two float arrays of shape (N, 3, 3) and (N, 3).
+    Parameters:
+        triangles - num_triangles x 3 x 3 list or array of triangles, or a
+                    (4* num_triangles, 3) stl array (a leading [0,0,0] row is dropped).
+        facet_normals - num_triangles x 3 list or array of normals. Not needed when
+                        an stl array is provided.
+        dtype - float type of the arrays, see as_float.
+    Returns:
+        tuple of triangles (N, 3, 3) and normals (N, 3)
+    """
+    triangles = as_float(triangles, dtype)
+    if triangles.ndim == 2:
+        if triangles.shape[0] % 4 != 0:
+            triangles = triangles[1:]
+        facets = triangles.reshape(-1, 4, 3)
+        return facets[:, 1:], facets[:, 0]
+    triangles = triangles.reshape(-1, 3, 3)
+    if facet_normals is None or len(facet_normals) != triangles.shape[0]:
+        raise ValueError("Expected one facet normal per triangle.")
+    return triangles, as_float(facet_normals, triangles.dtype).reshape(-1, 3)
+
+
+def as_triangles(geometry, dtype=None):
+    """
+    Description:
+        Brings any geometry of the package to one float array of triangles (N, 3, 3).
+    Parameters:
+        geometry - a (4* num_triangles, 3) stl array, a num_triangles x 3 x 3 array, a
+                   (triangles, normals) tuple, or an object with a triangles attribute
+                   such as a pistl.mesh.Mesh or a pistl.shapes Shape.
+        dtype - float type of the triangles, see as_float.
+    Returns:
+        triangles (N, 3, 3)
+    """
+    if hasattr(geometry, "triangles"):
+        return as_float(geometry.triangles, dtype)
+    if isinstance(geometry, tuple):
+        return as_facets(*geometry, dtype=dtype)[0]
+    geometry = as_float(geometry, dtype)
+    if geometry.ndim == 2:
+        return as_facets(geometry)[0]
+    return geometry.reshape(-1, 3, 3)
+
+
+def binary_stl_writer(filename: str, stl_name: str, triangles, facet_normals):
+    """
+    Description:
+        Generates a binary stl file provided the triangles and normal to the face.
+        All facets are packed into 50 byte records and written in one buffer write.
+    Parameters:
+        filename - name of file to write to
+        stl_name - name stored in the 80 byte header
+        triangles - num_triangles x 3 x 3 list or array of triangles
+        facet_normals - num_triangles x 3 list or array of triangle normals
+    Returns:
+        .stl file
+
+    Example:
+        >>> binary_stl_writer('test.stl','tetra', [[[1, 0, 0], [0, 1, 0], [0, 0, 1]]],
+                                            [[0.57,0.57,0.57]])
+    """
+    with profiling.span("utilities.format"):
+        records = binary_records(triangles, facet_normals)
+        profiling.count(facets=records.shape[0], array=records)
+    with profiling.span("utilities.write"), compression.open_stl(filename, 'wb') as f:
+        f.write(binary_header(stl_name))
+        f.write(np.uint32(records.shape[0]).tobytes())
+        f.write(records.tobytes())
+        profiling.count(nbytes=STL_BINARY_HEADER_SIZE + 4 + records.nbytes)
+
+
+def binary_records(triangles, facet_normals):
+    """
+    Description:
+        Packs triangles and their normals into the 50 byte records of a binary stl.
+    Parameters:
+        triangles - num_triangles x 3 x 3 list or array of triangles
+        facet_normals - num_triangles x 3 list or array of triangle normals
+    Returns:
+        structured array of dtype STL_BINARY_DTYPE
+    """
+    triangles = as_float(triangles).reshape(-1, 3, 3)
+    records = np.zeros(triangles.shape[0], dtype=STL_BINARY_DTYPE)
+    records["vertices"] = triangles
+    records["normal"] = as_float(facet_normals).reshape(-1, 3)
+    return records
+
+
+def binary_header(stl_name: str):
+    """The 80 byte header of a binary stl, it must not start with "solid" or readers take it for ascii."""
+    header = f"{STL_BINARY_HEADER_PREFIX}{stl_name}".encode(
+        "ascii", "replace")[:STL_BINARY_HEADER_SIZE]
+    return header.ljust(STL_BINARY_HEADER_SIZE, b" ")
 
 
 def find_normal(p1: list, p2: list, p3: list):
@@ -61,19 +304,35 @@ def find_normal(p1: list, p2: list, p3: list):
         >>> n
         np.array([1,0,0])
     """
-    # needs numpy array for the cross product to work
-    pp1 = np.array(p1)
-    pp2 = np.array(p2)
-    pp3 = np.array(p3)
+    return find_normals([[p1, p2, p3]])[0]
+
+
+@profiling.stage("utilities.find_normals")
+def find_normals(triangles, dtype=None):
+    """
+    Description:
+        Finds the unit normals of many triangles in one pass.
+        Degenerate triangles (zero area) get a [0, 0, 0] normal.
+    Parameters:
+        triangles: num_triangles x 3 x 3 list or array of triangles.
+        dtype: float type of the computation and the normals, see as_float.
+    Returns:
+        A numpy array of shape (num_triangles, 3) with the normals.
+    Example:
+        >>> find_normals([[[0, 1, 0], [0, 4, 0], [0, 2, 50]]])
+        array([[1., 0., 0.]])
+    """
+    triangles = as_float(triangles, dtype).reshape(-1, 3, 3)
     # Calculate the cross product of the vectors from p1 to p2 and p1 to p3.
-    n = np.cross(pp2 - pp1, pp3 - pp1)
-    # TODO: very very bad exception handling
-    try:
-        # Normalize the vector.
-        n = n / np.linalg.norm(n)
-    except:
-        n = np.array([0, 0, 0])
-    return n
+    n = np.cross(triangles[:, 1] - triangles[:, 0],
+                 triangles[:, 2] - triangles[:, 0])
+    length = np.linalg.norm(n, axis=1)
+    # mask the degenerate triangles instead of dividing by zero
+    valid = length > 0
+    normals = np.zeros_like(n)
+    normals[valid] = n[valid] / length[valid, None]
+    profiling.count(facets=normals.shape[0], array=n)
+    return normals
 
 
 def visualize(filename):
@@ -81,7 +340,7 @@ def visualize(filename):
     Description:
     ============
         Plots the stl file created using one of the provided backends
-        Default is pyvista.
+        Default is pyvista, which is imported on the first call.
 
     Parameters:
     ===========
@@ -89,6 +348,8 @@ def visualize(filename):
             path to stl file.
     """
     if os.path.exists(filename):
+        # pyvista pulls in vtk, so it is only imported when something is visualized
+        import pyvista as pv
         try:
             mesh = pv.read(filename)
             return mesh
@@ -0,0 +1,127 @@
+# dependecies
+import numpy as np
+# internal custom imports
+from . import utilities
+from .mesh import Mesh
+"""
+Module Content:
+1. validate : report of the defects that make a triangle mesh unprintable.
+2. edge_counts : unique undirected edges of a face array with their use counts.
+
+The vertices are welded first, then every edge is hashed to one int64 from its two
+sorted vertex indices. One sort of these hashes finds the boundary edges (used once),
+the non-manifold edges (used more than twice) and the edges whose two facets walk
+them in the same direction (inconsistent winding), so the whole check is O(N log N).
+"""
+
+
+def _pair_keys(a: np.ndarray, b: np.ndarray, n_vertices: int):
+    """One int64 per (a, b) pair of vertex indices."""
+    return a.astype(np.int64)*n_vertices + b
+
+
+def edge_counts(faces: np.ndarray, n_vertices: int = None):
+    """
+    Description:
+        Finds the undirected edges of a face array and how the facets use them.
+    Parameters:
+        faces: (N, 3) vertex indices of the facets.
+        n_vertices: number of vertices, default is the largest index + 1.
+    Returns:
+        tuple of the edges (E, 2) with the smaller index first, the number of facets
+        using every edge (E,) and the number of facets walking it from the smaller to
+        the larger index (E,)
+    """
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    if n_vertices is None:
+        n_vertices = int(faces.max()) + 1 if faces.size else 0
+    start = faces.ravel()
+    end = faces[:, [1, 2, 0]].ravel()
+    low, high = np.minimum(start, end), np.maximum(start, end)
+    keys, inverse, counts = np.unique(_pair_keys(low, high, n_vertices),
+                                      return_inverse=True, return_counts=True)
+    forward = np.bincount(inverse.reshape(-1), weights=start < end, minlength=keys.size)
+    edges = np.stack((keys//max(n_vertices, 1), keys % max(n_vertices, 1)), axis=1)
+    return edges, counts, forward.astype(np.int64)
+
+
+def validate(geometry, tolerance: float = 1e-9, area_tolerance: float = 0.0,
+             details: bool = False):
+    """
+    Description:
+        Checks a triangle mesh for the defects a slicer rejects.
+    Parameters:
+        geometry:
+            stl array, triangles, Mesh or Shape. Meshes are used with their own
+            vertices, everything else is welded with tolerance first.
+        tolerance:
+            distance under which two vertices are the same vertex.
+        area_tolerance:
+            facets with an area at or below this value are degenerate.
+        details:
+            adds the indices of the offending facets and the offending edges to the report.
+    Returns:
+        dictionary with
+            n_facets, n_vertices, n_edges : sizes of the welded mesh
+            boundary_edges : edges used by one facet only
+            non_manifold_edges : edges used by more than two facets
+            inconsistent_edges : edges whose two facets walk them in the same direction
+            degenerate_facets : facets with repeated vertices or no area
+            duplicate_facets : facets that repeat the vertices of an earlier facet
+            watertight : no boundary and no non-manifold edges
+            valid : watertight and none of the other defects
+    Example:
+        >>> report = validate(core.stl_to_array('part.stl'))
+        >>> if not report['valid']:
+        >>>     print(report)
+    """
+    if isinstance(geometry, Mesh):
+        mesh = geometry
+    else:
+        mesh = Mesh.from_triangles(utilities.as_triangles(geometry), tolerance=tolerance)
+    faces = mesh.faces.astype(np.int64)
+    n_vertices = mesh.vertices.shape[0]
+
+    # facets that reuse a vertex or span no area
+    collapsed = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | \
+        (faces[:, 2] == faces[:, 0])
+    triangles = mesh.triangles
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    area = 0.5*np.sqrt(np.einsum("ij,ij->i", cross, cross))
+    degenerate = collapsed | (area <= area_tolerance)
+
+    # facets with the same three vertices, in any order and winding
+    corners = np.sort(faces, axis=1)
+    if n_vertices**3 < np.iinfo(np.int64).max:
+        keys = _pair_keys(_pair_keys(corners[:, 0], corners[:, 1], n_vertices), corners[:, 2], n_vertices)
+        _, first = np.unique(keys, return_index=True)
+    else:
+        # the three indices do not fit one int64, compare the rows instead
+        _, first = np.unique(corners, axis=0, return_index=True)
+    duplicate = np.ones(faces.shape[0], dtype=bool)
+    duplicate[first] = False
+
+    # the edges of the collapsed facets are not edges of the surface
+    edges, counts, forward = edge_counts(faces[~collapsed], n_vertices)
+    boundary = counts == 1
+    non_manifold = counts > 2
+    inconsistent = (counts == 2) & (forward != 1)
+
+    report = {"n_facets": faces.shape[0],
+              "n_vertices": n_vertices,
+              "n_edges": edges.shape[0],
+              "boundary_edges": int(boundary.sum()),
+              "non_manifold_edges": int(non_manifold.sum()),
+              "inconsistent_edges": int(inconsistent.sum()),
+              "degenerate_facets": int(degenerate.sum()),
+              "duplicate_facets": int(duplicate.sum())}
+    report["watertight"] = report["boundary_edges"] == 0 and report["non_manifold_edges"] == 0
+    report["valid"] = report["watertight"] and report["inconsistent_edges"] == 0 and \
+        report["degenerate_facets"] == 0 and report["duplicate_facets"] == 0
+    if details:
+        report["boundary_edge_vertices"] = edges[boundary]
+        report["non_manifold_edge_vertices"] = edges[non_manifold]
+        report["inconsistent_edge_vertices"] = edges[inconsistent]
+        report["degenerate_facet_indices"] = np.flatnonzero(degenerate)
+        report["duplicate_facet_indices"] = np.flatnonzero(duplicate)
+    return report
@@ -0,0 +1,76 @@
+import time
+import asyncio
+import threading
+import numpy as np
+from pistl import aio, core, shapes
+
+
+def test_export_async_keeps_loop_free(tmp_path, monkeypatch):
+    """Tests that the event loop keeps running while the exports are written in other threads."""
+    aio.configure(max_workers=2)
+    loop_thread = threading.get_ident()
+    jobs, ticks = [], []
+    export = shapes.Sphere.export
+
+    def timed_export(self, filename, shapename):
+        start = time.perf_counter()
+        export(self, filename, shapename)
+        jobs.append((start, time.perf_counter(), threading.get_ident()))
+
+    monkeypatch.setattr(shapes.Sphere, "export", timed_export)
+    spheres = []
+    for i in range(4):
+        sphere = shapes.Sphere()
+        sphere.radius = 1.0 + i
+        # large enough that the ascii formatting takes a while
+        sphere.resoultion_longitude = sphere.resolution_latitude = 120
+        spheres.append(sphere)
+
+    async def main():
+        exports = asyncio.gather(*(s.export_async(str(tmp_path/f"async_{i}.stl"), "sphere")
+                                   for i, s in enumerate(spheres)))
+        while not exports.done():
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.001)
+        return await exports
+
+    results = asyncio.run(main())
+    assert results == [str(tmp_path/f"async_{i}.stl") for i in range(4)]
+    assert len(jobs) == 4 and all(thread != loop_thread for _, _, thread in jobs)
+    # the loop ticked while an export was being written, so it was not blocked
+    assert any(start < tick < end for tick in ticks for start, end, _ in jobs)
+    arr = core.stl_to_array(str(tmp_path/"async_3.stl"))
+    assert np.isclose(np.abs(arr.reshape(-1, 4, 3)[:, 1:]).max(), 4.0)
+
+
+def test_write_many(tmp_path):
+    """Tests the bulk writer with shapes and arrays in binary and ascii."""
+    aio.configure(max_workers=3)
+    cube = shapes.Cuboid()
+    files = [str(tmp_path/"many_0.stl"), str(tmp_path/"many_1.stl")]
+    items = [(files[0], "cube", cube),
+             (files[1], "moved", core.translate(cube.to_array(), 1, 0, 0))]
+    for binary in (False, True):
+        written = asyncio.run(aio.write_many(items, binary=binary))
+        assert written == files
+        assert np.allclose(core.stl_to_array(written[1]),
+                           core.translate(core.stl_to_array(written[0]), 1, 0, 0), atol=1e-6)
+
+
+def test_concurrent_exports_of_one_shape(tmp_path):
+    """Tests that concurrent exports of one shape each write their own file and name."""
+    aio.configure(max_workers=4)
+    sphere = shapes.Sphere()
+    sphere.resoultion_longitude = sphere.resolution_latitude = 80
+
+    async def main():
+        return await asyncio.gather(*(sphere.export_async(str(tmp_path/f"shared_{i}.stl"),
+                                                          f"part_{i}") for i in range(6)))
+
+    files = asyncio.run(main())
+    assert files == [str(tmp_path/f"shared_{i}.stl") for i in range(6)]
+    expected = sphere.to_array()
+    for i, filename in enumerate(files):
+        with open(filename) as f:
+            assert f.readline().split() == ["solid", f"part_{i}"]
+        assert np.allclose(core.stl_to_array(filename), expected)
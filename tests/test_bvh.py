@@ -0,0 +1,49 @@
+import numpy as np
+from pistl import shapes, core
+from pistl.bvh import BVH
+
+
+def _brute_force_hits(triangles, origins, direction):
+    """First hit of every ray by testing every triangle."""
+    from pistl.bvh import _ray_triangles
+    n, m = origins.shape[0], triangles.shape[0]
+    a = np.tile(triangles[:, 0], (n, 1))
+    t, hit = _ray_triangles(np.repeat(origins, m, axis=0), np.tile(direction, (n*m, 1)), a,
+                            np.tile(triangles[:, 1], (n, 1)) - a, np.tile(triangles[:, 2], (n, 1)) - a)
+    return np.where(hit, t, np.inf).reshape(n, m).min(axis=1)
+
+
+def test_bvh_queries_match_brute_force():
+    """Tests ray hits, closest points and inside tests on a sphere against direct computation."""
+    sphere = shapes.Sphere()
+    sphere.create()
+    bvh = BVH(core.translate(sphere.to_array(), 0.3, -0.2, 0.1), leaf_size=4)
+    triangles = bvh.triangles[np.argsort(bvh.order)]
+    rng = np.random.default_rng(1)
+    points = rng.uniform(-2.5, 2.5, (300, 3))
+    direction = np.array([0.3, 0.5, 0.8])
+    distance, triangle = bvh.intersect(points, direction)
+    assert np.allclose(distance, _brute_force_hits(triangles, points, direction))
+    assert np.all((triangle >= 0) == np.isfinite(distance))
+    closest, dist, index = bvh.closest_point(points)
+    assert np.allclose(dist, np.linalg.norm(closest - points, axis=1))
+    # no vertex of the sphere is closer than the closest point
+    vertices = triangles.reshape(-1, 3)
+    nearest_vertex = np.min(np.linalg.norm(points[:, None] - vertices[None], axis=2), axis=1)
+    assert np.all(dist <= nearest_vertex + 1e-12)
+    inside = bvh.contains(points)
+    radius = np.linalg.norm(points - [0.3, -0.2, 0.1], axis=1)
+    assert np.all(inside[radius < 0.9*sphere.radius])
+    assert not np.any(inside[radius > sphere.radius])
+
+
+def test_bvh_save_load(tmp_path):
+    """Tests that a saved BVH answers the same queries after loading."""
+    cube = shapes.Cuboid()
+    cube.create()
+    bvh = BVH(cube)
+    bvh.save(tmp_path / "cube.npz")
+    loaded = BVH.load(tmp_path / "cube.npz")
+    points = np.random.default_rng(2).uniform(-3, 3, (50, 3))
+    assert np.array_equal(bvh.contains(points), loaded.contains(points))
+    assert np.allclose(bvh.closest_point(points)[1], loaded.closest_point(points)[1])
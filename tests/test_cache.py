@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import pytest
+from pistl import cache, shapes
+
+
+@pytest.fixture
+def fresh_cache():
+    """Gives the shapes module an empty cache and restores the old one afterwards."""
+    old = cache.shape_cache
+    yield cache.configure(maxsize=2)
+    cache.shape_cache = old
+
+
+def test_lru_eviction():
+    """Tests that the least recently used array is dropped first."""
+    c = cache.TessellationCache(maxsize=2)
+    c.put(("a",), np.zeros(3))
+    c.put(("b",), np.ones(3))
+    c.get(("a",))
+    c.put(("c",), np.ones(3))
+    assert ("a",) in c and ("b",) not in c
+    assert c.get(("b",)) is None
+    assert c.stats["hits"] == 1 and c.stats["misses"] == 1
+
+
+def test_disk_tier(tmp_path):
+    """Tests that arrays evicted from memory are found on disk."""
+    c = cache.TessellationCache(maxsize=0, directory=str(tmp_path))
+    c.get_or_compute(("sphere", 1.0), lambda: np.arange(6.0))
+    assert len(c) == 0
+    assert len(os.listdir(tmp_path)) == 1
+    array = c.get_or_compute(("sphere", 1.0), lambda: pytest.fail("should not tessellate"))
+    assert np.array_equal(array, np.arange(6.0))
+    assert c.stats["disk_hits"] == 1
+
+
+def test_repeated_export_skips_tessellation(fresh_cache, monkeypatch, tmp_path):
+    """Tests that a second sphere with the same parameters is taken from the cache."""
+    first = shapes.Sphere()
+    first.create()
+    first.export(str(tmp_path/"cached_sphere.stl"), "sphere")
+    monkeypatch.setattr(shapes.Sphere, "_triangles",
+                        lambda self: pytest.fail("should not tessellate"))
+    second = shapes.Sphere()
+    second.create()
+    second.export(str(tmp_path/"cached_sphere_2.stl"), "sphere")
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
+
+
+def test_key_follows_parameters(fresh_cache):
+    """Tests that a changed parameter or another class does not reuse the cached triangles."""
+    cyl = shapes.Cylinder()
+    cyl.create()
+    open_cylinder = cyl._stl_array()
+    cyl.close = True
+    assert cyl._stl_array().shape[0] > open_cylinder.shape[0]
+    circle, tetra = shapes.Circle(), shapes.Tetrahedron()
+    circle.create(elevation=-2.0)
+    tetra.create()
+    assert circle._cache_key() != tetra._cache_key()
+    assert cache.stats()["misses"] == 2
+
+
+def test_byte_limit():
+    """Tests that the memory tier stays below max_bytes and skips arrays larger than it."""
+    c = cache.TessellationCache(maxsize=10, max_bytes=2*8*100)
+    for name in "abc":
+        c.put((name,), np.zeros(100))
+    assert ("a",) not in c and ("b",) in c and ("c",) in c
+    assert c.stats["nbytes"] == 2*8*100
+    c.put(("big",), np.zeros(1000))
+    assert ("big",) not in c and len(c) == 2
+
+
+def test_disk_write_leaves_no_temporary(tmp_path):
+    """Tests that the .npy file is complete under its final name and no temporary is left."""
+    c = cache.TessellationCache(maxsize=0, directory=str(tmp_path))
+    c.put(("cube",), np.arange(12.0))
+    assert [os.path.splitext(f)[1] for f in os.listdir(tmp_path)] == [".npy"]
+    assert np.array_equal(c.get(("cube",)), np.arange(12.0))
@@ -0,0 +1,106 @@
+import os
+import multiprocessing
+import numpy as np
+import pytest
+from pistl import cli
+from pistl.core import array_to_stl, stl_to_array, is_binary_stl, transform, compose, \
+    rotation_matrix, translation_matrix
+
+
+@pytest.fixture
+def make_stl_dir(tmp_path):
+    """Writes three small stl files."""
+    rng = np.random.default_rng(0)
+    for i in range(3):
+        array_to_stl(rng.random((40, 3)), str(tmp_path / f"part_{i}"))
+    return tmp_path
+
+
+def test_transform_in_order(make_stl_dir):
+    """Tests that the transforms are composed in the order of the command line."""
+    out = make_stl_dir / "out"
+    code = cli.main(["transform", str(make_stl_dir / "part_*.stl"), "--rotate", "0", "0", "90",
+                     "--translate", "1", "0", "0", "-o", str(out), "-j", "1"])
+    assert code == 0
+    expected = transform(stl_to_array(str(make_stl_dir / "part_0.stl")),
+                         compose(rotation_matrix(z_theta=90), translation_matrix(1, 0, 0)))
+    assert np.allclose(stl_to_array(str(out / "part_0.stl")), expected)
+
+
+def test_format_pool_keeps_going(make_stl_dir, capsys):
+    """Tests that a failing file is reported while the others are converted by the pool."""
+    manifest = make_stl_dir / "manifest.txt"
+    manifest.write_text(f"# nightly\n{make_stl_dir / 'part_*.stl'}\n{make_stl_dir / 'missing.stl'}\n")
+    code = cli.main(["format", "--manifest", str(manifest), "--to", "binary", "-j", "2"])
+    assert code == 1
+    for i in range(3):
+        assert is_binary_stl(str(make_stl_dir / f"part_{i}_binary.stl"))
+    captured = capsys.readouterr()
+    assert "FAILED" in captured.err and "missing.stl" in captured.err
+    assert "4 files (3 ok, 1 failed)" in captured.out
+
+
+def test_no_inputs():
+    """Tests the exit code without any input."""
+    assert cli.main(["format", "--to", "ascii"]) == 2
+
+
+def test_format_compressed(make_stl_dir):
+    """Tests that compressed outputs get the codec extension and read back."""
+    out = make_stl_dir / "packed"
+    assert cli.main(["format", str(make_stl_dir / "part_1.stl"), "--to", "binary",
+                     "--compress", "gz", "-o", str(out), "-j", "1"]) == 0
+    assert np.allclose(stl_to_array(str(out / "part_1.stl.gz")),
+                       stl_to_array(str(make_stl_dir / "part_1.stl")), atol=1e-6)
+    # a compressed input keeps its plain name
+    assert cli.main(["format", str(out / "part_1.stl.gz"), "--to", "ascii", "-j", "1"]) == 0
+    assert is_binary_stl(str(out / "part_1_ascii.stl")) is False
+
+
+def test_output_dir_keeps_folders(tmp_path):
+    """Tests that inputs of the same name in different folders do not overwrite each other."""
+    rng = np.random.default_rng(1)
+    for folder in ("a", "b"):
+        os.makedirs(tmp_path / "in" / folder)
+        array_to_stl(rng.random((40, 3)), str(tmp_path / "in" / folder / "part"))
+    out = tmp_path / "out"
+    assert cli.main(["format", str(tmp_path / "in" / "*" / "part.stl"), "--to", "binary",
+                     "-o", str(out), "-j", "2"]) == 0
+    for folder in ("a", "b"):
+        assert np.allclose(stl_to_array(str(out / folder / "part.stl")),
+                           stl_to_array(str(tmp_path / "in" / folder / "part.stl")), atol=1e-6)
+
+
+def test_same_output_refused(make_stl_dir, capsys):
+    """Tests that two inputs writing the same output file are refused before any work."""
+    array_to_stl(stl_to_array(str(make_stl_dir / "part_0.stl")), str(make_stl_dir / "part_0"),
+                 compression="gz")
+    out = make_stl_dir / "out"
+    assert cli.main(["format", str(make_stl_dir / "part_0.stl*"), "--to", "binary",
+                     "-o", str(out), "-j", "1"]) == 2
+    assert "would both write" in capsys.readouterr().err
+    assert not out.exists()
+
+
+def _crashing_blocks(stl, *args, **kwargs):
+    """Ends the worker process like a segmentation fault would, for part_1."""
+    if "part_1" in stl:
+        os._exit(1)
+    return _iter_stl_blocks(stl, *args, **kwargs)
+
+
+_iter_stl_blocks = cli.core.iter_stl_blocks
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="the patched reader reaches the workers only through fork")
+def test_crashed_worker_reported(make_stl_dir, monkeypatch, capsys):
+    """Tests that a crashing worker fails its own file and the others are still converted."""
+    monkeypatch.setattr(cli.core, "iter_stl_blocks", _crashing_blocks)
+    code = cli.main(["format", str(make_stl_dir / "part_*.stl"), "--to", "binary", "-j", "2"])
+    assert code == 1
+    captured = capsys.readouterr()
+    assert "FAILED" in captured.err and "part_1.stl" in captured.err
+    assert "3 files (2 ok, 1 failed)" in captured.out
+    for i in (0, 2):
+        assert is_binary_stl(str(make_stl_dir / f"part_{i}_binary.stl"))
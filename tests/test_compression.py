@@ -0,0 +1,52 @@
+import os
+import gzip
+import shutil
+import numpy as np
+import pytest
+from pistl import core, shapes, utilities
+from pistl.compression import compression_of, open_stl
+
+
+@pytest.mark.parametrize("codec", ["gz", "bz2", "xz"])
+@pytest.mark.parametrize("binary", [False, True])
+def test_compressed_round_trip(codec, binary, tmp_path):
+    """Tests that compressed files read back as the same array as plain files."""
+    sphere = shapes.Sphere()
+    arr = sphere.to_array()
+    plain, packed = str(tmp_path/"plain"), str(tmp_path/"packed")
+    core.array_to_stl(arr, plain, binary=binary)
+    core.array_to_stl(arr, packed, binary=binary, compression=codec)
+    packed = f"{packed}.stl.{codec}"
+    assert compression_of(packed) == codec
+    assert os.path.getsize(packed) < os.path.getsize(plain + ".stl")
+    expected = core.stl_to_array(plain + ".stl")
+    assert core.is_binary_stl(packed) == binary
+    assert np.array_equal(core.stl_to_array(packed), expected)
+    blocks = list(core.iter_stl_blocks(packed, block_size=100))
+    assert len(blocks) == -(-len(expected)//400)
+    assert np.array_equal(np.concatenate(blocks), expected)
+
+
+def test_magic_bytes_and_writers(tmp_path):
+    """Tests that a gzip file without the .gz extension is still recognised, and that
+    the utilities writer and blocks_to_stl compress by extension or argument."""
+    cube = shapes.Cuboid()
+
+    def path(name):
+        return str(tmp_path/name)
+
+    utilities.stl_writer(path("cube.stl.gz"), "cube", cube.triangles, cube.normals)
+    with gzip.open(path("cube.stl.gz"), "rt") as f:
+        assert f.read().startswith("solid cube")
+    shutil.copy(path("cube.stl.gz"), path("cube_renamed.stl"))
+    assert compression_of(path("cube_renamed.stl")) == "gz"
+    arr = core.stl_to_array(path("cube_renamed.stl"))
+    assert np.allclose(arr.reshape(-1, 4, 3)[:, 1:], cube.triangles)
+    n = core.blocks_to_stl(core.iter_stl_blocks(path("cube_renamed.stl")), path("cube_blocks"),
+                           binary=True, compression="xz")
+    assert n == len(cube.triangles)
+    assert np.allclose(core.stl_to_array(path("cube_blocks.stl.xz")), arr, atol=1e-6)
+    with open_stl(path("cube_blocks.stl.xz"), "rb", threaded=False) as f:
+        assert len(f.read()) == 84 + 50*n
+    with pytest.raises(ValueError):
+        open_stl(path("cube.stl"), "w", compression="zip")
@@ -0,0 +1,119 @@
+import os
+import multiprocessing
+import pytest
+from pistl import converter
+
+
+def test_missing_step_file(tmp_path):
+    """Tests that a missing input is reported before pythonocc is needed."""
+    with pytest.raises(FileNotFoundError):
+        converter.convert(str(tmp_path/"no_such_part.step"), str(tmp_path/"no_such_part.stl"))
+
+
+def _write_two_boxes(filename):
+    """Writes a STEP file with two separate boxes."""
+    from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeBox
+    from OCC.Core.gp import gp_Pnt
+    from OCC.Core.TopoDS import TopoDS_Compound
+    from OCC.Core.BRep import BRep_Builder
+    from OCC.Extend.DataExchange import write_step_file
+    compound = TopoDS_Compound()
+    builder = BRep_Builder()
+    builder.MakeCompound(compound)
+    builder.Add(compound, BRepPrimAPI_MakeBox(10.0, 10.0, 10.0).Shape())
+    builder.Add(compound, BRepPrimAPI_MakeBox(gp_Pnt(20.0, 0.0, 0.0), 5.0, 5.0, 5.0).Shape())
+    write_step_file(compound, filename)
+
+
+def test_convert_deflection_and_cache(tmp_path):
+    """Tests that a cached STEP is exported at two deflections and per solid."""
+    pytest.importorskip("OCC")
+    from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeSphere
+    from OCC.Extend.DataExchange import write_step_file
+    step = str(tmp_path/"sphere.step")
+    write_step_file(BRepPrimAPI_MakeSphere(10.0).Shape(), step)
+    converter.clear_cache()
+    coarse = converter.convert(step, str(tmp_path/"coarse.stl"), linear_deflection=2.0, binary=True)
+    fine = converter.convert(step, str(tmp_path/"fine.stl"), linear_deflection=0.05, binary=True)
+    assert converter._read_step.cache_info().hits == 1
+    assert os.path.getsize(fine[0]) > os.path.getsize(coarse[0])
+    # going back to the coarse setting gives the coarse file again
+    again = converter.convert(step, str(tmp_path/"again.stl"), linear_deflection=2.0, binary=True)
+    assert os.path.getsize(again[0]) == os.path.getsize(coarse[0])
+    # the exports meshed copies, the cached shape has no triangulation
+    from OCC.Core.BRep import BRep_Tool
+    from OCC.Core.TopLoc import TopLoc_Location
+    from OCC.Extend.TopologyUtils import TopologyExplorer
+    cached = converter._read_step(os.path.abspath(step), os.path.getmtime(step))
+    assert all(BRep_Tool.Triangulation(face, TopLoc_Location()) is None
+               for face in TopologyExplorer(cached).faces())
+
+
+def test_convert_per_solid(tmp_path):
+    """Tests that every solid of an assembly is written to its own file."""
+    pytest.importorskip("OCC")
+    step = str(tmp_path/"boxes.step")
+    _write_two_boxes(step)
+    written = converter.convert(step, str(tmp_path/"boxes.stl"), per_solid=True, jobs=2)
+    assert [os.path.basename(f) for f in written] == ["boxes_0.stl", "boxes_1.stl"]
+    assert all(os.path.getsize(f) > 0 for f in written)
+
+
+class _FakeShape(object):
+    """Stands in for an OCC shape, it is written as its name."""
+
+    def __init__(self, name):
+        self.name = name
+
+
+def _fake_write(solid, filename, binary, linear_deflection, angular_deflection):
+    with open(filename, "w") as f:
+        f.write(f"{solid.name} {binary} {linear_deflection} {angular_deflection}")
+    return filename
+
+
+def _mock_occ(monkeypatch, parsed):
+    """Replaces the pythonocc calls of the converter, parsed collects the parsed paths."""
+    def parse(path):
+        parsed.append(path)
+        return _FakeShape("assembly")
+    monkeypatch.setattr(converter, "_parse_step", parse)
+    monkeypatch.setattr(converter, "_solids",
+                        lambda shape: [_FakeShape(f"{shape.name}_solid_{i}") for i in range(3)])
+    monkeypatch.setattr(converter, "_write_solid", _fake_write)
+    monkeypatch.setattr(converter, "_to_brep", lambda shape: shape.name)
+    monkeypatch.setattr(converter, "_from_brep", _FakeShape)
+    converter.clear_cache()
+
+
+def test_step_cache_key(tmp_path, monkeypatch):
+    """Tests that the STEP is parsed once per path and modification time."""
+    parsed = []
+    _mock_occ(monkeypatch, parsed)
+    step = tmp_path/"part.step"
+    step.write_text("ISO-10303-21;")
+    assert converter.convert(str(step), str(tmp_path/"coarse.stl"), linear_deflection=2.0) == \
+        [str(tmp_path/"coarse.stl")]
+    converter.convert(str(step), str(tmp_path/"fine.stl"), linear_deflection=0.05)
+    assert parsed == [os.path.abspath(step)]
+    assert (tmp_path/"fine.stl").read_text() == "assembly False 0.05 0.5"
+    # a changed file is parsed again
+    os.utime(step, (0, os.path.getmtime(step) + 10))
+    converter.convert(str(step), str(tmp_path/"again.stl"))
+    assert len(parsed) == 2
+    converter.clear_cache()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_per_solid_names(tmp_path, monkeypatch, jobs):
+    """Tests the names of the per-solid files, in this process and in the worker processes."""
+    if jobs > 1 and multiprocessing.get_start_method() != "fork":
+        pytest.skip("the mocked writer reaches the workers only through fork")
+    _mock_occ(monkeypatch, [])
+    step = tmp_path/"boxes.step"
+    step.write_text("ISO-10303-21;")
+    written = converter.convert(str(step), str(tmp_path/"boxes"), per_solid=True,
+                                binary=True, jobs=jobs)
+    assert [os.path.basename(f) for f in written] == ["boxes_0.stl", "boxes_1.stl", "boxes_2.stl"]
+    assert [open(f).read() for f in written] == [f"assembly_solid_{i} True 0.9 0.5" for i in range(3)]
+    converter.clear_cache()
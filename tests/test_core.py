@@ -2,8 +2,14 @@ import os
 from matplotlib.pylab import rand
 import numpy as np
 import pytest
-from pistl.core import stl_to_array, array_to_stl, translate, rotate
+from pistl.core import (stl_to_array, array_to_stl, translate, rotate,
+                        is_binary_stl, read_binary_stl, records_to_array,
+                        transform, compose, translation_matrix, rotation_matrix,
+                        scaling_matrix, mirror_matrix, iter_stl_blocks, blocks_to_stl,
+                        transform_blocks, solids_to_stl, index_solids, read_solid,
+                        read_solids)
 from pistl.shapes import Circle
+from pistl import pist_exceptions
 
 @pytest.fixture()
 def make_result_dir(scope="session"):
@@ -34,6 +40,65 @@ def test_stl_to_array(make_circle):
     art = stl_to_array(stl=make_circle)
     assert isinstance(art, np.ndarray) == True
 
+def test_stl_to_array_layout(make_circle):
+    """Tests that every triangle takes four rows and there is no leading dummy row."""
+    art = stl_to_array(stl=make_circle)
+    assert art.shape == (4*9, 3)
+    assert np.allclose(art[1], [0.0, 0.0, 0.0])
+    assert np.allclose(art[2], [1.0, 0.0, 0.0])
+
+
+def test_stl_to_array_strict(make_result_dir):
+    """Tests that strict parsing reports the line number of a malformed line."""
+    filename = os.path.join(make_result_dir, 'broken.stl')
+    with open(filename, 'w') as f:
+        f.write("solid broken\nfacet normal 0 0 1\nouter loop\n"
+                "vertex 0 0 0\nvertex 1 0 x\nvertex 0 1 0\nendloop\nendfacet\nendsolid")
+    assert stl_to_array(filename).shape == (4, 3)
+    with pytest.raises(pist_exceptions.STL_Parsing_Exceptions, match="line 5"):
+        stl_to_array(filename, strict=True)
+
+
+def test_stl_to_array_uppercase(tmp_path):
+    """Tests that upper case keywords are read and that an ascii file without rows is refused."""
+    filename = str(tmp_path/"upper.stl")
+    with open(filename, 'w') as f:
+        f.write("SOLID PART\n  FACET NORMAL 0 0 1\n    OUTER LOOP\n      VERTEX 0 0 0\n"
+                "      VERTEX 1 0 0\n      VERTEX 0 1 0\n    ENDLOOP\n  ENDFACET\nENDSOLID PART\n")
+    expected = np.array([[0, 0, 1], [0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=float)
+    assert np.array_equal(stl_to_array(filename, strict=True), expected)
+    assert np.array_equal(np.concatenate(list(iter_stl_blocks(filename))), expected)
+    garbage = str(tmp_path/"garbage.stl")
+    with open(garbage, 'w') as f:
+        f.write("solid part\nfacette 0 0 1\nsommet 0 0 0\nendsolid part\n")
+    with pytest.raises(pist_exceptions.STL_Parsing_Exceptions, match="No normal or vertex"):
+        stl_to_array(garbage)
+    with pytest.raises(pist_exceptions.STL_Parsing_Exceptions, match="No normal or vertex"):
+        list(iter_stl_blocks(garbage))
+    # a file of an empty solid is still an empty array
+    empty = str(tmp_path/"empty.stl")
+    with open(empty, 'w') as f:
+        f.write("solid empty\nendsolid empty\n")
+    assert stl_to_array(empty).shape == (0, 3)
+
+
+def test_index_upper_case_solids(tmp_path):
+    """Tests that solids written with upper case keywords are indexed and read by name."""
+    facet = ("  FACET NORMAL 0 0 1\n    OUTER LOOP\n      VERTEX 0 0 {0}\n      VERTEX 1 0 {0}\n"
+             "      VERTEX 0 1 {0}\n    ENDLOOP\n  ENDFACET\n")
+    filename = str(tmp_path/"upper_assembly.stl")
+    with open(filename, 'w') as f:
+        f.write("SOLID Housing\n" + facet.format(0)*2 + "ENDSOLID Housing\n"
+                "Solid Lid\n" + facet.format(5) + "EndSolid Lid\n")
+    index = index_solids(filename)
+    assert [(s["name"], s["n_facets"]) for s in index["solids"]] == [("Housing", 2), ("Lid", 1)]
+    assert sum(s["nbytes"] for s in index["solids"]) == os.path.getsize(filename)
+    assert np.array_equal(read_solid(filename, "Lid", index, strict=True)[1:, 2], [5.0, 5.0, 5.0])
+    array_to_stl(read_solid(filename, "Lid", index), str(tmp_path/"lid"), binary=True)
+    records = read_binary_stl(str(tmp_path/"lid.stl"), memory_map=False)
+    assert not isinstance(records, np.memmap) and records.shape == (1,)
+
+
 def test_array_to_stl(make_circle_array):
     """Test if array is converted to stl."""
     array_to_stl(make_circle_array, "Results/array_to_stl")
@@ -51,17 +116,170 @@ def test_translate():
     # random_point = np.random.randint(1, trans_art.shape[0])
     random_point = 2
     # checks translation in y
-    assert np.abs(art_copy[1:][random_point, 1] -
+    assert np.abs(art_copy[random_point, 1] -
                   trans_art[random_point, 1]) == 2
     # checks translation in x
-    assert np.abs(art_copy[1:][random_point, 0] -
+    assert np.abs(art_copy[random_point, 0] -
                   trans_art[random_point, 0]) == 1
     # checks translation in z
-    assert np.abs(art_copy[1:][random_point, 2] -
+    assert np.abs(art_copy[random_point, 2] -
                   trans_art[random_point, 2]) == 1
 
 def test_rotate(make_circle_array):
     """Tests if the rotated stl file is created and exists."""
-    rotate(make_circle_array, x_theta=45, y_theta=30, z_theta=60, filename='rotated.stl')
+    rotated = rotate(make_circle_array, x_theta=45, y_theta=30, z_theta=60, filename='rotated.stl')
     assert os.path.exists(os.path.join(
         os.getcwd(), "rotated.stl")) == True
+    assert rotated.shape == make_circle_array.shape
+    # the circle lies in the xy plane, so its normal follows the rotated z-axis
+    assert np.allclose(rotated[4], rotation_matrix(45, 30, 60)[:3, 2])
+
+
+def test_translate_inplace(make_circle_array):
+    """Tests that translate copies by default and only overwrites the array when asked."""
+    art = make_circle_array.copy()
+    moved = translate(art, x_offset=1.0)
+    assert np.array_equal(art, make_circle_array)
+    translate(art, x_offset=1.0, inplace=True)
+    assert np.array_equal(art, moved)
+
+
+def test_compose_transform(make_circle_array):
+    """Tests that a composed matrix gives the same result as the chained transforms."""
+    chained = transform(transform(transform(make_circle_array, scaling_matrix(2, 2, 2)),
+                                  rotation_matrix(z_theta=90)), translation_matrix(1, 2, 3))
+    once = transform(make_circle_array, compose(scaling_matrix(2, 2, 2),
+                                                rotation_matrix(z_theta=90),
+                                                translation_matrix(1, 2, 3)))
+    assert np.allclose(chained, once)
+
+
+def test_mirror_keeps_outward_normals(make_circle_array):
+    """Tests that mirroring flips the winding so the normal of the mirrored circle is -z."""
+    mirrored = transform(make_circle_array, mirror_matrix("xy"))
+    facets = mirrored.reshape(-1, 4, 3)
+    assert np.allclose(facets[:, 0], [0.0, 0.0, -1.0])
+
+
+def test_binary_round_trip(make_circle_array):
+    """Tests that a binary stl is detected, memory mapped and read back."""
+    array_to_stl(make_circle_array, "Results/binary_circle", binary=True)
+    filename = os.path.join("Results", "binary_circle.stl")
+    assert is_binary_stl(filename) == True
+    assert os.path.getsize(filename) == 84 + 50*9
+    records = read_binary_stl(filename)
+    assert isinstance(records, np.memmap)
+    assert np.allclose(records_to_array(records[2:4]), make_circle_array[8:16])
+    assert np.allclose(stl_to_array(filename), make_circle_array)
+
+
+def test_array_to_stl_triangles_and_normals():
+    """Tests that triangles plus normals write the same file as the stl array."""
+    facets = np.random.default_rng(0).random((20, 4, 3))
+    array_to_stl(facets.reshape(-1, 3), "Results/from_array", solid_name="facets")
+    array_to_stl((facets[:, 1:], facets[:, 0]), "Results/from_triangles", solid_name="facets")
+    with open("Results/from_array.stl") as f1, open("Results/from_triangles.stl") as f2:
+        assert f1.read() == f2.read()
+    assert np.array_equal(stl_to_array("Results/from_array.stl"), facets.reshape(-1, 3))
+
+
+def test_streaming_pipeline():
+    """Tests that reading, transforming and writing block by block gives the same file."""
+    facets = np.random.default_rng(1).random((25, 4, 3))
+    arr = facets.reshape(-1, 3)
+    array_to_stl(arr, "Results/stream_in")
+    blocks = list(iter_stl_blocks("Results/stream_in.stl", block_size=7))
+    assert [b.shape[0] for b in blocks] == [28, 28, 28, 16]
+    matrix = compose(rotation_matrix(x_theta=30), translation_matrix(1, 2, 3))
+    for binary in (False, True):
+        n = blocks_to_stl(transform_blocks(iter_stl_blocks("Results/stream_in.stl", block_size=7),
+                                           matrix), "Results/stream_out", binary=binary,
+                          solid_name="stream")
+        array_to_stl(transform(arr, matrix), "Results/stream_ref", binary=binary, solid_name="stream")
+        assert n == 25
+        with open("Results/stream_out.stl", "rb") as f1, open("Results/stream_ref.stl", "rb") as f2:
+            assert f1.read() == f2.read()
+    blocks = list(iter_stl_blocks("Results/stream_out.stl", block_size=10))
+    assert [b.shape[0] for b in blocks] == [40, 40, 20]
+
+
+def test_float32_path():
+    """Tests that float32 is kept from reading over transforms to writing and stays close to float64."""
+    from pistl import shapes, utilities, mass_properties
+    sphere = shapes.Sphere()
+    sphere.radius = 50.0
+    sphere.dtype = np.float32
+    arr32 = sphere.to_array()
+    sphere.dtype = None
+    arr64 = sphere.to_array()
+    assert arr32.dtype == np.float32 and arr64.dtype == np.float64
+    assert np.abs(arr32 - arr64).max() < 1e-5*50.0
+    # the float32 values of a binary file are read as they are
+    array_to_stl(arr32, "Results/float32_sphere", binary=True)
+    read32 = stl_to_array("Results/float32_sphere.stl", dtype=np.float32)
+    assert read32.dtype == np.float32 and np.array_equal(read32, arr32)
+    matrix = compose(rotation_matrix(z_theta=30), translation_matrix(1000.0, 0, 0))
+    moved32, moved64 = transform(read32, matrix), transform(arr64, matrix)
+    assert moved32.dtype == np.float32
+    assert np.abs(moved32 - moved64).max() < 1e-6*1050.0
+    # the shortest float32 text reads back to the same float32 values
+    array_to_stl(moved32, "Results/float32_moved")
+    assert np.array_equal(stl_to_array("Results/float32_moved.stl", dtype=np.float32), moved32)
+    # the volume is summed in float64 whatever the input
+    volume32 = mass_properties.mass_properties(moved32)["volume"]
+    volume64 = mass_properties.mass_properties(moved64)["volume"]
+    assert abs(volume32 - volume64) < 1e-5*volume64
+    previous = utilities.set_float_dtype(np.float32)
+    try:
+        assert stl_to_array("Results/float32_moved.stl").dtype == np.float32
+        assert sphere.to_array().dtype == np.float32
+    finally:
+        utilities.set_float_dtype(previous)
+    with pytest.raises(ValueError):
+        utilities.set_float_dtype(np.int32)
+
+
+def test_transform_keeps_float_type():
+    """Tests that inplace refuses arrays it would have to copy and that float32 meshes stay float32."""
+    from pistl.mesh import Mesh
+    ints = np.arange(24).reshape(8, 3)
+    with pytest.raises(TypeError):
+        transform(ints, translation_matrix(1.0), inplace=True)
+    assert transform(ints, translation_matrix(1.0)).dtype == np.float64
+    arr32 = np.arange(24, dtype=np.float32).reshape(8, 3)
+    assert np.shares_memory(transform(arr32, translation_matrix(1.0), inplace=True), arr32)
+    mesh = Mesh(np.eye(3, dtype=np.float32), np.array([[0, 1, 2]]))
+    moved = transform(mesh, compose(rotation_matrix(z_theta=30), mirror_matrix("yz")))
+    assert moved.vertices.dtype == np.float32
+
+
+def test_multi_solid_index(make_result_dir):
+    """Tests that named solids are written, indexed, persisted and read one by one."""
+    rng = np.random.default_rng(2)
+    solids = {"housing": rng.random((30, 4, 3)).reshape(-1, 3),
+              "lid": rng.random((5, 4, 3)).reshape(-1, 3),
+              "gasket seal": rng.random((12, 4, 3)).reshape(-1, 3)}
+    assert solids_to_stl(solids, "Results/assembly") == 47
+    index_file = os.path.join(make_result_dir, "assembly.stl.json")
+    if os.path.exists(index_file):
+        os.remove(index_file)
+    index = index_solids("Results/assembly.stl", index_file)
+    assert [(s["name"], s["n_facets"]) for s in index["solids"]] == \
+        [("housing", 30), ("lid", 5), ("gasket seal", 12)]
+    assert sum(s["nbytes"] for s in index["solids"]) == os.path.getsize("Results/assembly.stl")
+    assert index_solids("Results/assembly.stl", index_file) == index
+    assert np.array_equal(read_solid("Results/assembly.stl", "lid", index, strict=True), solids["lid"])
+    assert np.array_equal(read_solid("Results/assembly.stl", 2), solids["gasket seal"])
+    assert list(read_solids("Results/assembly.stl", index=index)) == list(solids)
+    with pytest.raises(KeyError):
+        read_solid("Results/assembly.stl", "bracket", index)
+    # the whole file still reads as one array
+    assert np.array_equal(stl_to_array("Results/assembly.stl", strict=True),
+                          np.concatenate(list(solids.values())))
+    array_to_stl(solids["lid"], "Results/lid", binary=True)
+    index = index_solids("Results/lid.stl")
+    assert index["solids"][0]["name"] == "lid" and index["solids"][0]["n_facets"] == 5
+    assert np.allclose(read_solid("Results/lid.stl", "lid"), solids["lid"], atol=1e-6)
+    solids_to_stl(solids, "Results/assembly", compression="gz")
+    with pytest.raises(ValueError):
+        index_solids("Results/assembly.stl.gz")
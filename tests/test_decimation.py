@@ -0,0 +1,45 @@
+import numpy as np
+from pistl import shapes
+from pistl.decimation import decimate, lod_chain
+from pistl.validation import validate
+from pistl.mass_properties import mass_properties
+
+
+def _sphere():
+    sphere = shapes.Sphere()
+    sphere.resoultion_longitude = 60
+    sphere.resolution_latitude = 60
+    return sphere
+
+
+def test_decimate_to_target():
+    """Tests that a sphere reduced to a facet count stays closed and keeps its volume."""
+    sphere = _sphere()
+    mesh = decimate(sphere, target_facets=800)
+    assert len(mesh) == 800
+    report = validate(mesh)
+    assert report["watertight"] and report["inconsistent_edges"] == 0
+    assert np.isclose(mass_properties(mesh)["volume"], mass_properties(sphere)["volume"], rtol=0.02)
+
+
+def test_decimate_flat_grid_with_error_bound():
+    """Tests that a flat grid collapses without leaving its plane or moving its outline."""
+    x, y = np.meshgrid(np.linspace(0, 1, 11), np.linspace(0, 1, 11))
+    points = np.stack((x, y, np.zeros_like(x)), axis=2)
+    quads = np.stack((points[:-1, :-1], points[:-1, 1:], points[1:, 1:], points[1:, :-1]), axis=2)
+    quads = quads.reshape(-1, 4, 3)
+    triangles = np.concatenate((quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]))
+    mesh = decimate(triangles, max_error=1e-9)
+    assert len(mesh) < len(triangles)/4
+    assert np.allclose(mesh.vertices[:, 2], 0)
+    assert np.isclose(mass_properties(mesh)["area"], 1.0)
+    assert np.allclose(mesh.vertices[:, :2].min(axis=0), 0) and np.allclose(mesh.vertices[:, :2].max(axis=0), 1)
+
+
+def test_lod_chain():
+    """Tests the facet counts and statistics of a chain of levels."""
+    levels, stats = lod_chain(_sphere(), ratios=(0.5, 0.1))
+    assert [len(m) for m in levels] == [s["n_facets"] for s in stats]
+    assert stats[0]["n_facets"] == stats[0]["target_facets"]
+    assert stats[1]["n_facets"] <= stats[1]["target_facets"] + 1
+    assert stats[0]["error"] <= stats[1]["error"] and all(s["seconds"] >= 0 for s in stats)
@@ -0,0 +1,29 @@
+import sys
+import json
+import subprocess
+
+# modules that only the visualization and conversion backends need
+HEAVY_MODULES = ["pyvista", "vtk", "vtkmodules", "matplotlib", "OCC"]
+
+SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+import numpy
+numpy_time = time.perf_counter() - start
+start = time.perf_counter()
+import pistl.core, pistl.shapes, pistl.utilities, pistl.converter, pistl.cli
+pistl_time = time.perf_counter() - start
+print(json.dumps({"numpy": numpy_time, "pistl": pistl_time,
+                  "modules": sorted(m.split(".")[0] for m in sys.modules)}))
+"""
+
+
+def test_import_budget():
+    """Tests in a fresh interpreter that importing pistl loads no backend and stays cheap."""
+    output = subprocess.run([sys.executable, "-c", SCRIPT], capture_output=True,
+                            text=True, check=True).stdout
+    result = json.loads(output)
+    loaded = set(result["modules"])
+    assert [m for m in HEAVY_MODULES if m in loaded] == []
+    # generous bound, pistl itself is a few pure python modules on top of numpy
+    assert result["pistl"] < max(0.5, 2*result["numpy"])
@@ -0,0 +1,45 @@
+import numpy as np
+from pistl import core, shapes, utilities
+from pistl.mesh import Mesh
+from pistl.mass_properties import mass_properties, stl_mass_properties
+
+
+def _box(lower, upper):
+    """Stl array of an axis aligned box with outward normals."""
+    corners = np.array([[x, y, z] for x in (lower[0], upper[0])
+                        for y in (lower[1], upper[1]) for z in (lower[2], upper[2])])
+    quads = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    triangles = np.array([corners[[a, b, c]] for a, b, c, d in quads] +
+                         [corners[[a, c, d]] for a, b, c, d in quads])
+    arr = np.concatenate((utilities.find_normals(triangles)[:, None], triangles), axis=1)
+    return arr.reshape(-1, 3)
+
+
+def test_box_mass_properties():
+    """Tests volume, area, centroid, inertia and bounds of a box against the formulas."""
+    props = mass_properties(_box([0, 1, 2], [2, 3, 4]), density=0.5)
+    assert np.isclose(props["volume"], 8.0) and np.isclose(props["area"], 24.0)
+    assert np.isclose(props["mass"], 4.0) and props["n_facets"] == 12
+    assert np.allclose(props["centroid"], [1, 2, 3])
+    assert np.allclose(props["inertia"], np.eye(3)*4.0*(4 + 4)/12)
+    assert np.allclose(props["bounds"], [[0, 1, 2], [2, 3, 4]])
+    # a mesh far from the origin gives the same properties
+    far = mass_properties(Mesh.from_array(core.translate(_box([0, 1, 2], [2, 3, 4]), 1e6, 0, 0)))
+    assert np.isclose(far["volume"], 8.0) and np.allclose(far["centroid"], [1e6 + 1, 2, 3])
+
+
+def test_sphere_and_chunked_file(tmp_path):
+    """Tests that a tessellated sphere is close to the analytic volume and that the file
+    read in small blocks gives the same properties as the array."""
+    sphere = shapes.Sphere()
+    sphere.resoultion_longitude = 120
+    sphere.resolution_latitude = 120
+    sphere.create()
+    props = mass_properties(sphere)
+    # the sphere is flattened at the poles where its rings stop at _min_radius
+    assert np.isclose(props["volume"], 4/3*np.pi*sphere.radius**3, rtol=0.06)
+    assert np.allclose(props["centroid"], 0, atol=1e-6)
+    core.array_to_stl(sphere.to_array(), str(tmp_path/"mass_sphere"), binary=True)
+    chunked = stl_mass_properties(str(tmp_path/"mass_sphere.stl"), block_size=1000)
+    assert np.isclose(chunked["volume"], props["volume"], rtol=1e-6)
+    assert np.allclose(chunked["inertia"], props["inertia"], atol=1e-6)
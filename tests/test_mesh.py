@@ -0,0 +1,46 @@
+import numpy as np
+from pistl import shapes
+from pistl.core import transform, rotation_matrix, mirror_matrix
+from pistl.mesh import Mesh, weld_vertices
+
+
+def make_sphere_mesh():
+    sphere = shapes.Sphere()
+    sphere.create()
+    return sphere, sphere.to_mesh()
+
+
+def test_weld_vertices_tolerance():
+    """Tests that points closer than the tolerance are merged."""
+    points = np.array([[0, 0, 0], [1, 0, 0], [1e-12, 0, 0], [1, 1e-12, -0.0]])
+    first, inverse = weld_vertices(points, tolerance=1e-9)
+    assert len(first) == 2
+    assert list(inverse) == [0, 1, 0, 1]
+    first, inverse = weld_vertices(points, tolerance=0)
+    assert len(first) == 4
+
+
+def test_mesh_round_trip():
+    """Tests that the stl array of a mesh holds the same triangles it was built from."""
+    sphere, mesh = make_sphere_mesh()
+    triangles = sphere.triangles
+    assert mesh.faces.dtype == np.int32
+    assert np.allclose(mesh.triangles, triangles, atol=1e-9)
+    again = Mesh.from_array(mesh.to_array())
+    assert np.array_equal(again.faces, mesh.faces)
+    assert np.allclose(again.normals, mesh.normals)
+
+
+def test_mesh_is_smaller_than_stl_array():
+    """Tests that the shared vertex layout is at least 3 times smaller."""
+    _, mesh = make_sphere_mesh()
+    assert mesh.to_array().nbytes > 3*mesh.nbytes
+
+
+def test_transform_mesh():
+    """Tests that transforming a mesh matches transforming its stl array."""
+    _, mesh = make_sphere_mesh()
+    for matrix in (rotation_matrix(10, 20, 30), mirror_matrix("yz")):
+        moved = transform(mesh, matrix)
+        assert isinstance(moved, Mesh)
+        assert np.allclose(moved.to_array(), transform(mesh.to_array(), matrix))
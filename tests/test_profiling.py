@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import subprocess
+from pistl import core, shapes, profiling
+
+
+def test_profile_export_stages(tmp_path):
+    """Tests the stages, counters, callback and JSON report of a profiled export."""
+    sphere = shapes.Sphere()
+    sphere.radius = 3.25
+    finished = []
+    ascii_file, report = str(tmp_path/"sphere.stl"), str(tmp_path/"profile.json")
+    with profiling.profile(callback=finished.append, output=report) as p:
+        sphere.create()
+        sphere.export(ascii_file, "sphere")
+        core.array_to_stl(core.stl_to_array(ascii_file), str(tmp_path/"sphere_binary"), binary=True)
+    assert not profiling.enabled()
+    assert finished == p.records
+    summary = p.summary()
+    n_facets = sphere.triangles.shape[0]
+    for name in ("shapes.Sphere.create", "shapes.tessellate", "utilities.find_normals",
+                 "shapes.export", "utilities.stl_writer", "utilities.format",
+                 "utilities.write", "core.read", "core.write"):
+        assert name in summary
+    assert summary["shapes.tessellate"]["facets"] == n_facets
+    assert summary["shapes.tessellate"]["peak_array_nbytes"] == n_facets*4*3*8
+    assert summary["core.read"]["facets"] == n_facets
+    # every byte of both files, the solid and endsolid lines included
+    written = os.path.getsize(ascii_file) + os.path.getsize(tmp_path/"sphere_binary.stl")
+    assert summary["utilities.write"]["nbytes"] == written
+    writes = [r for r in p.records if r["name"] == "utilities.write"]
+    assert {r["parent"] for r in writes} == {"utilities.stl_writer", "core.write"}
+    export = next(r for r in p.records if r["name"] == "shapes.export")
+    assert 0 <= export["self_seconds"] <= export["seconds"]
+    with open(report) as f:
+        assert json.load(f)["summary"]["core.read"]["calls"] == 1
+
+
+def test_profile_counts_multi_solid_bytes(tmp_path):
+    """Tests that the written bytes of a multi-solid file are the size of the file."""
+    cube = shapes.Cuboid()
+    solids = {"cube": cube.to_array(), "lid": cube.to_array()}
+    with profiling.profile() as p:
+        core.solids_to_stl(solids, str(tmp_path/"cubes"))
+    assert p.summary()["utilities.write"]["nbytes"] == os.path.getsize(tmp_path/"cubes.stl")
+
+
+def test_profile_off_records_nothing():
+    """Tests that nothing is recorded outside of a profile."""
+    with profiling.profile() as p:
+        pass
+    cube = shapes.Cuboid()
+    core.transform(cube.to_array(), core.translation_matrix(1.0))
+    assert p.records == []
+    assert profiling.span("core.read") is profiling.span("core.write")
+
+
+def test_profile_from_environment(tmp_path):
+    """Tests that PISTL_PROFILE writes the report of the process at exit."""
+    path = str(tmp_path/"env_profile.json")
+    script = "import numpy as np; from pistl import utilities; utilities.find_normals(np.eye(3)[None])"
+    subprocess.run([sys.executable, "-c", script], check=True,
+                   env=dict(os.environ, PISTL_PROFILE=path))
+    with open(path) as f:
+        report = json.load(f)
+    assert report["summary"]["utilities.find_normals"]["facets"] == 1
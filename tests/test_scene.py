@@ -0,0 +1,34 @@
+import numpy as np
+from pistl import shapes, core
+from pistl.scene import Scene
+
+
+def test_instances_share_geometry():
+    """Tests that one geometry placed many times is written as one stl."""
+    cyl = shapes.Cylinder()
+    cyl.close = True
+    scene = Scene("fixture")
+    pin = scene.add_geometry(cyl)
+    assert scene.add_geometry(cyl) == pin
+    for i in range(50):
+        scene.add(pin, core.rotation_matrix(x_theta=90), core.translation_matrix(x_offset=2.0*i))
+    scene.add(shapes.Sphere())
+    assert len(scene.geometries) == 2 and len(scene) == 51
+    arr = scene.to_array()
+    assert arr.shape[0] == 4*scene.n_facets
+    expected = core.translate(core.rotate(cyl.to_array(), x_theta=90), x_offset=2.0*7)
+    n = expected.shape[0]
+    assert np.allclose(arr[7*n:8*n], expected)
+
+
+def test_scene_export_round_trip(tmp_path):
+    """Tests that the exported assembly reads back as the placed triangles."""
+    scene = Scene()
+    tetra = shapes.Tetrahedron()
+    scene.add(tetra, core.mirror_matrix("xy"))
+    scene.add(0, core.translation_matrix(0, 0, 5))
+    scene.export(str(tmp_path/"scene.stl"), binary=True)
+    arr = core.stl_to_array(str(tmp_path/"scene.stl"))
+    assert np.allclose(arr, scene.to_array(), atol=1e-6)
+    # the normals of the mirrored tetrahedron are the mirrored normals
+    assert np.allclose(arr.reshape(-1, 4, 3)[:3, 0], tetra.normals*[1, 1, -1], atol=1e-6)
@@ -1,4 +1,5 @@
-from pistl import shapes
+import numpy as np
+from pistl import shapes, utilities
 from pistl import pist_exceptions
 import pytest
 
@@ -44,3 +45,57 @@ def test_shape_creation():
         s.create()
         s.export("Results/shape.stl", "shape")
         s.visualize()
+
+
+def test_sphere_triangles():
+    """Tests the sphere grid and the triangles of the first band and the bottom fan."""
+    sphere = shapes.Sphere()
+    sphere.resoultion_longitude = 8
+    sphere.resolution_latitude = 6
+    sphere.create()
+    assert sphere.x.shape == (8, 6)
+    triangles = sphere.triangles
+    assert triangles.shape == (7*2*5 + 2*5, 3, 3)
+    point = lambda j, i: [sphere.x[j, i], sphere.y[j, i], sphere.z[j, i]]
+    assert np.array_equal(triangles[0], [point(0, 0), point(1, 1), point(1, 0)])
+    assert np.array_equal(triangles[5], [point(0, 0), point(0, 1), point(1, 1)])
+    assert np.array_equal(triangles[-10], [[0, 0, sphere.z[0, 0]], point(0, 0), point(0, 1)])
+
+
+def test_cylinder_closed_triangles():
+    """Tests that a closed cylinder has side, top and bottom triangles with the right winding."""
+    cyl = shapes.Cylinder()
+    cyl.close = True
+    cyl.create()
+    triangles = cyl.triangles
+    assert triangles.shape == (4*9, 3, 3)
+    normals = utilities.find_normals(triangles)
+    assert np.allclose(normals[18:27], [0, 0, 1])
+    assert np.allclose(normals[27:], [0, 0, -1])
+
+
+def test_lazy_triangles_follow_parameters():
+    """Tests that the triangles are built without create, kept, and rebuilt after a parameter change."""
+    circle = shapes.Circle()
+    triangles = circle.triangles
+    assert np.shares_memory(circle.triangles, triangles)
+    assert np.isclose(np.abs(triangles[:, 1:, 0]).max(), 1.0)
+    circle.radius = 2.0
+    assert np.isclose(np.abs(circle.triangles[:, 1:, 0]).max(), 2.0)
+    assert np.isclose(circle.x.max(), 2.0)
+    cuboid = shapes.Cuboid()
+    cuboid.create()
+    cuboid._side_length = 4.0
+    assert np.isclose(cuboid.triangles[:, :, 0].max(), 4.0/np.sqrt(2))
+
+
+def test_mesh_property_and_export_without_create():
+    """Tests that the mesh is cached and that export creates the shape when needed."""
+    sphere = shapes.Sphere()
+    assert sphere.mesh is sphere.mesh
+    assert len(sphere.mesh) == sphere.triangles.shape[0]
+    sphere.radius = 3.0
+    assert np.isclose(np.abs(sphere.mesh.vertices).max(), 3.0)
+    tetra = shapes.Tetrahedron()
+    tetra.export("Results/lazy_tetra.stl", "tetra")
+    assert np.allclose(tetra.triangles[:, 1:, 2], -2.0)
@@ -0,0 +1,77 @@
+import os
+import numpy as np
+import pytest
+from pistl import shapes, core, cache
+from pistl.sweep import Sweep, grid
+
+
+def test_sweep_matches_single_shapes():
+    """Tests that the batched variants are the triangles of the shapes made one by one."""
+    variants = [dict(v, _top_circle_radius=v["_base_circle_radius"])
+                for v in grid(_base_circle_radius=[1.0, 2.5], resolution=[8, 16], close=[True])]
+    sweep = Sweep(shapes.Cylinder, variants, name="pin_{index}_r{_base_circle_radius}")
+    assert len(sweep) == 4 and sweep.names[1] == "pin_1_r1.0"
+    arrays = sweep.tessellate()
+    for i, variant in enumerate(variants):
+        cylinder = shapes.Cylinder()
+        for attribute, value in variant.items():
+            setattr(cylinder, attribute, value)
+        cylinder.create()
+        assert np.array_equal(arrays[i], cylinder.to_array())
+    spheres = Sweep(shapes.Sphere, {"radius": [1.0, 2.0]}, dtype=np.float32).tessellate()
+    sphere = shapes.Sphere()
+    sphere.radius = 2.0
+    sphere.dtype = np.float32
+    assert spheres[1].dtype == np.float32
+    assert np.array_equal(spheres[1], sphere.to_array())
+
+
+def test_sweep_batches_and_caches(monkeypatch):
+    """Tests that one topology is built in one batch and that repeated variants come from the cache."""
+    old = cache.shape_cache
+    cache.configure()
+    batches = []
+    batch_points = shapes.Cylinder._batch_points.__func__
+
+    def counted(cls, batch):
+        batches.append(len(batch))
+        return batch_points(cls, batch)
+    monkeypatch.setattr(shapes.Cylinder, "_batch_points", classmethod(counted))
+    try:
+        sweep = Sweep(shapes.Cylinder, {"_base_circle_radius": [1.0, 2.0, 1.0, 3.0],
+                                        "resolution": [8, 12]})
+        arrays = sweep.tessellate()
+        # two resolutions, three distinct radii each
+        assert sorted(batches) == [3, 3]
+        assert arrays[0] is arrays[4]
+        assert cache.stats()["misses"] == 8
+        again = sweep.tessellate()
+        assert sorted(batches) == [3, 3]
+        assert all(a is b for a, b in zip(arrays, again))
+        assert not arrays[0].flags.writeable
+    finally:
+        cache.shape_cache = old
+
+
+def test_sweep_export(tmp_path):
+    """Tests the per-variant files, the multi-solid file and the report."""
+    sweep = Sweep(shapes.Sphere, {"radius": [1.0, 2.0, 3.0], "resolution_latitude": [10, 20]})
+    directory = str(tmp_path/"sweep")
+    report = sweep.export(directory, binary=True, jobs=2)
+    assert report["n_parts"] == 6 and report["parts_per_second"] > 0
+    assert report["files"][5] == os.path.join(directory, "sphere_5.stl")
+    arrays = sweep.tessellate()
+    assert np.allclose(core.stl_to_array(report["files"][5]), arrays[5], atol=1e-5)
+    solids = str(tmp_path/"sweep_solids.stl")
+    report = sweep.export_solids(solids)
+    assert report["n_facets"] == sum(arr.shape[0]//4 for arr in arrays)
+    with open(solids) as f:
+        text = f.read()
+    assert text.count("endsolid sphere_") == 6
+    assert np.array_equal(core.stl_to_array(solids), np.concatenate(arrays))
+
+
+def test_reserved_attribute_names():
+    """Tests that variants with an index or shape attribute are refused with a clear error."""
+    with pytest.raises(ValueError, match="index and shape are reserved"):
+        Sweep(shapes.Sphere, [{"radius": 1.0}, {"radius": 2.0, "shape": "round"}])
@@ -1,7 +1,7 @@
 import pytest
 import os
 import numpy as np
-from pistl.utilities import find_normal, stl_writer, visualize
+from pistl.utilities import find_normal, find_normals, stl_writer, visualize
 from pistl import pist_exceptions
 
 # creating an asset for the test and need to tear it down.
@@ -19,6 +19,16 @@ def test_find_nromal():
     arr1 = np.array([1.0, 0.0, 0.0])
     assert np.allclose(arr1, nn) == True
 
+def test_find_normals_batch():
+    """Tests the batched normals against the single triangle function and a degenerate triangle."""
+    triangles = np.random.default_rng(0).random((50, 3, 3))
+    triangles[7] = [[0, 0, 0], [1, 1, 1], [2, 2, 2]]
+    normals = find_normals(triangles)
+    assert normals.shape == (50, 3)
+    assert np.allclose(normals[7], [0.0, 0.0, 0.0])
+    assert np.allclose(normals[3], find_normal(*triangles[3]))
+    assert np.allclose(np.linalg.norm(np.delete(normals, 7, axis=0), axis=1), 1.0)
+
 def test_write_stl_new_file(make_result_dir):
     """Test the stl file writing function."""
     filename = os.path.join(make_result_dir, 'new_stl.stl')
@@ -37,3 +47,23 @@ def test_visualize_exception():
     """Test if visualize raises an exception for missing or bad filename."""
     with pytest.raises(FileExistsError):
         visualize("nonexistent_file.stl")
+
+def test_write_binary_stl(make_result_dir):
+    """Test the binary stl writer packs one 50 byte record per triangle."""
+    filename = os.path.join(make_result_dir, 'new_binary_stl.stl')
+    stl_writer(filename, 'tetra', [[[1, 0, 0], [0, 1, 0], [0, 0, 1]],
+                                   [[1, 0, 0], [0, 1, 0], [0, 0, 0]]],
+               facet_normals=[[0.57, 0.57, 0.57],
+                              [0, 0, -1]], binary=True)
+    assert os.path.getsize(filename) == 84 + 2*50
+
+def test_write_stl_precision_and_array(make_result_dir):
+    """Test that an stl array can be written with a fixed precision."""
+    filename = os.path.join(make_result_dir, 'precision_stl.stl')
+    arr = np.array([[0, 0, 1], [0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=float)
+    stl_writer(filename, 'tri', arr, precision=2)
+    with open(filename) as f:
+        text = f.read()
+    assert text.startswith("solid tri\nfacet normal 0.00e+00 0.00e+00 1.00e+00\n")
+    assert "vertex 1.00e+00 0.00e+00 0.00e+00\n" in text
+    assert text.endswith("endfacet\nendsolid")
@@ -0,0 +1,38 @@
+import numpy as np
+from pistl import shapes
+from pistl.mesh import Mesh
+from pistl.validation import validate, edge_counts
+
+_TETRA_VERTICES = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype=float)
+_TETRA_FACES = np.array([[0, 2, 1], [0, 1, 3], [0, 3, 2], [1, 2, 3]])
+
+
+def test_closed_mesh_is_valid():
+    """Tests that a closed, consistently wound tetrahedron and a closed cylinder pass."""
+    report = validate(Mesh(_TETRA_VERTICES, _TETRA_FACES))
+    assert report["valid"] and report["n_edges"] == 6
+    cylinder = shapes.Cylinder()
+    cylinder.close = True
+    assert cylinder.validate()["watertight"]
+    edges, counts, forward = edge_counts(_TETRA_FACES)
+    assert np.all(counts == 2) and np.all(forward == 1) and np.all(edges[:, 0] < edges[:, 1])
+
+
+def test_defects_are_counted():
+    """Tests every kind of defect on a tetrahedron that was broken on purpose."""
+    faces = _TETRA_FACES.copy()
+    faces[3] = faces[3, ::-1]
+    report = validate(Mesh(_TETRA_VERTICES, faces))
+    assert report["watertight"] and report["inconsistent_edges"] == 3
+    # open: one facet missing
+    report = validate(Mesh(_TETRA_VERTICES, _TETRA_FACES[:3]), details=True)
+    assert report["boundary_edges"] == 3 and not report["watertight"]
+    assert sorted(map(tuple, report["boundary_edge_vertices"])) == [(1, 2), (1, 3), (2, 3)]
+    # a repeated facet makes its edges non-manifold, a collapsed facet is degenerate
+    faces = np.vstack((_TETRA_FACES, _TETRA_FACES[:1], [[0, 0, 1]]))
+    report = validate(Mesh(_TETRA_VERTICES, faces), details=True)
+    assert report["duplicate_facets"] == 1 and report["non_manifold_edges"] == 3
+    assert list(report["degenerate_facet_indices"]) == [5]
+    # the stl array of the same tetrahedron is welded first
+    triangles = _TETRA_VERTICES[_TETRA_FACES]
+    assert validate(triangles)["valid"]